@@ -0,0 +1,169 @@
+"""Shared helpers for the benchmark scripts: model loading, timing, audio metrics."""
+import time
+from typing import Callable, Optional
+
+import torch
+
+from heartlib.heartcodec.configuration_heartcodec import HeartCodecConfig
+from heartlib.heartcodec.modeling_heartcodec import HeartCodec
+from heartlib.heartmula import modeling_heartmula
+from heartlib.heartmula.configuration_heartmula import HeartMuLaConfig
+from heartlib.heartmula.modeling_heartmula import HeartMuLa
+from heartlib.pipelines.music_generation import HeartMuLaGenConfig, HeartMuLaGenPipeline
+
+
+def str2device(value):
+    return torch.device(value.lower())
+
+
+def load_codec(model_path: Optional[str], device: torch.device, dtype=torch.float32) -> HeartCodec:
+    """Load HeartCodec from a checkpoint dir, or build a small random one when no path is given."""
+    if model_path:
+        return HeartCodec.from_pretrained(model_path, device_map=device, dtype=dtype).eval()
+    torch.manual_seed(0)
+    config = HeartCodecConfig(
+        dim=32,
+        codebook_size=64,
+        codebook_dim=8,
+        num_quantizers=8,
+        attention_head_dim=16,
+        num_attention_heads=4,
+        num_layers=2,
+        num_layers_2=1,
+        in_channels=256 + 256 + 32,
+        out_channels=256,
+        init_channel=16,
+    )
+    return HeartCodec(config).to(device=device, dtype=dtype).eval()
+
+
+def _llama_bench():
+    from torchtune.models import llama3_2
+
+    return llama3_2.llama3_2(
+        vocab_size=64,
+        num_layers=4,
+        num_heads=8,
+        num_kv_heads=2,
+        embed_dim=512,
+        max_seq_len=2048,
+        intermediate_dim=1536,
+        attn_dropout=0.0,
+        norm_eps=1e-5,
+        rope_base=500_000,
+        scale_factor=32,
+    )
+
+
+def load_mula(
+    model_path: Optional[str],
+    device: torch.device,
+    dtype=torch.bfloat16,
+    audio_vocab_size: int = 1024,
+) -> HeartMuLa:
+    """Load HeartMuLa from a checkpoint dir, or build a small random one when no path is given."""
+    if model_path:
+        return HeartMuLa.from_pretrained(model_path, device_map=device, dtype=dtype).eval()
+    modeling_heartmula.FLAVORS.setdefault("llama-bench", _llama_bench)
+    torch.manual_seed(0)
+    config = HeartMuLaConfig(
+        backbone_flavor="llama-bench",
+        decoder_flavor="llama-bench",
+        text_vocab_size=1000,
+        audio_vocab_size=audio_vocab_size,
+        audio_num_codebooks=8,
+        muq_dim=512,
+    )
+    model = HeartMuLa(config)
+    torch.nn.init.normal_(model.audio_head, std=0.02)
+    return model.to(device=device, dtype=dtype).eval()
+
+
+def load_pipeline(
+    model_path: Optional[str],
+    version: str,
+    mula_device: torch.device,
+    codec_device: torch.device,
+) -> HeartMuLaGenPipeline:
+    """Load the generation pipeline with both models resident, or wrap the small random
+    models with a word-level tokenizer when no path is given."""
+    device = {"mula": mula_device, "codec": codec_device}
+    dtype = {"mula": torch.bfloat16, "codec": torch.float32}
+    if model_path:
+        return HeartMuLaGenPipeline.from_pretrained(model_path, device, dtype, version)
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    vocab = {"[UNK]": 0, "<bos>": 1, "<eos>": 2}
+    for word in ("<tag>pop</tag>", "hello", "world", "la"):
+        vocab[word] = len(vocab)
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    pipe = HeartMuLaGenPipeline(
+        heartmula_path="",
+        heartcodec_path="",
+        heartmula_device=mula_device,
+        heartcodec_device=codec_device,
+        heartmula_dtype=torch.bfloat16,
+        heartcodec_dtype=torch.float32,
+        lazy_load=True,
+        muq_mulan=None,
+        text_tokenizer=tokenizer,
+        # audio EOS is never sampled, every song runs to max_audio_length_ms
+        config=HeartMuLaGenConfig(text_bos_id=1, text_eos_id=2, audio_eos_id=100_000),
+    )
+    # lazy_load only skips loading from the empty paths
+    pipe.lazy_load = False
+    pipe._codec = load_codec(None, codec_device)
+    pipe._mula = load_mula(
+        None, mula_device, audio_vocab_size=pipe._codec.config.codebook_size
+    )
+    return pipe
+
+
+def random_codes(codec: HeartCodec, num_frames: int, seed: int = 0) -> torch.Tensor:
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randint(
+        0,
+        codec.config.codebook_size,
+        (codec.config.num_quantizers, num_frames),
+        generator=generator,
+    )
+
+
+def sync(device: torch.device) -> None:
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def timed(fn: Callable, device: torch.device, repeats: int = 3, warmup: int = 1):
+    """Return (best seconds, last result) of ``fn()`` over ``repeats`` runs."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    sync(device)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        sync(device)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def snr_db(reference: torch.Tensor, estimate: torch.Tensor) -> float:
+    reference = reference.double()
+    noise = estimate.double() - reference
+    return float(10 * torch.log10(reference.pow(2).sum() / noise.pow(2).sum().clamp_min(1e-20)))
+
+
+def spectral_distance(reference: torch.Tensor, estimate: torch.Tensor, n_fft: int = 2048) -> float:
+    """Mean absolute log-magnitude STFT difference in dB (0 = identical spectra)."""
+    window = torch.hann_window(n_fft, dtype=torch.float64)
+
+    def log_mag(x):
+        spec = torch.stft(x.double(), n_fft, hop_length=n_fft // 4, window=window, return_complex=True)
+        return 20 * torch.log10(spec.abs().clamp_min(1e-8))
+
+    return float((log_mag(reference) - log_mag(estimate)).abs().mean())
@@ -0,0 +1,49 @@
+"""Benchmark ScalarModel decoding before and after HeartCodec.optimize_for_inference.
+
+With weight norm left in place every conv recomputes its weight from (g, v) on each
+forward; after folding the decoder runs plain convolutions.
+
+    python benchmarks/bench_codec_freeze.py --window_frames 744 --threads 8
+"""
+import argparse
+
+import torch
+
+from _common import load_codec, str2device, timed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--window_frames", type=int, default=744)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=3)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    codec = load_codec(args.model_path, args.device)
+    torch.manual_seed(0)
+    latents = torch.randn(
+        1, codec.config.latent_hidden_dim, args.window_frames, device=args.device
+    )
+
+    @torch.inference_mode()
+    def decode():
+        return codec.scalar_model.decode(latents)
+
+    base_s, base_out = timed(decode, args.device, args.repeats)
+    codec.optimize_for_inference()
+    frozen_s, frozen_out = timed(decode, args.device, args.repeats)
+    max_diff = (base_out - frozen_out).abs().max().item()
+    print(f"frames={args.window_frames} threads={torch.get_num_threads()}")
+    print(f"weight norm: {base_s:.3f}s")
+    print(f"folded:      {frozen_s:.3f}s  ({base_s / frozen_s:.2f}x, max abs diff {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
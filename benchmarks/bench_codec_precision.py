@@ -0,0 +1,63 @@
+"""Quality and speed of the reduced-precision HeartCodec estimator modes against fp32.
+
+Every mode decodes the same codes with the same seed, so the only difference is the
+estimator precision (see HeartCodec.set_estimator_precision).
+
+    python benchmarks/bench_codec_precision.py --model_path ./ckpt/HeartCodec-oss --precisions bf16 int8
+"""
+import argparse
+import time
+
+import torch
+
+from _common import load_codec, random_codes, snr_db, spectral_distance, str2device, sync
+from heartlib.heartcodec.modeling_heartcodec import ESTIMATOR_PRECISIONS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--precisions", nargs="+", choices=ESTIMATOR_PRECISIONS[1:], default=["bf16", "int8"])
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--num_steps", type=int, default=10)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--threads", type=int, default=None)
+    return parser.parse_args()
+
+
+def decode_all(codec, codes_list, args):
+    outputs = []
+    start = time.perf_counter()
+    for seed, codes in zip(args.seeds, codes_list):
+        torch.manual_seed(seed)
+        outputs.append(codec.detokenize(codes, num_steps=args.num_steps, disable_progress=True))
+    sync(args.device)
+    return outputs, time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    codec = load_codec(args.model_path, args.device)
+    num_frames = int(args.seconds * 12.5)
+    codes_list = [random_codes(codec, num_frames, seed) for seed in args.seeds]
+
+    reference, ref_s = decode_all(codec, codes_list, args)
+    print(f"{args.seconds:.0f}s clips x {len(args.seeds)} seeds, threads={torch.get_num_threads()}")
+    print(f"fp32: {ref_s:.2f}s")
+    for precision in args.precisions:
+        # reload so every mode starts from the fp32 weights
+        codec = load_codec(args.model_path, args.device).set_estimator_precision(precision)
+        outputs, seconds = decode_all(codec, codes_list, args)
+        snr = sum(snr_db(r, o) for r, o in zip(reference, outputs)) / len(outputs)
+        dist = sum(spectral_distance(r, o) for r, o in zip(reference, outputs)) / len(outputs)
+        print(
+            f"{precision}: {seconds:.2f}s ({ref_s / seconds:.2f}x), "
+            f"SNR {snr:.1f} dB, spectral distance {dist:.3f} dB"
+        )
+
+
+if __name__ == "__main__":
+    main()
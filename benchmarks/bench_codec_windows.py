@@ -0,0 +1,52 @@
+"""Compare variable-length codec windows against the padded 29.76 s windows.
+
+For each clip length, HeartCodec.detokenize runs with the same seed in both modes and
+reports wall time and the SNR of the fast output against the padded output on the
+retained region.
+
+    python benchmarks/bench_codec_windows.py --model_path ./ckpt/HeartCodec-oss --device cuda
+"""
+import argparse
+
+import torch
+
+from _common import load_codec, random_codes, snr_db, str2device, timed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--num_steps", type=int, default=10)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[5, 10, 20, 45])
+    parser.add_argument("--repeats", type=int, default=2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    codec = load_codec(args.model_path, args.device)
+    print(f"{'clip':>8} {'padded s':>10} {'fast s':>10} {'speedup':>8} {'SNR dB':>8}")
+    for seconds in args.seconds:
+        codes = random_codes(codec, int(seconds * 12.5))
+
+        def run(pad_windows):
+            torch.manual_seed(0)
+            return codec.detokenize(
+                codes,
+                num_steps=args.num_steps,
+                disable_progress=True,
+                pad_windows=pad_windows,
+            )
+
+        padded_s, padded = timed(lambda: run(True), args.device, args.repeats)
+        fast_s, fast = timed(lambda: run(False), args.device, args.repeats)
+        assert fast.shape == padded.shape
+        print(
+            f"{seconds:>7.1f}s {padded_s:>10.3f} {fast_s:>10.3f} "
+            f"{padded_s / fast_s:>7.2f}x {snr_db(padded, fast):>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
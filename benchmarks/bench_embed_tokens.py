@@ -0,0 +1,74 @@
+"""Per-frame cost of HeartMuLa token embedding: the masked sum over every column
+versus the mask-aware paths (text only for the prompt prefill, audio only for each
+decoded frame). Reports latency and the bytes allocated per call.
+
+    python benchmarks/bench_embed_tokens.py --model_path ./ckpt/HeartMuLa-oss-3B --device cuda
+"""
+import argparse
+
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+from _common import load_mula, str2device, timed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--prompt_len", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=20)
+    return parser.parse_args()
+
+
+def allocated_bytes(fn, device):
+    activities = [ProfilerActivity.CPU]
+    if device.type == "cuda":
+        activities.append(ProfilerActivity.CUDA)
+    with profile(activities=activities, profile_memory=True) as prof:
+        fn()
+    key = "self_device_memory_usage" if device.type == "cuda" else "self_cpu_memory_usage"
+    return sum(max(getattr(e, key), 0) for e in prof.key_averages())
+
+
+def main():
+    args = parse_args()
+    model = load_mula(args.model_path, args.device)
+    num_columns = model.config.audio_num_codebooks + 1
+    uncond_mask = torch.tensor([False, True], device=args.device)
+
+    prompt = torch.zeros(2, args.prompt_len, num_columns, dtype=torch.long, device=args.device)
+    prompt[..., -1] = torch.randint(0, model.config.text_vocab_size, prompt.shape[:2])
+    prompt_mask = torch.zeros_like(prompt, dtype=torch.bool)
+    prompt_mask[..., -1] = True
+    frame = torch.randint(0, model.config.audio_vocab_size, (2, 1, num_columns), device=args.device)
+    frame[..., -1] = 0
+    frame_mask = torch.ones_like(frame, dtype=torch.bool)
+    frame_mask[..., -1] = False
+
+    def masked_sum(tokens, mask):
+        embeds = model._embed_tokens(tokens, uncond_mask)
+        return (embeds * mask.unsqueeze(-1)).sum(dim=2, dtype=embeds.dtype)
+
+    cases = {
+        "prefill": (
+            lambda: masked_sum(prompt, prompt_mask),
+            lambda: model._embed_text(prompt, uncond_mask),
+        ),
+        "decode frame": (
+            lambda: masked_sum(frame, frame_mask),
+            lambda: model._embed_frame_audio(frame).sum(dim=2),
+        ),
+    }
+    with torch.inference_mode():
+        for name, (general, aware) in cases.items():
+            for label, fn in (("masked sum", general), ("mask-aware", aware)):
+                seconds, _ = timed(fn, args.device, repeats=args.repeats)
+                print(
+                    f"{name} {label}: {seconds * 1e6:.0f} us, "
+                    f"{allocated_bytes(fn, args.device) / 1024:.0f} KiB allocated"
+                )
+
+
+if __name__ == "__main__":
+    main()
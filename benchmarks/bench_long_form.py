@@ -0,0 +1,70 @@
+"""Per-frame latency across a long generation with the rolling (sink + window) KV
+cache. Latency should stay flat past the point where the window starts rolling and
+past the backbone context, with the cache size fixed.
+
+    python benchmarks/bench_long_form.py --model_path ./ckpt/HeartMuLa-oss-3B --device cuda --frames 12000
+"""
+import argparse
+import time
+
+import torch
+
+from _common import load_mula, str2device, sync
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--prompt_len", type=int, default=64)
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--window", type=int, default=None)
+    parser.add_argument("--segment", type=int, default=250)
+    return parser.parse_args()
+
+
+@torch.inference_mode()
+def main():
+    args = parse_args()
+    model = load_mula(args.model_path, args.device)
+    device = args.device
+    num_columns = model.config.audio_num_codebooks + 1
+    model.setup_caches(
+        2, args.prompt_len + args.frames, sink_len=args.prompt_len, window=args.window
+    )
+    rolling = model._rolling
+    print(
+        f"backbone context {model.backbone.max_seq_len}, cache {rolling.sink_len} prompt + "
+        f"{rolling.window} frames, {model.kv_cache_bytes(2, args.prompt_len + args.frames, args.prompt_len, args.window) / 2**20:.1f} MiB"
+    )
+
+    tokens = torch.zeros(2, args.prompt_len, num_columns, dtype=torch.long, device=device)
+    mask = torch.zeros_like(tokens, dtype=torch.bool)
+    mask[..., -1] = True
+    pos = torch.arange(args.prompt_len, device=device).repeat(2, 1)
+    with torch.autocast(device_type=device.type, dtype=torch.bfloat16):
+        frame = model.generate_frame(tokens, mask, pos, 1.0, 50, 1.5, embed_mode="text")
+    frame_tokens = torch.zeros(2, 1, num_columns, dtype=torch.long, device=device)
+    frame_mask = torch.ones_like(frame_tokens, dtype=torch.bool)
+    frame_mask[..., -1] = False
+    out = torch.empty_like(frame)
+
+    sync(device)
+    start = time.perf_counter()
+    for i in range(args.frames):
+        frame_tokens[:, 0, :-1] = frame
+        with torch.autocast(device_type=device.type, dtype=torch.bfloat16):
+            frame = model.generate_frame(
+                frame_tokens, frame_mask, None, 1.0, 50, 1.5, embed_mode="audio", out=out
+            )
+        if (i + 1) % args.segment == 0:
+            sync(device)
+            now = time.perf_counter()
+            print(
+                f"frames {i + 1 - args.segment:5d}-{i:5d}: {(now - start) / args.segment * 1000:.1f} ms/frame"
+            )
+            start = now
+
+
+if __name__ == "__main__":
+    main()
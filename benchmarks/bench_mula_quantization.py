@@ -0,0 +1,99 @@
+"""Compare weight-only quantized HeartMuLa against the unquantized model.
+
+Greedy-decodes ``--frames`` frames with the reference model, then teacher-forces the
+same frames through each quantized copy and reports how often the predicted frame
+(all codebooks) and individual tokens agree, plus frames/sec of each model.
+
+    python benchmarks/bench_mula_quantization.py --model_path ./ckpt/HeartMuLa-oss-3B --modes int8 int4
+"""
+import argparse
+import copy
+import time
+
+import torch
+
+from _common import load_mula, str2device
+from heartlib.heartmula.quantization import QUANTIZATION_MODES, quantize_heartmula
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--modes", nargs="+", choices=QUANTIZATION_MODES, default=["int8"])
+    parser.add_argument("--group_size", type=int, default=128)
+    parser.add_argument("--prompt_len", type=int, default=64)
+    parser.add_argument("--frames", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    return parser.parse_args()
+
+
+@torch.inference_mode()
+def run(model, prompt, reference=None, num_frames=0):
+    """Greedy-decode ``num_frames`` frames, feeding ``reference`` frames back when given.
+
+    Returns (predicted frames [num_frames, C], seconds spent in the decode loop).
+    """
+    num_codebooks = model.config.audio_num_codebooks
+    device = prompt.device
+    if not model.backbone.caches_are_enabled():
+        model.setup_caches(1)
+    tokens = prompt
+    mask = torch.zeros_like(prompt, dtype=torch.bool)
+    mask[..., -1] = True
+    pos = torch.arange(prompt.shape[1], device=device)[None]
+    predicted = []
+    start = None
+    dtype = model.codebook0_head.weight.dtype
+    for i in range(num_frames):
+        # Same autocast the pipeline wraps around generate_frame.
+        with torch.autocast(device_type=device.type, dtype=dtype):
+            frame = model.generate_frame(
+                tokens, mask, pos, temperature=1.0, topk=1, cfg_scale=1.0
+            )
+        if i == 0:
+            # Time the per-frame decode loop only, not the prompt prefill.
+            start = time.perf_counter()
+        predicted.append(frame[0])
+        fed = reference[i] if reference is not None else frame[0]
+        tokens = torch.zeros(1, 1, num_codebooks + 1, dtype=torch.long, device=device)
+        tokens[0, 0, :-1] = fed
+        mask = torch.zeros_like(tokens, dtype=torch.bool)
+        mask[..., :-1] = True
+        pos = pos[:, -1:] + 1
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elapsed = time.perf_counter() - start
+    model.reset_caches()
+    return torch.stack(predicted), elapsed
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model = load_mula(args.model_path, args.device)
+    generator = torch.Generator().manual_seed(0)
+    prompt = torch.zeros(1, args.prompt_len, model.config.audio_num_codebooks + 1, dtype=torch.long)
+    prompt[..., -1] = torch.randint(0, model.config.text_vocab_size, (1, args.prompt_len), generator=generator)
+    prompt = prompt.to(args.device)
+
+    reference, ref_s = run(model, prompt, num_frames=args.frames)
+    fps = (args.frames - 1) / ref_s
+    print(f"frames={args.frames} threads={torch.get_num_threads()} dtype={next(model.parameters()).dtype}")
+    print(f"reference: {fps:.2f} frames/s")
+    for mode in args.modes:
+        quantized = quantize_heartmula(copy.deepcopy(model), mode, args.group_size)
+        predicted, q_s = run(quantized, prompt, reference=reference, num_frames=args.frames)
+        frame_agree = (predicted == reference).all(-1).float().mean().item()
+        token_agree = (predicted == reference).float().mean().item()
+        q_fps = (args.frames - 1) / q_s
+        print(
+            f"{mode}: {q_fps:.2f} frames/s ({q_fps / fps:.2f}x), "
+            f"frame agreement {frame_agree:.1%}, token agreement {token_agree:.1%}"
+        )
+        del quantized
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Throughput of a stream of requests: serial ``pipeline(...)`` calls versus
+PipelinedExecutor, which overlaps the LM of one song with the codec of the previous.
+
+The overlap only pays off with HeartMuLa and HeartCodec on separate devices. Without
+``--model_path`` small random models are used.
+
+    python benchmarks/bench_pipelined.py --model_path ./ckpt --mula_device cuda:0 --codec_device cuda:1
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+
+from _common import load_pipeline, str2device, sync
+from heartlib.pipelines.executor import PipelinedExecutor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--version", type=str, default="3B")
+    parser.add_argument("--mula_device", type=str2device, default="cpu")
+    parser.add_argument("--codec_device", type=str2device, default="cpu")
+    parser.add_argument("--num_requests", type=int, default=4)
+    parser.add_argument("--max_audio_length_ms", type=int, default=8_000)
+    parser.add_argument("--queue_size", type=int, default=2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    pipe = load_pipeline(args.model_path, args.version, args.mula_device, args.codec_device)
+    out_dir = tempfile.mkdtemp()
+    requests = [
+        ({"tags": "pop", "lyrics": "hello world la"}, os.path.join(out_dir, f"{i}.wav"))
+        for i in range(args.num_requests)
+    ]
+    kwargs = dict(max_audio_length_ms=args.max_audio_length_ms, cfg_scale=1.5)
+
+    with torch.no_grad():
+        pipe(requests[0][0], save_path=requests[0][1], **kwargs)  # warmup
+        start = time.perf_counter()
+        for inputs, save_path in requests:
+            pipe(inputs, save_path=save_path, **kwargs)
+        sync(args.mula_device)
+        sync(args.codec_device)
+        serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with PipelinedExecutor(pipe, queue_size=args.queue_size) as executor:
+        futures = [executor.submit(inputs, save_path=path, **kwargs) for inputs, path in requests]
+        for future in futures:
+            future.result()
+        stats = executor.utilization()
+    pipelined = time.perf_counter() - start
+
+    print(f"serial:    {serial:.2f}s, {args.num_requests / serial:.2f} songs/s")
+    print(f"pipelined: {pipelined:.2f}s, {args.num_requests / pipelined:.2f} songs/s")
+    for name, stage in stats.items():
+        print(
+            f"  {name}: utilization {stage['utilization']:.0%}, busy {stage['busy_seconds']:.2f}s, "
+            f"blocked on queue {stage['blocked_seconds']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
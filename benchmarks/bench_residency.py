@@ -0,0 +1,64 @@
+"""Swap-in benchmark for lazily loaded models: reload from the checkpoint versus
+moving a parked HeartMuLa back from pinned host memory or from a memory-mapped file.
+
+Without ``--model_path`` a random model is saved to a temporary directory first.
+
+    python benchmarks/bench_residency.py --model_path ./ckpt/HeartMuLa-oss-3B --device cuda
+"""
+import argparse
+import tempfile
+import time
+
+import torch
+
+from _common import load_mula, str2device, sync
+from heartlib.checkpoint import load_pretrained
+from heartlib.heartmula.modeling_heartmula import HeartMuLa
+from heartlib.pipelines.residency import DISK, HOST, ModelResidency
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--repeats", type=int, default=3)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    model_path = args.model_path
+    if model_path is None:
+        model_path = tempfile.mkdtemp()
+        load_mula(None, torch.device("cpu")).save_pretrained(model_path)
+
+    times = []
+    for _ in range(args.repeats):
+        sync(args.device)
+        start = time.perf_counter()
+        model = load_pretrained(HeartMuLa, model_path, args.device, torch.bfloat16)
+        sync(args.device)
+        times.append(time.perf_counter() - start)
+        del model
+    print(f"reload: {min(times) * 1000:.1f} ms")
+
+    model = load_pretrained(HeartMuLa, model_path, args.device, torch.bfloat16)
+    for tier in (HOST, DISK):
+        if tier == HOST and args.device.type == "cpu":
+            continue
+        residency = ModelResidency("HeartMuLa", model, args.device)
+        for _ in range(args.repeats):
+            residency.offload(tier)
+            residency.ensure_on_device()
+        swaps = [t["seconds"] for t in residency.transitions if t["to"] == "device"]
+        # the first offload writes the host / disk copy, later ones only free the device
+        offloads = [t["seconds"] for t in residency.transitions if t["to"] == tier]
+        print(
+            f"{tier}: swap in {min(swaps) * 1000:.1f} ms, first offload "
+            f"{offloads[0] * 1000:.1f} ms, later offloads {min(offloads[1:] or offloads) * 1000:.1f} ms"
+        )
+        residency.close()
+
+
+if __name__ == "__main__":
+    main()
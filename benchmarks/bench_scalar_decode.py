@@ -0,0 +1,55 @@
+"""Benchmark batched ScalarModel decoding against the per-window loop.
+
+Decodes ``--windows`` random latent windows once per window (the old detokenize loop)
+and once through HeartCodec.decode_latents, which stacks them into micro-batches of
+at most ``--max_batch_frames`` latent frames.
+
+    python benchmarks/bench_scalar_decode.py --windows 8 --window_frames 744
+"""
+import argparse
+
+import torch
+
+from _common import load_codec, str2device, timed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--windows", type=int, default=8)
+    parser.add_argument("--window_frames", type=int, default=744)
+    parser.add_argument("--max_batch_frames", type=int, default=4 * 744)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=3)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    codec = load_codec(args.model_path, args.device)
+    torch.manual_seed(0)
+    latents = [
+        torch.randn(1, args.window_frames, 256, device=args.device)
+        for _ in range(args.windows)
+    ]
+
+    @torch.inference_mode()
+    def per_window():
+        return [codec.decode_latents([latent], max_batch_frames=None)[0] for latent in latents]
+
+    def batched():
+        return codec.decode_latents(latents, max_batch_frames=args.max_batch_frames)
+
+    loop_s, loop_out = timed(per_window, args.device, args.repeats)
+    batch_s, batch_out = timed(batched, args.device, args.repeats)
+    max_diff = max((a - b).abs().max().item() for a, b in zip(loop_out, batch_out))
+    print(f"windows={args.windows} frames/window={args.window_frames} threads={torch.get_num_threads()}")
+    print(f"per-window loop: {loop_s:.3f}s")
+    print(f"batched:         {batch_s:.3f}s  ({loop_s / batch_s:.2f}x, max abs diff {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Cold-start benchmark: time from loading HeartMuLa to its first generated frame.
+
+Compares ``PreTrainedModel.from_pretrained`` with ``heartlib.checkpoint.load_pretrained``
+(meta-device construction + memory-mapped safetensors). Without ``--model_path`` a
+random model is saved to a temporary directory first.
+
+    python benchmarks/bench_startup.py --model_path ./ckpt/HeartMuLa-oss-3B --device cuda
+"""
+import argparse
+import tempfile
+import time
+
+import torch
+
+from _common import load_mula, str2device, sync
+from heartlib.checkpoint import load_pretrained
+from heartlib.heartmula.modeling_heartmula import HeartMuLa
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--device", type=str2device, default="cpu")
+    parser.add_argument("--prompt_len", type=int, default=64)
+    return parser.parse_args()
+
+
+@torch.inference_mode()
+def first_frame(model, prompt_len, device):
+    model.setup_caches(1)
+    tokens = torch.zeros(1, prompt_len, model.config.audio_num_codebooks + 1, dtype=torch.long, device=device)
+    mask = torch.zeros_like(tokens, dtype=torch.bool)
+    mask[..., -1] = True
+    pos = torch.arange(prompt_len, device=device)[None]
+    with torch.autocast(device_type=device.type, dtype=torch.bfloat16):
+        return model.generate_frame(tokens, mask, pos, temperature=1.0, topk=50, cfg_scale=1.0)
+
+
+def time_to_first_frame(load, args):
+    sync(args.device)
+    start = time.perf_counter()
+    model = load()
+    sync(args.device)
+    loaded = time.perf_counter()
+    first_frame(model, args.prompt_len, args.device)
+    sync(args.device)
+    done = time.perf_counter()
+    del model
+    return loaded - start, done - start
+
+
+def main():
+    args = parse_args()
+    model_path = args.model_path
+    if model_path is None:
+        model_path = tempfile.mkdtemp()
+        load_mula(None, torch.device("cpu")).save_pretrained(model_path)
+
+    loaders = {
+        "from_pretrained": lambda: HeartMuLa.from_pretrained(
+            model_path, device_map=args.device, dtype=torch.bfloat16
+        ),
+        "load_pretrained": lambda: load_pretrained(
+            HeartMuLa, model_path, args.device, torch.bfloat16
+        ),
+    }
+    # run each loader twice and keep the second (warm page cache) measurement
+    for name, load in loaders.items():
+        try:
+            time_to_first_frame(load, args)
+            load_s, first_s = time_to_first_frame(load, args)
+        except RuntimeError as e:
+            print(f"{name}: failed: {e}")
+            continue
+        print(f"{name}: load {load_s:.2f}s, time to first frame {first_s:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ import {
 } from 'lucide-react';
 import WaveformViz from '../components/WaveformViz';
 import { useTranslation } from '../contexts/LanguageContext';
-import { generateAudio, getTask, getAudioUrl, pollTaskStatus, TaskResponse, updateProject, getModelList, getTasks, getProject, createShare, getGpuInfo, GpuInfo, generateLyrics } from '../services/api';
+import { generateAudio, getTask, getAudioUrl, watchTaskStatus, TaskResponse, updateProject, getModelList, getTasks, getProject, createShare, getGpuInfo, GpuInfo, generateLyrics } from '../services/api';
 import { useProject } from '../contexts/ProjectContext';
 import { usePageStateSlice } from '../contexts/PageStateContext';
 import { ViewMode } from '../types';
@@ -383,7 +383,7 @@ const Studio: React.FC = () => {
       setAudioTaskId(task_id);
       setAudioTaskStatus('running');
       
-      const completedTask = await pollTaskStatus(
+      const completedTask = await watchTaskStatus(
         task_id,
         (task) => {
           if (isMountedRef.current) setAudioTaskStatus(task.status);
@@ -3,7 +3,7 @@ import { useTranslation } from '../contexts/LanguageContext';
 import {
   createTranscribe,
   getTask,
-  pollTaskStatus,
+  watchTaskStatus,
   updateTask,
   getAudioUrl,
   type TaskResponse,
@@ -57,7 +57,7 @@ const Transcribe: React.FC = () => {
     createTranscribe(file, params)
       .then(({ task_id }) => {
         setTaskId(task_id);
-        return pollTaskStatus(task_id, (t) => setTask(t));
+        return watchTaskStatus(task_id, (t) => setTask(t));
       })
       .then((completedTask) => {
         setTask(completedTask);
@@ -117,6 +117,21 @@ export interface TaskResponse {
   result: unknown;
   error_message: string | null;
   project_id?: string | null;
+  eta_seconds?: number | null;
+  progress?: TaskProgress | null;
+}
+
+export interface StageProgress {
+  done: number;
+  total: number;
+  per_second: number;
+}
+
+// Latest progress of a running generation: frames generated, then codec windows decoded
+export interface TaskProgress {
+  stage: 'generate' | 'decode';
+  generate?: StageProgress;
+  decode?: StageProgress;
 }
 
 export interface GeneratePayload {
@@ -189,6 +204,38 @@ export const updateTask = async (taskId: string, body: { result?: unknown }): Pr
   return response.json();
 };
 
+export const cancelTask = async (taskId: string): Promise<TaskResponse> => {
+  const response = await fetch(`${API_BASE}/tasks/${taskId}/cancel`, { method: 'POST' });
+  if (!response.ok) throw new Error(`Failed to cancel task: ${response.statusText}`);
+  return response.json();
+};
+
+// Compact task state (no params / result), as returned by the bulk status endpoint
+export interface TaskStatusRecord {
+  id: string;
+  type: string;
+  status: string;
+  updated_at: string;
+  project_id: string | null;
+  priority: string;
+  progress: TaskProgress | null;
+  output_audio_path: string | null;
+  error_message: string | null;
+}
+
+// Status of many tasks in one request (POST, so long id lists fit)
+export const getTaskStatuses = async (
+  ids: string[]
+): Promise<{ items: TaskStatusRecord[]; missing: string[] }> => {
+  const response = await fetch(`${API_BASE}/tasks/status`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ ids }),
+  });
+  if (!response.ok) throw new Error(`Failed to fetch task statuses: ${response.statusText}`);
+  return response.json();
+};
+
 // ==================== Transcribe API ====================
 
 export interface TranscribeParams {
@@ -225,7 +272,10 @@ export const createTranscribe = async (
   return response.json();
 };
 
-// Poll task status until completed or failed
+const isTerminalStatus = (status: string): boolean =>
+  status === 'completed' || status === 'failed' || status === 'cancelled';
+
+// Poll task status until completed, failed or cancelled
 export const pollTaskStatus = async (
   taskId: string,
   onStatusChange?: (task: TaskResponse) => void,
@@ -238,7 +288,7 @@ export const pollTaskStatus = async (
     const task = await getTask(taskId);
     onStatusChange?.(task);
     
-    if (task.status === 'completed' || task.status === 'failed') {
+    if (isTerminalStatus(task.status)) {
       return task;
     }
     
@@ -249,6 +299,44 @@ export const pollTaskStatus = async (
   throw new Error(`Task ${taskId} did not complete within ${maxAttempts * intervalMs / 1000} seconds`);
 };
 
+// Follow a task through its Server-Sent Events stream until it completes, fails or is
+// cancelled; falls back to pollTaskStatus when EventSource is missing or the stream fails
+export const watchTaskStatus = async (
+  taskId: string,
+  onStatusChange?: (task: TaskResponse) => void
+): Promise<TaskResponse> => {
+  if (typeof EventSource === 'undefined') return pollTaskStatus(taskId, onStatusChange);
+  let latest = await getTask(taskId);
+  onStatusChange?.(latest);
+  if (isTerminalStatus(latest.status)) return latest;
+
+  return new Promise<TaskResponse>((resolve, reject) => {
+    const source = new EventSource(`${API_BASE}/tasks/${taskId}/events`);
+    let settled = false;
+    const settle = (result: Promise<TaskResponse>) => {
+      if (settled) return;
+      settled = true;
+      source.close();
+      result.then(resolve, reject);
+    };
+    source.addEventListener('task', (event) => {
+      // events carry the compact status record; params and result stay from getTask
+      const record = JSON.parse((event as MessageEvent).data) as TaskStatusRecord;
+      latest = { ...latest, ...record };
+      if (isTerminalStatus(record.status)) {
+        // the full task has the result (e.g. the transcription text)
+        settle(getTask(taskId).then((task) => {
+          onStatusChange?.(task);
+          return task;
+        }));
+      } else {
+        onStatusChange?.(latest);
+      }
+    });
+    source.onerror = () => settle(pollTaskStatus(taskId, onStatusChange));
+  });
+};
+
 // ==================== Model API ====================
 
 const DEFAULT_MODELS = [
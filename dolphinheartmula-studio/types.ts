@@ -46,7 +46,7 @@ export enum ViewMode {
 export interface Task {
   id: string;
   type: string;
-  status: 'pending' | 'running' | 'completed' | 'failed';
+  status: 'pending' | 'running' | 'completed' | 'failed' | 'cancelled';
   created_at: string;
   updated_at: string;
   params: Record<string, unknown>;
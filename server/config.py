@@ -13,7 +13,41 @@ _REPO_ROOT = Path(__file__).resolve().parent.parent
 MODEL_PATH = os.environ.get("HEARTLIB_MODEL_PATH", str(_REPO_ROOT / "ckpt"))
 OUTPUT_DIR = os.environ.get("HEARTLIB_OUTPUT_DIR", str(_REPO_ROOT / "output"))
 CONCURRENCY = int(os.environ.get("HEARTLIB_CONCURRENCY", "2"))
+# Task queue: a claimed task is leased for LEASE_SECONDS and the lease is renewed while
+# it runs; tasks whose lease expires (worker crashed) go back to pending, at most
+# TASK_MAX_ATTEMPTS times. Idle workers poll for new tasks every QUEUE_POLL_SECONDS.
+LEASE_SECONDS = float(os.environ.get("HEARTLIB_LEASE_SECONDS", "60"))
+TASK_MAX_ATTEMPTS = int(os.environ.get("HEARTLIB_TASK_MAX_ATTEMPTS", "3"))
+QUEUE_POLL_SECONDS = float(os.environ.get("HEARTLIB_QUEUE_POLL_SECONDS", "2"))
+# Scheduling (see server/scheduler.py): batch tasks waiting this long are treated as
+# interactive; fair share compares the work each user started in the last window
+BATCH_AGING_SECONDS = float(os.environ.get("HEARTLIB_BATCH_AGING_SECONDS", "600"))
+FAIR_SHARE_WINDOW_SECONDS = float(os.environ.get("HEARTLIB_FAIR_SHARE_WINDOW_SECONDS", "900"))
+# Admission control: new tasks are refused (429) beyond this many pending tasks, or
+# this many pending + running tasks of one signed-in user; 0 disables the limit
+MAX_QUEUE_DEPTH = int(os.environ.get("HEARTLIB_MAX_QUEUE_DEPTH", "100"))
+MAX_TASKS_PER_USER = int(os.environ.get("HEARTLIB_MAX_TASKS_PER_USER", "10"))
 HEARTMULA_VERSION = os.environ.get("HEARTLIB_HEARTMULA_VERSION", "3B")
+# "cuda" or "cpu"; CPU overflow nodes usually pair this with HEARTLIB_MULA_QUANTIZATION
+DEVICE = os.environ.get("HEARTLIB_DEVICE", "cuda")
+# Weight-only HeartMuLa quantization: "" (off), "int8" or "int4"
+MULA_QUANTIZATION = os.environ.get("HEARTLIB_MULA_QUANTIZATION", "") or None
+# HeartCodec flow-matching estimator precision: "fp32", "bf16" or "int8" (CPU only);
+# unset keeps fp32, or the precision a compiled bundle was built with
+CODEC_PRECISION = os.environ.get("HEARTLIB_CODEC_PRECISION", "") or None
+# Minimum seconds between two progress writes of a running task to the database
+PROGRESS_WRITE_SECONDS = float(os.environ.get("HEARTLIB_PROGRESS_WRITE_SECONDS", "1.0"))
+# Task event streams (SSE): how often changes made by standalone workers are picked
+# up from the database, and the keep-alive interval of an idle stream
+EVENTS_POLL_SECONDS = float(os.environ.get("HEARTLIB_EVENTS_POLL_SECONDS", "1.0"))
+EVENTS_KEEPALIVE_SECONDS = float(os.environ.get("HEARTLIB_EVENTS_KEEPALIVE_SECONDS", "15"))
+# How far back each change-feed query re-reads, to catch late commits and workers
+# whose clock is behind this host's by up to that much
+EVENTS_FEED_OVERLAP_SECONDS = float(os.environ.get("HEARTLIB_EVENTS_FEED_OVERLAP_SECONDS", "30"))
+# Most task ids one GET/POST /api/tasks/status request may ask for
+MAX_STATUS_IDS = int(os.environ.get("HEARTLIB_MAX_STATUS_IDS", "500"))
+# Frames and tail latents saved next to each generated track so it can be extended
+GENERATION_STATE_FILENAME = "state.pt"
 
 # Database Configuration (MySQL or SQLite fallback)
 DB_HOST = os.environ.get("DB_HOST", "")
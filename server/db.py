@@ -25,7 +25,18 @@ CREATE TABLE IF NOT EXISTS tasks (
     result LONGTEXT,
     error_message TEXT,
     project_id VARCHAR(36) DEFAULT NULL,
-    INDEX idx_project_id (project_id)
+    lease_owner VARCHAR(200) DEFAULT NULL,
+    lease_expires_at VARCHAR(50) DEFAULT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    user_id VARCHAR(36) DEFAULT NULL,
+    priority VARCHAR(20) NOT NULL DEFAULT 'interactive',
+    expected_cost DOUBLE NOT NULL DEFAULT 0,
+    started_at VARCHAR(50) DEFAULT NULL,
+    progress TEXT,
+    INDEX idx_project_id (project_id),
+    INDEX idx_status_created_at (status, created_at),
+    INDEX idx_status_lease_expires_at (status, lease_expires_at),
+    INDEX idx_updated_at (updated_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
 """
 
@@ -57,7 +68,15 @@ CREATE TABLE IF NOT EXISTS tasks (
     output_audio_path TEXT,
     result TEXT,
     error_message TEXT,
-    project_id TEXT
+    project_id TEXT,
+    lease_owner TEXT,
+    lease_expires_at TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    user_id TEXT,
+    priority TEXT NOT NULL DEFAULT 'interactive',
+    expected_cost REAL NOT NULL DEFAULT 0,
+    started_at TEXT,
+    progress TEXT
 )
 """
 
@@ -215,13 +234,14 @@ def _create_database_if_not_exists():
         print(f"Warning: Could not create database: {e}")
 
 
-def _project_id_column_exists() -> bool:
-    """Return True if tasks.project_id already exists (avoids duplicate ALTER)."""
+def _tasks_column_exists(column: str) -> bool:
+    """Return True if tasks.<column> already exists (avoids duplicate ALTER)."""
     with get_connection() as conn:
         if USE_MYSQL:
             cur = conn.execute(
                 "SELECT 1 FROM information_schema.COLUMNS "
-                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND COLUMN_NAME = 'project_id' LIMIT 1"
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND COLUMN_NAME = ? LIMIT 1",
+                (column,),
             )
             row = cur.fetchone()
             return row is not None
@@ -229,12 +249,17 @@ def _project_id_column_exists() -> bool:
         cur = conn.execute("PRAGMA table_info(tasks)")
         rows = cur.fetchall()
         for row in rows:
-            name = row[1] if isinstance(row, (list, tuple)) else (row.get("name") if hasattr(row, "get") else None)
-            if name == "project_id":
+            name = row[1] if isinstance(row, (list, tuple, sqlite3.Row)) else (row.get("name") if hasattr(row, "get") else None)
+            if name == column:
                 return True
         return False
 
 
+def _project_id_column_exists() -> bool:
+    """Return True if tasks.project_id already exists (avoids duplicate ALTER)."""
+    return _tasks_column_exists("project_id")
+
+
 def _add_project_id_to_tasks() -> None:
     """Add project_id column to tasks if missing (migration for existing DBs)."""
     if _project_id_column_exists():
@@ -256,6 +281,82 @@ def _add_project_id_to_tasks() -> None:
             print(f"Warning: Could not add project_id to tasks: {e}")
 
 
+# (column, MySQL definition, SQLite definition) of the task queue and progress columns
+_QUEUE_COLUMNS = [
+    ("lease_owner", "VARCHAR(200) DEFAULT NULL", "TEXT DEFAULT NULL"),
+    ("lease_expires_at", "VARCHAR(50) DEFAULT NULL", "TEXT DEFAULT NULL"),
+    ("attempts", "INT NOT NULL DEFAULT 0", "INTEGER NOT NULL DEFAULT 0"),
+    ("user_id", "VARCHAR(36) DEFAULT NULL", "TEXT DEFAULT NULL"),
+    ("priority", "VARCHAR(20) NOT NULL DEFAULT 'interactive'", "TEXT NOT NULL DEFAULT 'interactive'"),
+    ("expected_cost", "DOUBLE NOT NULL DEFAULT 0", "REAL NOT NULL DEFAULT 0"),
+    ("started_at", "VARCHAR(50) DEFAULT NULL", "TEXT DEFAULT NULL"),
+    ("progress", "TEXT", "TEXT DEFAULT NULL"),
+]
+
+
+def _add_queue_columns_to_tasks() -> None:
+    """Add the task queue columns to tasks if missing (migration for existing DBs)."""
+    for column, mysql_type, sqlite_type in _QUEUE_COLUMNS:
+        if _tasks_column_exists(column):
+            continue
+        try:
+            with get_connection() as conn:
+                column_type = mysql_type if USE_MYSQL else sqlite_type
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {column_type}")
+                conn.commit()
+            print(f"tasks.{column} column added.")
+        except Exception as e:
+            if "Duplicate column" in str(e) or "duplicate column" in str(e) or "already exists" in str(e).lower():
+                pass
+            else:
+                print(f"Warning: Could not add {column} to tasks: {e}")
+
+
+# (index, columns) the task queue looks tasks up by: claim_next_task (pending tasks,
+# oldest first), requeue_expired_leases (running tasks by lease expiry) and the task
+# event change feed (tasks changed since a time)
+_QUEUE_INDEXES = [
+    ("idx_status_created_at", "status, created_at"),
+    ("idx_status_lease_expires_at", "status, lease_expires_at"),
+    ("idx_updated_at", "updated_at"),
+]
+
+
+def _tasks_index_exists(index: str) -> bool:
+    """Return True if the tasks index ``index`` already exists."""
+    with get_connection() as conn:
+        if USE_MYSQL:
+            cur = conn.execute(
+                "SELECT 1 FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_NAME = ? LIMIT 1",
+                (index,),
+            )
+        else:
+            cur = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks' AND name = ?",
+                (index,),
+            )
+        return cur.fetchone() is not None
+
+
+def _add_queue_indexes_to_tasks() -> None:
+    """Create the task queue indexes if missing (migration for existing DBs, and for
+    SQLite, whose CREATE TABLE has no inline indexes)."""
+    for index, columns in _QUEUE_INDEXES:
+        if _tasks_index_exists(index):
+            continue
+        try:
+            with get_connection() as conn:
+                conn.execute(f"CREATE INDEX {index} ON tasks ({columns})")
+                conn.commit()
+            print(f"tasks index {index} added.")
+        except Exception as e:
+            if "Duplicate key name" in str(e) or "already exists" in str(e).lower():
+                pass
+            else:
+                print(f"Warning: Could not add index {index} to tasks: {e}")
+
+
 
 
 
@@ -305,6 +406,8 @@ def init_db() -> None:
             conn.execute(CREATE_USERS_TABLE_MYSQL)
             conn.commit()
         _add_project_id_to_tasks()
+        _add_queue_columns_to_tasks()
+        _add_queue_indexes_to_tasks()
         _seed_admin_user()
         print("MySQL tables initialized.")
     else:
@@ -316,5 +419,7 @@ def init_db() -> None:
             conn.execute(CREATE_USERS_TABLE_SQLITE)
             conn.commit()
         _add_project_id_to_tasks()
+        _add_queue_columns_to_tasks()
+        _add_queue_indexes_to_tasks()
         _seed_admin_user()
         print("SQLite tables initialized.")
@@ -0,0 +1,136 @@
+"""Queue-time estimates for tasks.
+
+Generation and decoding time both grow linearly with the song length, so the
+running time of a task is its expected cost (seconds of audio, see
+``server.scheduler.expected_cost``) times a rate: wall seconds per second of audio.
+The rate of each task type is an exponentially weighted moving average over the
+recently completed tasks, read from the tasks table so it covers workers in every
+process.
+"""
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from server.scheduler import order_candidates
+from server.store import STATUS_PENDING, STATUS_RUNNING, list_queue, list_recent_completed
+
+# Rate assumed before any task of a type has completed (wall seconds per audio second)
+DEFAULT_SECONDS_PER_COST = 1.0
+EWMA_ALPHA = 0.2
+# How long the rates are reused before re-reading the completed tasks
+RATE_CACHE_SECONDS = 10.0
+# Retry-After when nothing is running to estimate from
+DEFAULT_RETRY_AFTER = 30
+# How long a queue snapshot answers the ETAs of polled tasks
+ESTIMATE_CACHE_SECONDS = 2.0
+
+_rates: Dict[str, float] = {}
+_rates_loaded_at = -math.inf
+_estimate: Optional["QueueEstimate"] = None
+_estimate_loaded_at = -math.inf
+
+
+def _parse(ts: str) -> datetime:
+    return datetime.fromisoformat(ts)
+
+
+def seconds_per_cost() -> Dict[str, float]:
+    """EWMA of wall seconds per audio second of the recently completed tasks, by type."""
+    global _rates, _rates_loaded_at
+    if time.monotonic() - _rates_loaded_at < RATE_CACHE_SECONDS:
+        return _rates
+    rates: Dict[str, float] = {}
+    for row in list_recent_completed():
+        if not row["expected_cost"]:
+            continue
+        seconds = (_parse(row["updated_at"]) - _parse(row["started_at"])).total_seconds()
+        rate = max(seconds, 0.0) / row["expected_cost"]
+        previous = rates.get(row["type"])
+        rates[row["type"]] = rate if previous is None else EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * previous
+    _rates, _rates_loaded_at = rates, time.monotonic()
+    return rates
+
+
+class QueueEstimate:
+    """Snapshot of the queue to estimate when tasks will be done.
+
+    Pending tasks are assumed to run in the order claim_next_task would pick them
+    now (``scheduler.order_candidates``), on as many workers as there are tasks
+    running (at least one).
+    """
+
+    def __init__(self):
+        self.now = datetime.now(timezone.utc)
+        self.rates = seconds_per_cost()
+        running, pending, usage_by_user = list_queue()
+        self._remaining = {row["id"]: self._running_remaining(row) for row in running}
+        self.workers = max(1, len(running))
+        backlog = sum(self._remaining.values())
+        self._pending_start: Dict[str, float] = {}
+        # seconds until each queued or running task is done, by user
+        self._done_by_user: Dict[Optional[str], List[float]] = {}
+        for row in running:
+            self._done_by_user.setdefault(row["user_id"], []).append(self._remaining[row["id"]])
+        for row in order_candidates(pending, usage_by_user, now=self.now):
+            start = backlog / self.workers
+            run = row["expected_cost"] * self._rate(row["type"])
+            self._pending_start[row["id"]] = start
+            self._done_by_user.setdefault(row["user_id"], []).append(start + run)
+            backlog += run
+
+    def _rate(self, task_type: Optional[str]) -> float:
+        if task_type in self.rates:
+            return self.rates[task_type]
+        if self.rates:
+            return sum(self.rates.values()) / len(self.rates)
+        return DEFAULT_SECONDS_PER_COST
+
+    def _running_remaining(self, row: Any) -> float:
+        total = row["expected_cost"] * self._rate(row["type"])
+        elapsed = (self.now - _parse(row["started_at"])).total_seconds() if row["started_at"] else 0.0
+        return max(total - elapsed, 0.0)
+
+    def eta_seconds(self, task: Any) -> Optional[float]:
+        """Seconds until ``task`` completes, or None if it is not queued or running."""
+        if task.status == STATUS_RUNNING:
+            return self._remaining.get(task.id)
+        if task.status == STATUS_PENDING and task.id in self._pending_start:
+            return self._pending_start[task.id] + task.expected_cost * self._rate(task.type)
+        return None
+
+    def covers(self, task: Any) -> bool:
+        """True if ``task`` is in this snapshot with its current status."""
+        if task.status == STATUS_RUNNING:
+            return task.id in self._remaining
+        return task.status == STATUS_PENDING and task.id in self._pending_start
+
+    def retry_after(self, user_id: Optional[str] = None) -> int:
+        """Seconds until a worker is expected to free up or, with ``user_id``, until
+        one of that user's queued or running tasks is done."""
+        if user_id is not None:
+            done = self._done_by_user.get(user_id)
+        else:
+            done = list(self._remaining.values())
+        if not done:
+            return DEFAULT_RETRY_AFTER
+        return max(1, math.ceil(min(done)))
+
+
+def eta_seconds(task: Any) -> Optional[float]:
+    """Seconds until ``task`` completes, or None if it is not queued or running.
+
+    The queue snapshot is reused for ESTIMATE_CACHE_SECONDS across the task list and
+    detail polls, and only taken for queued or running tasks."""
+    global _estimate, _estimate_loaded_at
+    if task.status not in (STATUS_PENDING, STATUS_RUNNING):
+        return None
+    estimate = _estimate
+    if (
+        estimate is None
+        or time.monotonic() - _estimate_loaded_at >= ESTIMATE_CACHE_SECONDS
+        or not estimate.covers(task)
+    ):
+        estimate = QueueEstimate()
+        _estimate, _estimate_loaded_at = estimate, time.monotonic()
+    return estimate.eta_seconds(task)
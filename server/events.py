@@ -0,0 +1,216 @@
+"""Push channel for task changes (Server-Sent Events).
+
+Clients subscribe to tasks by id or to all tasks of a user instead of polling
+``GET /api/tasks/{id}``. Changes reach ``TaskEventBroker`` two ways:
+
+- tasks changed by this process (routes, in-process workers) are published as soon
+  as ``server.store`` commits them (``add_task_listener``);
+- tasks changed by standalone workers (``server.worker_main``) are picked up by one
+  change-feed query every EVENTS_POLL_SECONDS, shared by all subscribers and only
+  run while someone is subscribed.
+
+Either way a change costs one compact read for all open streams, instead of one
+full read per open tab per poll.
+"""
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from server.config import (
+    EVENTS_FEED_OVERLAP_SECONDS,
+    EVENTS_KEEPALIVE_SECONDS,
+    EVENTS_POLL_SECONDS,
+)
+from server.store import (
+    STATUS_CANCELLED,
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    add_task_listener,
+    get_task_records,
+    list_task_changes,
+)
+
+TERMINAL_STATUSES = {STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED}
+# Changes read per change-feed query
+CHANGE_FEED_PAGE = 500
+
+
+def format_event(record: Dict[str, Any]) -> str:
+    # user_id only routes the record to subscribers, it is not sent to clients
+    data = {key: value for key, value in record.items() if key != "user_id"}
+    return f"event: task\ndata: {json.dumps(data)}\n\n"
+
+
+class _Subscriber:
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        task_ids: Set[str],
+        user_id: Optional[str],
+    ):
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self.task_ids = task_ids
+        self.user_id = user_id
+        # updated_at of the latest state of each task handed to this subscriber, so
+        # the in-process and change-feed paths never deliver the same change twice
+        self.delivered: Dict[str, str] = {}
+
+    def wants(self, record: Dict[str, Any]) -> bool:
+        if record["id"] in self.task_ids:
+            return True
+        return self.user_id is not None and record.get("user_id") == self.user_id
+
+    def mark_delivered(self, record: Dict[str, Any]) -> bool:
+        """Remember ``record`` as the task's latest state; False if it already was.
+
+        States are compared by identity, not by order: updated_at of a standalone
+        worker comes from its own clock. The broker reads task states one at a time,
+        so each task's states arrive here in commit order."""
+        if self.delivered.get(record["id"]) == record["updated_at"]:
+            return False
+        self.delivered[record["id"]] = record["updated_at"]
+        return True
+
+    def is_latest(self, record: Dict[str, Any]) -> bool:
+        """False for a queued state a newer one (or the stream's snapshot) superseded."""
+        return self.delivered.get(record["id"]) == record["updated_at"]
+
+    def put(self, record: Dict[str, Any]) -> None:
+        # publishers are worker / poller threads; the queue belongs to the event loop
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, record)
+
+
+class TaskEventBroker:
+    def __init__(self, poll_seconds: float = EVENTS_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        # held while reading task states and handing them out, so a state read
+        # earlier is never published after one read later
+        self._read_lock = threading.Lock()
+        self._subscribers: Set[_Subscriber] = set()
+        self._poller: Optional[threading.Thread] = None
+
+    def publish(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = [
+                s for s in self._subscribers if s.wants(record) and s.mark_delivered(record)
+            ]
+        for subscriber in subscribers:
+            subscriber.put(record)
+
+    def notify(self, task_id: str) -> None:
+        """Publish the current state of a task changed in this process."""
+        if not self._subscribers:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._publish_current(task_id)
+            return
+        # changed by an async route: the read lock may be held by the change-feed
+        # poller, so wait for it off the event loop
+        loop.run_in_executor(None, self._publish_current, task_id)
+
+    def _publish_current(self, task_id: str) -> None:
+        with self._read_lock:
+            for record in get_task_records([task_id]):
+                self.publish(record)
+
+    def subscribe(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        task_ids: Set[str],
+        user_id: Optional[str] = None,
+    ) -> _Subscriber:
+        subscriber = _Subscriber(loop, task_ids, user_id)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(
+                    target=self._poll_changes, name="heartlib-task-events", daemon=True
+                )
+                self._poller.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _poll_changes(self) -> None:
+        # the feed re-reads EVENTS_FEED_OVERLAP_SECONDS before the newest change seen,
+        # so rows committed late (after a newer updated_at was read) or stamped by a
+        # worker whose clock is behind are not skipped; subscribers drop the repeats
+        cursor = datetime.now(timezone.utc)
+        while True:
+            time.sleep(self.poll_seconds)
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = None
+                    return
+            try:
+                since = (cursor - timedelta(seconds=EVENTS_FEED_OVERLAP_SECONDS)).isoformat()
+                while True:
+                    with self._read_lock:
+                        records = list_task_changes(since, limit=CHANGE_FEED_PAGE)
+                        for record in records:
+                            cursor = max(cursor, datetime.fromisoformat(record["updated_at"]))
+                            self.publish(record)
+                    if len(records) < CHANGE_FEED_PAGE:
+                        break
+                    since = records[-1]["updated_at"]
+            except Exception as e:
+                print(f"Warning: task event poller error: {e}")
+
+    def _snapshot(self, subscriber: _Subscriber, task_ids: Set[str]) -> List[Dict[str, Any]]:
+        with self._read_lock:
+            snapshot = get_task_records(list(task_ids))
+            # the snapshot carries these states; publishers must not deliver them
+            # again, and states queued before it are stale
+            with self._lock:
+                for record in snapshot:
+                    subscriber.mark_delivered(record)
+        return snapshot
+
+    async def stream(
+        self,
+        request: Any,
+        task_ids: Set[str],
+        user_id: Optional[str] = None,
+        close_when_done: bool = False,
+    ) -> AsyncIterator[str]:
+        """SSE body: the current state of ``task_ids``, then every change to them
+        (and to ``user_id``'s tasks). With ``close_when_done`` the stream ends once
+        all of ``task_ids`` finished."""
+        subscriber = self.subscribe(asyncio.get_running_loop(), task_ids, user_id)
+        pending = set(task_ids)
+        try:
+            snapshot = await asyncio.to_thread(self._snapshot, subscriber, task_ids)
+            for record in snapshot:
+                yield format_event(record)
+                if record["status"] in TERMINAL_STATUSES:
+                    pending.discard(record["id"])
+            while not (close_when_done and not pending):
+                try:
+                    record = await asyncio.wait_for(
+                        subscriber.queue.get(), EVENTS_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                if not subscriber.is_latest(record):
+                    continue
+                yield format_event(record)
+                if record["status"] in TERMINAL_STATUSES:
+                    pending.discard(record["id"])
+        finally:
+            self.unsubscribe(subscriber)
+
+
+broker = TaskEventBroker()
+add_task_listener(broker.notify)
@@ -3,8 +3,8 @@ import json
 from enum import Enum
 from typing import Any, List, Optional
 
-TaskType = Enum("TaskType", ["generate", "transcribe"])
-TaskStatus = Enum("TaskStatus", ["pending", "running", "completed", "failed"])
+TaskType = Enum("TaskType", ["generate", "transcribe", "extend"])
+TaskStatus = Enum("TaskStatus", ["pending", "running", "completed", "failed", "cancelled"])
 ProjectStatus = Enum("ProjectStatus", ["Draft", "Generated", "Mastered"])
 
 
@@ -39,6 +39,14 @@ class Task:
         result: Optional[str] = None,
         error_message: Optional[str] = None,
         project_id: Optional[str] = None,
+        lease_owner: Optional[str] = None,
+        lease_expires_at: Optional[str] = None,
+        attempts: int = 0,
+        user_id: Optional[str] = None,
+        priority: str = "interactive",
+        expected_cost: float = 0.0,
+        started_at: Optional[str] = None,
+        progress: Optional[str] = None,
     ):
         self.id = id
         self.type = type
@@ -50,6 +58,14 @@ class Task:
         self.result = result
         self.error_message = error_message
         self.project_id = project_id
+        self.lease_owner = lease_owner
+        self.lease_expires_at = lease_expires_at
+        self.attempts = attempts
+        self.user_id = user_id
+        self.priority = priority
+        self.expected_cost = expected_cost
+        self.started_at = started_at
+        self.progress = progress
 
     @classmethod
     def from_row(cls, row: Any) -> "Task":
@@ -71,6 +87,14 @@ class Task:
             result=_get(row, "result"),
             error_message=_get(row, "error_message"),
             project_id=_get(row, "project_id"),
+            lease_owner=_get(row, "lease_owner"),
+            lease_expires_at=_get(row, "lease_expires_at"),
+            attempts=_get(row, "attempts") or 0,
+            user_id=_get(row, "user_id"),
+            priority=_get(row, "priority") or "interactive",
+            expected_cost=_get(row, "expected_cost") or 0.0,
+            started_at=_get(row, "started_at"),
+            progress=_get(row, "progress"),
         )
 
 
@@ -0,0 +1,36 @@
+"""Throttled progress writes from a running task to the tasks table.
+
+The pipeline reports every generated frame and decoded window (see
+``heartlib.progress``); ``TaskProgressWriter`` keeps the latest report of each stage
+and writes it to the task row at most every PROGRESS_WRITE_SECONDS, plus once when a
+stage finishes, so a 4-minute song costs a few hundred writes instead of thousands.
+"""
+import math
+import time
+from typing import Any, Dict
+
+from server.config import PROGRESS_WRITE_SECONDS
+from server.store import STATUS_RUNNING, update_task
+
+
+class TaskProgressWriter:
+    def __init__(self, task_id: str, interval: float = PROGRESS_WRITE_SECONDS):
+        self.task_id = task_id
+        self.interval = interval
+        self.state: Dict[str, Any] = {}
+        self.writes = 0
+        self._last_write = -math.inf
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        stage = event["stage"]
+        self.state["stage"] = stage
+        self.state[stage] = {
+            "done": event["done"],
+            "total": event["total"],
+            "per_second": round(event["per_second"], 3),
+        }
+        now = time.monotonic()
+        if event["done"] >= event["total"] or now - self._last_write >= self.interval:
+            update_task(self.task_id, expected_status=STATUS_RUNNING, progress=self.state)
+            self.writes += 1
+            self._last_write = now
@@ -1,52 +1,131 @@
-"""In-process task queue with two worker threads."""
-import queue
+"""Task queue backed by the tasks table, with CONCURRENCY worker threads.
+
+Tasks are created pending by the routes; a worker claims one with an atomic
+pending -> running transition and holds a lease on it, renewed by a heartbeat while
+the task runs. A reaper puts tasks whose lease expired (the worker or the whole
+process died) back to pending, so nothing is lost on a crash or restart, and workers
+in other processes sharing the database can take part.
+"""
+import os
+import socket
 import threading
+import time
+from typing import Optional
 
-from server.config import CONCURRENCY
+from server.config import CONCURRENCY, LEASE_SECONDS, QUEUE_POLL_SECONDS, TASK_MAX_ATTEMPTS
 
 
-_task_queue: queue.Queue = queue.Queue()
+_wakeup = threading.Event()
 _workers: list[threading.Thread] = []
 
 
-def _worker_loop() -> None:
-    while True:
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+
+def _heartbeat(task_id: str, owner: str, done: threading.Event, cancel: threading.Event) -> None:
+    """Renew the lease until ``done``; set ``cancel`` if the lease is lost (the task
+    was cancelled, or re-queued after the lease expired). Failed renewals (database
+    locked, connection dropped) are retried until the lease would have expired."""
+    from server.store import renew_lease
+
+    # claim_next_task granted the first lease just before the task was started
+    deadline = time.monotonic() + LEASE_SECONDS
+    # renewing often also notices a cancelled task quickly
+    while not done.wait(min(LEASE_SECONDS / 3, QUEUE_POLL_SECONDS)):
+        attempted_at = time.monotonic()
+        try:
+            renewed = renew_lease(task_id, owner, LEASE_SECONDS)
+        except Exception as e:
+            print(f"Warning: renewing the lease on task {task_id} failed: {e}")
+            if time.monotonic() < deadline:
+                continue
+            renewed = False
+        if not renewed:
+            print(f"Lease on task {task_id} lost by {owner}, stopping it")
+            cancel.set()
+            return
+        deadline = attempted_at + LEASE_SECONDS
+
+
+def run_task(task, cancel_event: Optional[threading.Event] = None) -> None:
+    """Run a claimed task with the worker function for its type. Generate and extend
+    tasks stop early once ``cancel_event`` is set."""
+    # Lazy import workers to avoid torch dependency at startup
+    try:
+        from server import workers
+        if task.type == "generate":
+            workers.run_generate_task(task.id, cancel_event=cancel_event)
+        elif task.type == "extend":
+            workers.run_extend_task(task.id, cancel_event=cancel_event)
+        elif task.type == "transcribe":
+            workers.run_transcribe_task(task.id)
+    except ImportError as e:
+        # Handle missing torch/heartlib gracefully
+        from server.store import update_task
+        update_task(task.id, status="failed", error_message=f"Worker dependency missing: {e}")
+
+
+def work_once(owner: str) -> bool:
+    """Claim and run one task as ``owner``. Returns False if no task was pending."""
+    from server.store import claim_next_task, release_lease
+
+    task = claim_next_task(owner, LEASE_SECONDS)
+    if task is None:
+        return False
+    done, cancel = threading.Event(), threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(task.id, owner, done, cancel), daemon=True
+    )
+    heartbeat.start()
+    try:
+        run_task(task, cancel)
+    finally:
+        done.set()
+        heartbeat.join()
+        release_lease(task.id, owner)
+    return True
+
+
+def _worker_loop(stop: Optional[threading.Event] = None) -> None:
+    """Claim and run tasks until ``stop`` is set (forever if None); a task that
+    is running when ``stop`` is set is finished first."""
+    owner = _owner_id()
+    while stop is None or not stop.is_set():
         try:
-            task_id = _task_queue.get(timeout=1.0)
-        except queue.Empty:
-            continue
-        if task_id is None:
-            break
-        from server.store import get_task
-
-        task = get_task(task_id)
-        if not task:
-            continue
-        
-        # Lazy import workers to avoid torch dependency at startup
+            if work_once(owner):
+                continue
+        except Exception as e:
+            print(f"Warning: task queue worker error: {e}")
+        _wakeup.wait(QUEUE_POLL_SECONDS)
+        _wakeup.clear()
+
+
+def _reaper_loop() -> None:
+    from server.store import requeue_expired_leases
+
+    while True:
         try:
-            from server import workers
-            if task.type == "generate":
-                workers.run_generate_task(task_id)
-            elif task.type == "transcribe":
-                workers.run_transcribe_task(task_id)
-        except ImportError as e:
-            # Handle missing torch/heartlib gracefully
-            from server.store import update_task
-            update_task(task_id, status="failed", error_message=f"Worker dependency missing: {e}")
-        
-        _task_queue.task_done()
+            if requeue_expired_leases(TASK_MAX_ATTEMPTS):
+                _wakeup.set()
+        except Exception as e:
+            print(f"Warning: task queue reaper error: {e}")
+        time.sleep(LEASE_SECONDS / 2)
 
 
 def start() -> None:
-    """Start CONCURRENCY worker threads."""
-    global _workers
-    for _ in range(CONCURRENCY):
-        t = threading.Thread(target=_worker_loop, daemon=True)
+    """Recover tasks left running by a previous run, then start the reaper and
+    CONCURRENCY worker threads."""
+    from server.store import requeue_expired_leases
+
+    requeue_expired_leases(TASK_MAX_ATTEMPTS, include_unleased=True)
+    threading.Thread(target=_reaper_loop, name="heartlib-reaper", daemon=True).start()
+    for i in range(CONCURRENCY):
+        t = threading.Thread(target=_worker_loop, name=f"heartlib-worker-{i}", daemon=True)
         t.start()
         _workers.append(t)
 
 
 def enqueue(task_id: str) -> None:
-    """Add task_id to the queue."""
-    _task_queue.put(task_id)
+    """Wake an idle worker for the pending task ``task_id``."""
+    _wakeup.set()
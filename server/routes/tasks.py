@@ -1,21 +1,51 @@
 """Task API: POST/GET/PATCH tasks."""
 import json
 import uuid
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, File, Form, Header, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
 
-from server.config import OUTPUT_DIR
+from server.config import (
+    GENERATION_STATE_FILENAME,
+    MAX_QUEUE_DEPTH,
+    MAX_STATUS_IDS,
+    MAX_TASKS_PER_USER,
+    OUTPUT_DIR,
+)
+from server.eta import QueueEstimate, eta_seconds
+from server.events import broker
 from server.schemas import (
+    ExtendRequest,
     GenerateRequest,
+    QueueWaitResponse,
     TaskCreateResponse,
     TaskListResponse,
     TaskPatchRequest,
     TaskResponse,
+    TaskStatusRecord,
+    TaskStatusRequest,
+    TaskStatusResponse,
+)
+from server.store import (
+    STATUS_COMPLETED,
+    STATUS_PENDING,
+    STATUS_RUNNING,
+    cancel_task,
+    count_tasks,
+    create_task,
+    create_task_with_id,
+    get_task,
+    get_task_records,
+    list_queue_waits,
+    list_tasks,
+    update_task,
 )
-from server.store import create_task, create_task_with_id, get_task, list_tasks, update_task
 from server.queue import enqueue
+from server.scheduler import PRIORITY_CLASSES, PRIORITY_INTERACTIVE, wait_histogram
+from server.utils.auth import get_user_id_from_token
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
@@ -23,6 +53,42 @@ router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 MAX_UPLOAD_BYTES = 100 * 1024 * 1024
 
 
+def _user_id(authorization: Optional[str]) -> Optional[str]:
+    """User id of a "Bearer {token}" header; None for anonymous requests (which share
+    one fair-share slot)."""
+    parts = (authorization or "").split()
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        return None
+    return get_user_id_from_token(parts[1])
+
+
+def _admit(user_id: Optional[str]) -> None:
+    """Refuse new work with 429 when the queue or the user's share of it is full."""
+    if MAX_QUEUE_DEPTH and count_tasks([STATUS_PENDING]) >= MAX_QUEUE_DEPTH:
+        detail = "Task queue is full, try again later"
+        # a slot opens when a worker frees up and claims a pending task
+        retry_after = QueueEstimate().retry_after()
+    elif (
+        MAX_TASKS_PER_USER
+        and user_id is not None
+        and count_tasks([STATUS_PENDING, STATUS_RUNNING], user_id=user_id) >= MAX_TASKS_PER_USER
+    ):
+        detail = f"At most {MAX_TASKS_PER_USER} queued or running tasks per user"
+        # a slot opens when one of the user's own tasks is done
+        retry_after = QueueEstimate().retry_after(user_id)
+    else:
+        return
+    raise HTTPException(
+        status_code=429, detail=detail, headers={"Retry-After": str(retry_after)}
+    )
+
+
+def _created(task_id: str) -> TaskCreateResponse:
+    enqueue(task_id)
+    task = get_task(task_id)
+    return TaskCreateResponse(task_id=task_id, eta_seconds=eta_seconds(task))
+
+
 def _task_to_response(task) -> TaskResponse:
     params = task.params
     if isinstance(params, str):
@@ -36,6 +102,12 @@ def _task_to_response(task) -> TaskResponse:
             result = json.loads(result)
         except Exception:
             result = None
+    progress = getattr(task, "progress", None)
+    if isinstance(progress, str):
+        try:
+            progress = json.loads(progress)
+        except Exception:
+            progress = None
     return TaskResponse(
         id=task.id,
         type=task.type,
@@ -47,11 +119,16 @@ def _task_to_response(task) -> TaskResponse:
         result=result,
         error_message=task.error_message,
         project_id=getattr(task, "project_id", None),
+        priority=getattr(task, "priority", PRIORITY_INTERACTIVE),
+        eta_seconds=eta_seconds(task),
+        progress=progress,
     )
 
 
 @router.post("/generate", response_model=TaskCreateResponse, status_code=201)
-def post_generate(body: GenerateRequest):
+def post_generate(body: GenerateRequest, authorization: Optional[str] = Header(None)):
+    user_id = _user_id(authorization)
+    _admit(user_id)
     params = {
         "lyrics": body.lyrics,
         "tags": body.tags,
@@ -63,9 +140,52 @@ def post_generate(body: GenerateRequest):
     }
     if body.ref_file_id is not None:
         params["ref_file_id"] = body.ref_file_id
-    task_id = create_task("generate", params, project_id=body.project_id)
-    enqueue(task_id)
-    return TaskCreateResponse(task_id=task_id)
+    task_id = create_task(
+        "generate",
+        params,
+        project_id=body.project_id,
+        user_id=user_id,
+        priority=body.priority,
+    )
+    return _created(task_id)
+
+
+@router.post("/extend", response_model=TaskCreateResponse, status_code=201)
+def post_extend(body: ExtendRequest, authorization: Optional[str] = Header(None)):
+    user_id = _user_id(authorization)
+    _admit(user_id)
+    source = get_task(body.source_task_id)
+    if not source:
+        raise HTTPException(status_code=404, detail="Source task not found")
+    if source.type not in ("generate", "extend") or source.status != STATUS_COMPLETED:
+        raise HTTPException(
+            status_code=400,
+            detail="Only completed generate or extend tasks can be extended",
+        )
+    if not (Path(OUTPUT_DIR) / source.id / GENERATION_STATE_FILENAME).is_file():
+        raise HTTPException(status_code=400, detail="Source task has no stored frames")
+    source_params = source.params
+    if isinstance(source_params, str):
+        source_params = json.loads(source_params)
+    params = {
+        "source_task_id": source.id,
+        "lyrics": source_params.get("lyrics", ""),
+        "tags": source_params.get("tags", ""),
+        "version": source_params.get("version"),
+        "max_audio_length_ms": body.extend_audio_length_ms,
+        "topk": body.topk,
+        "temperature": body.temperature,
+        "cfg_scale": body.cfg_scale,
+    }
+    project_id = body.project_id or getattr(source, "project_id", None)
+    task_id = create_task(
+        "extend",
+        params,
+        project_id=project_id,
+        user_id=user_id,
+        priority=body.priority,
+    )
+    return _created(task_id)
 
 
 @router.post("/transcribe", response_model=TaskCreateResponse, status_code=201)
@@ -78,7 +198,13 @@ async def post_transcribe(
     compression_ratio_threshold: Optional[float] = Form(1.8),
     logprob_threshold: Optional[float] = Form(-1.0),
     no_speech_threshold: Optional[float] = Form(0.4),
+    priority: str = Form(PRIORITY_INTERACTIVE),
+    authorization: Optional[str] = Header(None),
 ):
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITY_CLASSES)}")
+    user_id = _user_id(authorization)
+    _admit(user_id)
     content = await file.read()
     if len(content) > MAX_UPLOAD_BYTES:
         raise HTTPException(status_code=400, detail="File too large")
@@ -104,10 +230,15 @@ async def post_transcribe(
         "logprob_threshold": logprob_threshold,
         "no_speech_threshold": no_speech_threshold,
     }
-    create_task_with_id(task_id, "transcribe", params)
+    create_task_with_id(
+        task_id,
+        "transcribe",
+        params,
+        user_id=user_id,
+        priority=priority,
+    )
     update_task(task_id, output_audio_path=rel_audio)
-    enqueue(task_id)
-    return TaskCreateResponse(task_id=task_id)
+    return _created(task_id)
 
 
 @router.get("", response_model=TaskListResponse)
@@ -131,6 +262,82 @@ def get_tasks(
     )
 
 
+@router.get("/queue/wait-histogram", response_model=QueueWaitResponse)
+def get_queue_wait_histogram(window_seconds: int = 3600):
+    """Per priority class histograms of how long the tasks started in the last
+    ``window_seconds`` waited in the queue."""
+    since = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
+    waits = list_queue_waits(since)
+    return QueueWaitResponse(
+        window_seconds=window_seconds,
+        classes={
+            priority: wait_histogram([w for p, w in waits if p == priority])
+            for priority in PRIORITY_CLASSES
+        },
+    )
+
+
+def _task_statuses(ids) -> TaskStatusResponse:
+    task_ids = list(dict.fromkeys(task_id for task_id in ids if task_id))
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="Pass task ids")
+    if len(task_ids) > MAX_STATUS_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_STATUS_IDS} task ids per request"
+        )
+    records = {record["id"]: record for record in get_task_records(task_ids)}
+    return TaskStatusResponse(
+        items=[TaskStatusRecord(**records[task_id]) for task_id in task_ids if task_id in records],
+        missing=[task_id for task_id in task_ids if task_id not in records],
+    )
+
+
+@router.get("/status", response_model=TaskStatusResponse)
+def get_task_statuses(ids: str = ""):
+    """Status, progress and output of the comma-separated task ``ids``, in one query."""
+    return _task_statuses(ids.split(","))
+
+
+@router.post("/status", response_model=TaskStatusResponse)
+def post_task_statuses(body: TaskStatusRequest):
+    """Same as ``GET /status``, for id lists too long for a URL."""
+    return _task_statuses(body.ids)
+
+
+def _event_stream(body) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/events")
+async def get_events(
+    request: Request,
+    ids: Optional[str] = None,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+):
+    """Server-Sent Events for the comma-separated task ``ids`` and, when signed in,
+    all of the user's tasks (new ones included). EventSource cannot send headers, so
+    the access token may also be passed as ``token``."""
+    user_id = _user_id(authorization or (f"Bearer {token}" if token else None))
+    task_ids = {task_id for task_id in (ids or "").split(",") if task_id}
+    if user_id is None and not task_ids:
+        raise HTTPException(status_code=400, detail="Pass task ids or sign in")
+    return _event_stream(broker.stream(request, task_ids, user_id))
+
+
+@router.get("/{task_id}/events")
+async def get_task_events(task_id: str, request: Request):
+    """Server-Sent Events with the task's current state and each change to it, until
+    it completes, fails or is cancelled."""
+    if not get_task(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _event_stream(broker.stream(request, {task_id}, close_when_done=True))
+
+
 @router.get("/{task_id}", response_model=TaskResponse)
 def get_task_detail(task_id: str):
     task = get_task(task_id)
@@ -139,6 +346,18 @@ def get_task_detail(task_id: str):
     return _task_to_response(task)
 
 
+@router.post("/{task_id}/cancel", response_model=TaskResponse)
+def post_cancel(task_id: str):
+    """Cancel a pending or running task. A running generation stops within a few
+    seconds, at the next frame or decode window."""
+    task = get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not cancel_task(task_id):
+        raise HTTPException(status_code=409, detail=f"Task is already {task.status}")
+    return _task_to_response(get_task(task_id))
+
+
 @router.patch("/{task_id}", response_model=TaskResponse)
 def patch_task(task_id: str, body: TaskPatchRequest):
     task = get_task(task_id)
@@ -0,0 +1,72 @@
+"""Order in which the task queue claims pending tasks.
+
+Pending tasks are ranked by:
+
+1. priority class: ``interactive`` (previews someone is waiting on) before ``batch``;
+   a batch task that has waited BATCH_AGING_SECONDS counts as interactive, so batch
+   work is never starved;
+2. fair share: the user who used the least worker time recently goes first, so one
+   user's batch of songs does not hold back everyone else;
+3. shortest expected job first, then oldest first.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from server.config import BATCH_AGING_SECONDS
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+# Oldest pending tasks of each (user, priority class) considered on each claim, so
+# one user's long backlog cannot crowd everyone else out of the candidates
+CANDIDATES_PER_GROUP = 20
+# Expected cost of a transcription, in seconds of generated audio; it runs much
+# faster than generating the song it transcribes
+TRANSCRIBE_COST = 10.0
+# Upper bounds (seconds) of the queue-wait histogram buckets
+WAIT_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def expected_cost(task_type: str, params: dict) -> float:
+    """Relative running time of a task, in seconds of generated audio."""
+    if task_type == "transcribe":
+        return TRANSCRIBE_COST
+    return (params.get("max_audio_length_ms") or 240_000) / 1000
+
+
+def _parse(ts: str) -> datetime:
+    return datetime.fromisoformat(ts)
+
+
+def order_candidates(
+    pending: List[Any],
+    usage_by_user: Dict[Optional[str], float],
+    now: Optional[datetime] = None,
+) -> List[Any]:
+    """Sort pending task rows (with user_id, priority, expected_cost and created_at)
+    best first. ``usage_by_user`` is the expected cost of each user's running and
+    recently started tasks."""
+    now = now or datetime.now(timezone.utc)
+
+    def rank(row):
+        created = _parse(row["created_at"])
+        interactive = (
+            row["priority"] != PRIORITY_BATCH
+            or (now - created).total_seconds() >= BATCH_AGING_SECONDS
+        )
+        return (
+            0 if interactive else 1,
+            usage_by_user.get(row["user_id"], 0.0),
+            row["expected_cost"] or 0.0,
+            created,
+        )
+
+    return sorted(pending, key=rank)
+
+
+def wait_histogram(waits: List[float]) -> Dict[str, Any]:
+    """Cumulative histogram (Prometheus style) of queue waits in seconds."""
+    buckets = [{"le": le, "count": sum(w <= le for w in waits)} for le in WAIT_BUCKETS]
+    buckets.append({"le": "+Inf", "count": len(waits)})
+    return {"buckets": buckets, "count": len(waits), "sum_seconds": sum(waits)}
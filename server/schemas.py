@@ -1,5 +1,5 @@
 """Request/response Pydantic models for API."""
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -16,6 +16,19 @@ class GenerateRequest(BaseModel):
     version: Optional[str] = "3B"
     project_id: Optional[str] = None
     ref_file_id: Optional[str] = None
+    # "interactive" (someone is waiting on it) or "batch"; see server/scheduler.py
+    priority: Literal["interactive", "batch"] = "interactive"
+
+
+class ExtendRequest(BaseModel):
+    """Continue a completed generate/extend task from its stored frames."""
+    source_task_id: str
+    extend_audio_length_ms: Optional[int] = 30_000
+    topk: Optional[int] = 50
+    temperature: Optional[float] = 1.0
+    cfg_scale: Optional[float] = 1.5
+    project_id: Optional[str] = None
+    priority: Literal["interactive", "batch"] = "interactive"
 
 
 class TranscribeRequestParams(BaseModel):
@@ -30,6 +43,8 @@ class TranscribeRequestParams(BaseModel):
 
 class TaskCreateResponse(BaseModel):
     task_id: str
+    # estimated seconds until the task completes (see server/eta.py)
+    eta_seconds: Optional[float] = None
 
 
 class TaskResponse(BaseModel):
@@ -43,6 +58,11 @@ class TaskResponse(BaseModel):
     result: Optional[Any] = None
     error_message: Optional[str] = None
     project_id: Optional[str] = None
+    priority: str = "interactive"
+    eta_seconds: Optional[float] = None
+    # latest progress of a running generation: {"stage": "generate" | "decode",
+    # "generate": {"done", "total", "per_second"}, "decode": {...}} (frames / windows)
+    progress: Optional[Any] = None
 
 
 class TaskListResponse(BaseModel):
@@ -50,6 +70,46 @@ class TaskListResponse(BaseModel):
     total: int
 
 
+class TaskStatusRecord(BaseModel):
+    """Compact task state, without the params / result JSON (see store.TASK_STATUS_COLUMNS)."""
+    id: str
+    type: str
+    status: str
+    updated_at: str
+    project_id: Optional[str] = None
+    priority: str = "interactive"
+    progress: Optional[Any] = None
+    output_audio_path: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+class TaskStatusRequest(BaseModel):
+    ids: List[str]
+
+
+class TaskStatusResponse(BaseModel):
+    items: List[TaskStatusRecord]
+    # requested ids with no task
+    missing: List[str]
+
+
+class QueueWaitHistogramBucket(BaseModel):
+    le: Any
+    count: int
+
+
+class QueueWaitHistogram(BaseModel):
+    buckets: List[QueueWaitHistogramBucket]
+    count: int
+    sum_seconds: float
+
+
+class QueueWaitResponse(BaseModel):
+    """Cumulative histograms of the time tasks started in the window spent pending."""
+    window_seconds: int
+    classes: Dict[str, QueueWaitHistogram]
+
+
 class TaskPatchRequest(BaseModel):
     result: Optional[Any] = None
 
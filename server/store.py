@@ -1,43 +1,108 @@
 """Task CRUD against SQLite."""
 import json
 import uuid
-from datetime import datetime, timezone
-from typing import Any, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
 
+from server.config import FAIR_SHARE_WINDOW_SECONDS
 from server.db import get_connection
 from server.models import Task, TaskStatus
+from server.scheduler import CANDIDATES_PER_GROUP, PRIORITY_INTERACTIVE, expected_cost, order_candidates
 
 STATUS_PENDING = TaskStatus.pending.name
 STATUS_RUNNING = TaskStatus.running.name
 STATUS_COMPLETED = TaskStatus.completed.name
 STATUS_FAILED = TaskStatus.failed.name
+STATUS_CANCELLED = TaskStatus.cancelled.name
+
+
+# Compact status record of a task (no params / result blobs), for status streams
+# and bulk status lookups
+TASK_STATUS_COLUMNS = (
+    "id, type, status, updated_at, user_id, project_id, priority, progress, "
+    "output_audio_path, error_message"
+)
+
+# Called with the id of every task this process changes (see add_task_listener)
+_task_listeners: List[Callable[[str], None]] = []
+
+
+def add_task_listener(listener: Callable[[str], None]) -> None:
+    """Call ``listener(task_id)`` after this process creates or changes a task."""
+    _task_listeners.append(listener)
+
+
+def _notify(task_id: str) -> None:
+    for listener in _task_listeners:
+        try:
+            listener(task_id)
+        except Exception as e:
+            print(f"Warning: task listener failed for {task_id}: {e}")
 
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def create_task(task_type: str, params: dict, project_id: Optional[str] = None) -> str:
+def _sortable_iso(dt: datetime) -> str:
+    # fixed width so lease and start timestamps compare correctly as strings in SQL
+    return dt.isoformat(timespec="microseconds")
+
+
+def create_task(
+    task_type: str,
+    params: dict,
+    project_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    priority: str = PRIORITY_INTERACTIVE,
+) -> str:
     """Insert a new task with status pending. Returns task_id."""
     task_id = str(uuid.uuid4())
-    _create_task_row(task_id, task_type, params, project_id)
+    _create_task_row(task_id, task_type, params, project_id, user_id, priority)
     return task_id
 
 
-def create_task_with_id(task_id: str, task_type: str, params: dict, project_id: Optional[str] = None) -> None:
+def create_task_with_id(
+    task_id: str,
+    task_type: str,
+    params: dict,
+    project_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    priority: str = PRIORITY_INTERACTIVE,
+) -> None:
     """Insert a task with given id and status pending."""
-    _create_task_row(task_id, task_type, params, project_id)
+    _create_task_row(task_id, task_type, params, project_id, user_id, priority)
 
 
-def _create_task_row(task_id: str, task_type: str, params: dict, project_id: Optional[str] = None) -> None:
+def _create_task_row(
+    task_id: str,
+    task_type: str,
+    params: dict,
+    project_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    priority: str = PRIORITY_INTERACTIVE,
+) -> None:
     now = _now_iso()
     with get_connection() as conn:
         conn.execute(
-            """INSERT INTO tasks (id, type, status, created_at, updated_at, params, project_id)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (task_id, task_type, STATUS_PENDING, now, now, json.dumps(params), project_id),
+            """INSERT INTO tasks (id, type, status, created_at, updated_at, params, project_id,
+                                  user_id, priority, expected_cost)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                task_id,
+                task_type,
+                STATUS_PENDING,
+                now,
+                now,
+                json.dumps(params),
+                project_id,
+                user_id,
+                priority,
+                expected_cost(task_type, params),
+            ),
         )
         conn.commit()
+    _notify(task_id)
 
 
 def get_task(task_id: str) -> Optional[Task]:
@@ -92,8 +157,9 @@ def list_tasks(
     return items, total
 
 
-def update_task(task_id: str, **fields: Any) -> bool:
-    """Update given columns for task. Returns True if a row was updated."""
+def update_task(task_id: str, expected_status: Optional[str] = None, **fields: Any) -> bool:
+    """Update given columns for task. Returns True if a row was updated.
+    With ``expected_status`` the row is only updated while it has that status."""
     allowed = {
         "status",
         "updated_at",
@@ -101,6 +167,7 @@ def update_task(task_id: str, **fields: Any) -> bool:
         "output_audio_path",
         "result",
         "error_message",
+        "progress",
     }
     updates = {k: v for k, v in fields.items() if k in allowed}
     if not updates:
@@ -111,17 +178,23 @@ def update_task(task_id: str, **fields: Any) -> bool:
     values = []
     for k in updates:
         v = updates[k]
-        if k in ("params", "result") and isinstance(v, dict):
+        if k in ("params", "result", "progress") and isinstance(v, dict):
             values.append(json.dumps(v))
         else:
             values.append(v)
     values.append(task_id)
+    where = "id = ?"
+    if expected_status is not None:
+        where += " AND status = ?"
+        values.append(expected_status)
     with get_connection() as conn:
         cur = conn.execute(
-            f"UPDATE tasks SET {set_clause} WHERE id = ?",
+            f"UPDATE tasks SET {set_clause} WHERE {where}",
             values,
         )
         conn.commit()
+    if cur.rowcount > 0:
+        _notify(task_id)
     return cur.rowcount > 0
 
 
@@ -131,3 +204,229 @@ def has_completed_generate_task(project_id: str) -> bool:
         return False
     tasks_list, _ = list_tasks(project_id=project_id, status=STATUS_COMPLETED, task_type="generate", page_size=1)
     return len(tasks_list) > 0
+
+
+def _usage_by_user(conn) -> Dict[Optional[str], float]:
+    """Expected cost of each user's running and recently started tasks, the fair-share
+    input of ``scheduler.order_candidates``."""
+    since = datetime.now(timezone.utc) - timedelta(seconds=FAIR_SHARE_WINDOW_SECONDS)
+    rows = conn.execute(
+        "SELECT user_id, SUM(expected_cost) AS recent_cost FROM tasks "
+        "WHERE status = ? OR started_at >= ? GROUP BY user_id",
+        (STATUS_RUNNING, _sortable_iso(since)),
+    ).fetchall()
+    return {row["user_id"]: row["recent_cost"] or 0.0 for row in rows}
+
+
+def claim_next_task(owner: str, lease_seconds: float) -> Optional[Task]:
+    """Claim the next pending task for ``owner`` in scheduler order (see
+    ``server.scheduler``) and return it, or None if the queue is empty. The claim is a
+    conditional UPDATE (pending -> running), so concurrent workers, in this process or
+    others sharing the database, never claim the same task.
+    """
+    with get_connection() as conn:
+        pending = conn.execute(
+            "SELECT id, user_id, priority, expected_cost, created_at FROM ("
+            "SELECT id, user_id, priority, expected_cost, created_at, ROW_NUMBER() OVER "
+            "(PARTITION BY user_id, priority ORDER BY created_at) AS group_position "
+            "FROM tasks WHERE status = ?) candidates WHERE group_position <= ?",
+            (STATUS_PENDING, CANDIDATES_PER_GROUP),
+        ).fetchall()
+        if not pending:
+            return None
+        for row in order_candidates(pending, _usage_by_user(conn)):
+            now = datetime.now(timezone.utc)
+            cur = conn.execute(
+                """UPDATE tasks SET status = ?, lease_owner = ?, lease_expires_at = ?,
+                   attempts = attempts + 1, started_at = ?, updated_at = ?
+                   WHERE id = ? AND status = ?""",
+                (
+                    STATUS_RUNNING,
+                    owner,
+                    _sortable_iso(now + timedelta(seconds=lease_seconds)),
+                    _sortable_iso(now),
+                    now.isoformat(),
+                    row["id"],
+                    STATUS_PENDING,
+                ),
+            )
+            conn.commit()
+            if cur.rowcount == 1:
+                break
+        else:
+            return None
+    _notify(row["id"])
+    return get_task(row["id"])
+
+
+def cancel_task(task_id: str) -> bool:
+    """Mark a pending or running task cancelled. A pending task is dropped from the
+    queue; the worker running a task notices its lease is gone and stops it. Returns
+    False if the task had already finished."""
+    with get_connection() as conn:
+        cur = conn.execute(
+            "UPDATE tasks SET status = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (STATUS_CANCELLED, _now_iso(), task_id, STATUS_PENDING, STATUS_RUNNING),
+        )
+        conn.commit()
+    if cur.rowcount > 0:
+        _notify(task_id)
+    return cur.rowcount > 0
+
+
+def renew_lease(task_id: str, owner: str, lease_seconds: float) -> bool:
+    """Extend the lease ``owner`` holds on a running task. Returns False if the lease
+    was lost (expired and re-queued, or the task is no longer running)."""
+    expires = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+    with get_connection() as conn:
+        cur = conn.execute(
+            "UPDATE tasks SET lease_expires_at = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+            (_sortable_iso(expires), task_id, owner, STATUS_RUNNING),
+        )
+        conn.commit()
+    return cur.rowcount > 0
+
+
+def release_lease(task_id: str, owner: str) -> bool:
+    """Drop ``owner``'s lease on a task; a task still running is marked failed."""
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE tasks SET status = ?, error_message = ?, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ? AND status = ?",
+            (STATUS_FAILED, "Worker finished without a result", _now_iso(), task_id, owner, STATUS_RUNNING),
+        )
+        cur = conn.execute(
+            "UPDATE tasks SET lease_owner = NULL, lease_expires_at = NULL WHERE id = ? AND lease_owner = ?",
+            (task_id, owner),
+        )
+        conn.commit()
+    _notify(task_id)
+    return cur.rowcount > 0
+
+
+def requeue_expired_leases(max_attempts: int, include_unleased: bool = False) -> int:
+    """Put running tasks whose lease expired back to pending, or mark them failed once
+    they used up ``max_attempts``. ``include_unleased`` also recovers running tasks
+    without a lease (started before leasing existed). Returns the number re-queued.
+    """
+    now = _now_iso()
+    expired = "status = ? AND (lease_expires_at < ?"
+    expired += " OR lease_expires_at IS NULL)" if include_unleased else ")"
+    with get_connection() as conn:
+        conn.execute(
+            f"""UPDATE tasks SET status = ?, lease_owner = NULL, lease_expires_at = NULL,
+                error_message = ?, updated_at = ?
+                WHERE {expired} AND attempts >= ?""",
+            (
+                STATUS_FAILED,
+                f"Worker lost {max_attempts} times",
+                now,
+                STATUS_RUNNING,
+                _sortable_iso(datetime.now(timezone.utc)),
+                max_attempts,
+            ),
+        )
+        cur = conn.execute(
+            f"""UPDATE tasks SET status = ?, lease_owner = NULL, lease_expires_at = NULL,
+                updated_at = ?
+                WHERE {expired}""",
+            (STATUS_PENDING, now, STATUS_RUNNING, _sortable_iso(datetime.now(timezone.utc))),
+        )
+        conn.commit()
+    return cur.rowcount
+
+
+def list_queue_waits(since: datetime) -> List[tuple[str, float]]:
+    """(priority, seconds from creation to start) of the tasks started since ``since``."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT priority, created_at, started_at FROM tasks WHERE started_at >= ?",
+            (_sortable_iso(since),),
+        ).fetchall()
+    return [
+        (
+            row["priority"],
+            (datetime.fromisoformat(row["started_at"]) - datetime.fromisoformat(row["created_at"])).total_seconds(),
+        )
+        for row in rows
+    ]
+
+
+def count_tasks(statuses: List[str], user_id: Optional[str] = None) -> int:
+    """Number of tasks in one of ``statuses``, of ``user_id`` if given."""
+    conditions = [f"status IN ({', '.join('?' for _ in statuses)})"]
+    args: List[Any] = list(statuses)
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        args.append(user_id)
+    with get_connection() as conn:
+        row = conn.execute(
+            f"SELECT COUNT(*) AS total FROM tasks WHERE {' AND '.join(conditions)}", args
+        ).fetchone()
+    return row["total"] if row is not None else 0
+
+
+def list_queue(
+    limit: int = 1000,
+) -> tuple[List[Any], List[Any], Dict[Optional[str], float]]:
+    """(running, pending, usage_by_user): rows with id, type, user_id, priority,
+    expected_cost, created_at and started_at, pending oldest first, and the fair-share
+    usage claim_next_task ranks the pending tasks with."""
+    columns = "id, type, user_id, priority, expected_cost, created_at, started_at"
+    with get_connection() as conn:
+        running = conn.execute(
+            f"SELECT {columns} FROM tasks WHERE status = ?", (STATUS_RUNNING,)
+        ).fetchall()
+        pending = conn.execute(
+            f"SELECT {columns} FROM tasks WHERE status = ? ORDER BY created_at LIMIT ?",
+            (STATUS_PENDING, limit),
+        ).fetchall()
+        usage_by_user = _usage_by_user(conn)
+    return running, pending, usage_by_user
+
+
+def list_recent_completed(limit: int = 50) -> List[Any]:
+    """type, expected_cost, started_at and updated_at of the last completed tasks,
+    oldest first."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT type, expected_cost, started_at, updated_at FROM tasks "
+            "WHERE status = ? AND started_at IS NOT NULL ORDER BY updated_at DESC LIMIT ?",
+            (STATUS_COMPLETED, limit),
+        ).fetchall()
+    return list(reversed(rows))
+
+
+def _status_record(row: Any) -> Dict[str, Any]:
+    record = {key: row[key] for key in row.keys()}
+    if isinstance(record.get("progress"), str):
+        try:
+            record["progress"] = json.loads(record["progress"])
+        except ValueError:
+            record["progress"] = None
+    return record
+
+
+def get_task_records(task_ids: List[str]) -> List[Dict[str, Any]]:
+    """Compact status records (TASK_STATUS_COLUMNS) of the given tasks, in one query."""
+    if not task_ids:
+        return []
+    placeholders = ", ".join("?" for _ in task_ids)
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"SELECT {TASK_STATUS_COLUMNS} FROM tasks WHERE id IN ({placeholders})",
+            list(task_ids),
+        ).fetchall()
+    return [_status_record(row) for row in rows]
+
+
+def list_task_changes(since: str, limit: int = 500) -> List[Dict[str, Any]]:
+    """Compact status records of the tasks changed after ``since`` (an updated_at
+    value), oldest change first."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"SELECT {TASK_STATUS_COLUMNS} FROM tasks WHERE updated_at > ? "
+            "ORDER BY updated_at LIMIT ?",
+            (since, limit),
+        ).fetchall()
+    return [_status_record(row) for row in rows]
@@ -4,13 +4,15 @@ import pytest
 
 @pytest.fixture
 def app_client(tmp_path, monkeypatch):
-    """TestClient with SQLite in tmp_path and enqueue no-op (no worker run).
+    """TestClient with SQLite in tmp_path, enqueue no-op and no worker or reaper threads.
     Uses context manager so lifespan (init_db) runs before requests.
     """
     monkeypatch.setattr("server.config.USE_MYSQL", False)
     monkeypatch.setattr("server.config.OUTPUT_DIR", str(tmp_path))
     monkeypatch.setattr("server.db.SQLITE_DB_PATH", str(tmp_path / "heartlib.db"))
     monkeypatch.setattr("server.queue.enqueue", lambda _: None)
+    monkeypatch.setattr("server.queue._worker_loop", lambda: None)
+    monkeypatch.setattr("server.queue._reaper_loop", lambda: None)
 
     from fastapi.testclient import TestClient
     from server.main import app
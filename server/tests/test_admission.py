@@ -0,0 +1,94 @@
+"""Tests for admission control (429 + Retry-After) and task ETAs."""
+import math
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from server import eta, store
+from server.utils.auth import create_access_token
+
+_BODY = {"lyrics": "x", "tags": "t", "max_audio_length_ms": 30_000}
+
+
+def test_queue_depth_limit(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr("server.routes.tasks.MAX_QUEUE_DEPTH", 2)
+    for _ in range(2):
+        assert app_client.post("/api/tasks/generate", json=_BODY).status_code == 201
+    r = app_client.post("/api/tasks/generate", json=_BODY)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) == eta.DEFAULT_RETRY_AFTER
+
+
+def test_per_user_limit(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr("server.routes.tasks.MAX_TASKS_PER_USER", 1)
+    alice = {"Authorization": f"Bearer {create_access_token({'sub': 'alice'})}"}
+    bob = {"Authorization": f"Bearer {create_access_token({'sub': 'bob'})}"}
+    assert app_client.post("/api/tasks/generate", json=_BODY, headers=alice).status_code == 201
+    # running tasks count toward the limit too
+    store.claim_next_task("w", 60)
+    assert app_client.post("/api/tasks/generate", json=_BODY, headers=alice).status_code == 429
+    assert app_client.post("/api/tasks/generate", json=_BODY, headers=bob).status_code == 201
+
+
+def test_eta_follows_measured_rate(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr(eta, "_rates_loaded_at", -math.inf)
+    first = app_client.post("/api/tasks/generate", json=_BODY).json()
+    second = app_client.post("/api/tasks/generate", json=_BODY).json()
+    # no history: one second per second of audio, queued behind the first task
+    assert first["eta_seconds"] == 30.0
+    assert second["eta_seconds"] == 60.0
+
+    # the first task takes 60 s for 30 s of audio
+    task = store.claim_next_task("w", 60)
+    started = datetime.fromisoformat(task.started_at)
+    store.update_task(
+        task.id,
+        status=store.STATUS_COMPLETED,
+        updated_at=(started + timedelta(seconds=60)).isoformat(),
+    )
+    monkeypatch.setattr(eta, "_rates_loaded_at", -math.inf)
+    monkeypatch.setattr(eta, "_estimate_loaded_at", -math.inf)
+    detail = app_client.get(f"/api/tasks/{second['task_id']}").json()
+    assert detail["eta_seconds"] == 60.0
+    assert app_client.get(f"/api/tasks/{task.id}").json()["eta_seconds"] is None
+
+
+def test_eta_follows_scheduler_order(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr(eta, "_rates_loaded_at", -math.inf)
+    for _ in range(5):
+        store.create_task("generate", {"max_audio_length_ms": 240_000}, priority="batch")
+    preview = store.create_task("generate", {"max_audio_length_ms": 10_000}, user_id="bob")
+    # the interactive preview is claimed next, so it does not wait for the batch songs
+    assert app_client.get(f"/api/tasks/{preview}").json()["eta_seconds"] == 10.0
+    assert store.claim_next_task("w", 60).id == preview
+
+
+def test_per_user_retry_after_follows_own_tasks(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr(eta, "_rates_loaded_at", -math.inf)
+    monkeypatch.setattr("server.routes.tasks.MAX_TASKS_PER_USER", 1)
+    alice = {"Authorization": f"Bearer {create_access_token({'sub': 'alice'})}"}
+    store.create_task("generate", {"max_audio_length_ms": 5_000}, user_id="bob")
+    assert app_client.post("/api/tasks/generate", json=_BODY, headers=alice).status_code == 201
+    store.claim_next_task("w1", 60)
+    store.claim_next_task("w2", 60)
+    r = app_client.post("/api/tasks/generate", json=_BODY, headers=alice)
+    assert r.status_code == 429
+    # alice's own 30 s song frees her slot, not bob's 5 s one
+    assert int(r.headers["Retry-After"]) == 30
+
+
+def test_polls_share_one_queue_snapshot(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr(eta, "_rates_loaded_at", -math.inf)
+    queued = app_client.post("/api/tasks/generate", json=_BODY).json()["task_id"]
+    done = store.create_task("generate", {"max_audio_length_ms": 30_000})
+    store.update_task(done, status=store.STATUS_COMPLETED)
+    snapshots = []
+    list_queue = eta.list_queue
+    monkeypatch.setattr(eta, "list_queue", lambda: snapshots.append(1) or list_queue())
+
+    assert app_client.get(f"/api/tasks/{done}").json()["eta_seconds"] is None
+    assert snapshots == []
+    for _ in range(3):
+        assert app_client.get(f"/api/tasks/{queued}").json()["eta_seconds"] == 30.0
+        assert app_client.get("/api/tasks").status_code == 200
+    assert len(snapshots) <= 1
@@ -0,0 +1,80 @@
+"""Tests for POST /api/tasks/{id}/cancel and stopping a cancelled running task."""
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from server import queue, store
+
+_BODY = {"lyrics": "x", "tags": "t", "max_audio_length_ms": 30_000}
+
+
+def test_cancel_pending_task_drops_it_from_queue(app_client: TestClient):
+    task_id = app_client.post("/api/tasks/generate", json=_BODY).json()["task_id"]
+    r = app_client.post(f"/api/tasks/{task_id}/cancel")
+    assert r.status_code == 200
+    assert r.json()["status"] == "cancelled"
+    assert store.claim_next_task("w", 60) is None
+    assert app_client.post(f"/api/tasks/{task_id}/cancel").status_code == 409
+    assert app_client.post("/api/tasks/missing/cancel").status_code == 404
+
+
+def test_cancel_running_task_stops_worker(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr(queue, "QUEUE_POLL_SECONDS", 0.05)
+    task_id = app_client.post("/api/tasks/generate", json=_BODY).json()["task_id"]
+    started, stopped = threading.Event(), threading.Event()
+
+    def fake_run_task(task, cancel_event=None):
+        started.set()
+        if cancel_event.wait(10):
+            stopped.set()
+        # a late result must not overwrite the cancellation
+        store.update_task(task.id, expected_status=store.STATUS_RUNNING, status=store.STATUS_COMPLETED)
+
+    monkeypatch.setattr(queue, "run_task", fake_run_task)
+    worker = threading.Thread(target=queue.work_once, args=("worker",))
+    worker.start()
+    assert started.wait(10)
+    assert app_client.post(f"/api/tasks/{task_id}/cancel").json()["status"] == "cancelled"
+    worker.join(10)
+    assert stopped.is_set()
+    task = store.get_task(task_id)
+    assert task.status == store.STATUS_CANCELLED and task.lease_owner is None
+
+
+def test_failed_lease_renewal_is_retried(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr(queue, "QUEUE_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(queue, "LEASE_SECONDS", 0.5)
+    task_id = app_client.post("/api/tasks/generate", json=_BODY).json()["task_id"]
+    renew_lease = store.renew_lease
+    failures = []
+
+    def flaky_renew_lease(*args):
+        if not failures:
+            failures.append(True)
+            raise RuntimeError("database is locked")
+        return renew_lease(*args)
+
+    started, stopped = threading.Event(), threading.Event()
+
+    def fake_run_task(task, cancel_event=None):
+        started.set()
+        if cancel_event.wait(10):
+            stopped.set()
+
+    monkeypatch.setattr(store, "renew_lease", flaky_renew_lease)
+    monkeypatch.setattr(queue, "run_task", fake_run_task)
+    worker = threading.Thread(target=queue.work_once, args=("worker",))
+    worker.start()
+    assert started.wait(10)
+    # well past the first lease: the heartbeat kept renewing after the error
+    time.sleep(1.0)
+    assert failures and not stopped.is_set()
+    assert store.requeue_expired_leases(max_attempts=3) == 0
+    assert store.get_task(task_id).status == store.STATUS_RUNNING
+
+    # and the running worker still notices a cancellation
+    assert app_client.post(f"/api/tasks/{task_id}/cancel").json()["status"] == "cancelled"
+    worker.join(10)
+    assert stopped.is_set()
+    assert store.get_task(task_id).status == store.STATUS_CANCELLED
@@ -0,0 +1,148 @@
+"""Tests for the task Server-Sent Events streams."""
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server import store
+from server.db import get_connection
+from server.events import broker
+
+
+def _events(response, count=None):
+    records = []
+    for line in response.iter_lines():
+        if line.startswith("data: "):
+            records.append(json.loads(line[len("data: "):]))
+            if count is not None and len(records) == count:
+                break
+    return records
+
+
+def _later(*updates):
+    def run():
+        for task_id, fields in updates:
+            time.sleep(0.2)
+            store.update_task(task_id, **fields)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def test_task_stream_follows_task_until_it_finishes(app_client: TestClient):
+    task_id = store.create_task("generate", {"lyrics": "", "tags": ""})
+    _later(
+        (task_id, {"status": "running"}),
+        (task_id, {"progress": {"stage": "generate", "generate": {"done": 3, "total": 9}}}),
+        (task_id, {"status": "completed", "output_audio_path": f"{task_id}/audio.mp3"}),
+    )
+    with app_client.stream("GET", f"/api/tasks/{task_id}/events") as r:
+        assert r.headers["content-type"].startswith("text/event-stream")
+        records = _events(r)
+    assert [rec["status"] for rec in records] == ["pending", "running", "running", "completed"]
+    assert records[2]["progress"]["generate"]["done"] == 3
+    assert "params" not in records[0]
+    assert records[-1]["output_audio_path"] == f"{task_id}/audio.mp3"
+
+
+def test_finished_task_stream_closes_immediately(app_client: TestClient):
+    task_id = store.create_task("generate", {"lyrics": "", "tags": ""})
+    store.cancel_task(task_id)
+    with app_client.stream("GET", f"/api/tasks/{task_id}/events") as r:
+        assert [rec["status"] for rec in _events(r)] == ["cancelled"]
+    assert app_client.get("/api/tasks/missing/events").status_code == 404
+
+
+class _Request:
+    async def is_disconnected(self):
+        return False
+
+
+def test_user_stream_includes_new_tasks(app_client: TestClient):
+    # TestClient buffers whole responses, so the never-ending user stream is read
+    # from the broker directly
+    other = store.create_task("generate", {"lyrics": "", "tags": ""}, user_id="bob")
+
+    def submit():
+        time.sleep(0.2)
+        store.update_task(other, status="running")
+        store.create_task("generate", {"lyrics": "", "tags": ""}, user_id="alice")
+
+    async def first_event():
+        stream = broker.stream(_Request(), set(), user_id="alice")
+        try:
+            return await asyncio.wait_for(stream.__anext__(), 10)
+        finally:
+            await stream.aclose()
+
+    threading.Thread(target=submit, daemon=True).start()
+    event = asyncio.run(first_event())
+    record = json.loads(event.split("data: ", 1)[1])
+    assert record["status"] == "pending" and store.get_task(record["id"]).user_id == "alice"
+    # user ids route events but are not sent to clients
+    assert "user_id" not in record
+
+
+def test_user_stream_needs_ids_or_sign_in(app_client: TestClient):
+    assert app_client.get("/api/tasks/events").status_code == 400
+
+
+@pytest.mark.parametrize("clock_behind", [0, 5])
+def test_changes_from_other_processes_reach_streams(
+    app_client: TestClient, monkeypatch, clock_behind
+):
+    """Writes that bypass this process's store hooks are picked up by the change feed,
+    also when the writing worker's clock is behind."""
+    monkeypatch.setattr(broker, "poll_seconds", 0.05)
+    task_id = store.create_task("generate", {"lyrics": "", "tags": ""})
+
+    def remote_worker():
+        time.sleep(0.3)
+        with get_connection() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = ?, updated_at = ? WHERE id = ?",
+                (
+                    "completed",
+                    (datetime.now(timezone.utc) - timedelta(seconds=clock_behind)).isoformat(),
+                    task_id,
+                ),
+            )
+            conn.commit()
+
+    threading.Thread(target=remote_worker, daemon=True).start()
+    with app_client.stream("GET", f"/api/tasks/{task_id}/events") as r:
+        assert [rec["status"] for rec in _events(r)] == ["pending", "completed"]
+
+
+def test_streams_do_not_block_the_event_loop(app_client: TestClient):
+    """The read lock may be held by the change-feed poller's DB reads; opening a stream
+    or changing a task from async code must not stall other requests meanwhile."""
+    task_id = store.create_task("generate", {"lyrics": "", "tags": ""})
+    held = threading.Event()
+
+    def slow_poller():
+        with broker._read_lock:
+            held.set()
+            time.sleep(1.0)
+
+    async def run():
+        stream = broker.stream(_Request(), {task_id})
+        first = asyncio.ensure_future(stream.__anext__())
+        try:
+            started = time.monotonic()
+            await asyncio.sleep(0.1)
+            # an async route changing a task
+            store.update_task(task_id, status="running")
+            stalled = time.monotonic() - started
+            return stalled, await asyncio.wait_for(first, 10)
+        finally:
+            await stream.aclose()
+
+    threading.Thread(target=slow_poller, daemon=True).start()
+    assert held.wait(10)
+    stalled, event = asyncio.run(run())
+    assert stalled < 0.5
+    assert json.loads(event.split("data: ", 1)[1])["id"] == task_id
@@ -0,0 +1,35 @@
+"""Tests for throttled task progress writes and progress on TaskResponse."""
+from fastapi.testclient import TestClient
+
+from server import store
+from server.progress import TaskProgressWriter
+
+
+def _event(stage, done, total):
+    return {"stage": stage, "unit": "frames", "done": done, "total": total, "per_second": 10.0}
+
+
+def test_progress_writes_are_throttled(app_client: TestClient):
+    task_id = store.create_task("generate", {"lyrics": "", "tags": ""})
+    store.claim_next_task("w", 60)
+    writer = TaskProgressWriter(task_id, interval=3600)
+    for done in range(1, 101):
+        writer(_event("generate", done, 300))
+    # only the first report got through; the rest coalesce into the latest state
+    assert writer.writes == 1
+    body = app_client.get(f"/api/tasks/{task_id}").json()
+    assert body["progress"]["generate"]["done"] == 1
+
+    writer(_event("generate", 120, 120))
+    writer(_event("decode", 1, 3))
+    assert writer.writes == 2
+    progress = app_client.get(f"/api/tasks/{task_id}").json()["progress"]
+    assert progress["stage"] == "generate"
+    assert progress["generate"] == {"done": 120, "total": 120, "per_second": 10.0}
+
+
+def test_progress_is_not_written_after_task_ends(app_client: TestClient):
+    task_id = store.create_task("generate", {"lyrics": "", "tags": ""})
+    store.cancel_task(task_id)
+    TaskProgressWriter(task_id)(_event("generate", 1, 10))
+    assert store.get_task(task_id).progress is None
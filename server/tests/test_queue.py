@@ -0,0 +1,68 @@
+"""Tests for the DB-backed task queue (claim, lease renewal, expiry, re-queue)."""
+from fastapi.testclient import TestClient
+
+from server import db, queue, store
+
+
+def _create(n: int) -> list:
+    return [store.create_task("generate", {"lyrics": str(i), "tags": "t"}) for i in range(n)]
+
+
+def test_claim_is_exclusive_and_oldest_first(app_client: TestClient):
+    first, second = _create(2)
+    a = store.claim_next_task("worker-a", 60)
+    b = store.claim_next_task("worker-b", 60)
+    assert (a.id, b.id) == (first, second)
+    assert a.status == store.STATUS_RUNNING and a.lease_owner == "worker-a" and a.attempts == 1
+    assert store.claim_next_task("worker-c", 60) is None
+    assert store.renew_lease(first, "worker-a", 60)
+    assert not store.renew_lease(first, "worker-b", 60)
+
+
+def test_expired_lease_is_requeued_then_failed(app_client: TestClient):
+    (task_id,) = _create(1)
+    store.claim_next_task("crashed", -1)
+    assert store.requeue_expired_leases(max_attempts=2) == 1
+    task = store.get_task(task_id)
+    assert task.status == store.STATUS_PENDING and task.lease_owner is None
+    # the crashed worker cannot extend a lease it lost
+    assert not store.renew_lease(task_id, "crashed", 60)
+
+    store.claim_next_task("crashed-again", -1)
+    assert store.requeue_expired_leases(max_attempts=2) == 0
+    task = store.get_task(task_id)
+    assert task.status == store.STATUS_FAILED and task.attempts == 2
+
+
+def test_live_lease_is_not_requeued(app_client: TestClient):
+    (task_id,) = _create(1)
+    store.claim_next_task("alive", 60)
+    assert store.requeue_expired_leases(max_attempts=3) == 0
+    assert store.get_task(task_id).status == store.STATUS_RUNNING
+
+
+def test_work_once_runs_claimed_task_and_releases_lease(app_client: TestClient, monkeypatch):
+    finished, unfinished = _create(2)
+    ran = []
+
+    def fake_run_task(task, cancel_event=None):
+        ran.append((task.id, task.status))
+        if task.id == finished:
+            store.update_task(task.id, status=store.STATUS_COMPLETED)
+
+    monkeypatch.setattr(queue, "run_task", fake_run_task)
+    assert queue.work_once("worker")
+    assert queue.work_once("worker")
+    assert not queue.work_once("worker")
+    assert ran == [(finished, store.STATUS_RUNNING), (unfinished, store.STATUS_RUNNING)]
+    done, dropped = store.get_task(finished), store.get_task(unfinished)
+    assert done.status == store.STATUS_COMPLETED and done.lease_owner is None
+    # a worker function that returns without a result does not leave the task running
+    assert dropped.status == store.STATUS_FAILED and dropped.lease_expires_at is None
+
+
+def test_queue_indexes_are_created_once(app_client: TestClient):
+    for index, _ in db._QUEUE_INDEXES:
+        assert db._tasks_index_exists(index)
+    # init_db on an existing database leaves them alone
+    db._add_queue_indexes_to_tasks()
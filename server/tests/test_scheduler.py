@@ -0,0 +1,81 @@
+"""Tests for task scheduling: priority classes, fair share, shortest job first."""
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from server import store
+from server.config import BATCH_AGING_SECONDS
+from server.scheduler import order_candidates
+
+
+def _row(task_id, user_id=None, priority="interactive", cost=30.0, age=0.0, now=None):
+    created = now - timedelta(seconds=age)
+    return {
+        "id": task_id,
+        "user_id": user_id,
+        "priority": priority,
+        "expected_cost": cost,
+        "created_at": created.isoformat(),
+    }
+
+
+def test_order_candidates():
+    now = datetime.now(timezone.utc)
+    rows = [
+        _row("batch", priority="batch", cost=1.0, age=10, now=now),
+        _row("long", cost=240.0, age=10, now=now),
+        _row("short", cost=20.0, age=5, now=now),
+        _row("heavy-user", user_id="a", cost=1.0, age=20, now=now),
+        _row("aged-batch", priority="batch", cost=500.0, age=BATCH_AGING_SECONDS + 1, now=now),
+    ]
+    ordered = [r["id"] for r in order_candidates(rows, {"a": 600.0}, now=now)]
+    assert ordered == ["short", "long", "aged-batch", "heavy-user", "batch"]
+
+
+def _generate(user_id, seconds, priority="interactive"):
+    return store.create_task(
+        "generate",
+        {"lyrics": "", "tags": "", "max_audio_length_ms": seconds * 1000},
+        user_id=user_id,
+        priority=priority,
+    )
+
+
+def test_claims_share_workers_between_users(app_client: TestClient):
+    a1, a2, a3 = (_generate("a", 30) for _ in range(3))
+    b1 = _generate("b", 60)
+    claimed = [store.claim_next_task("w", 60).id for _ in range(4)]
+    # b's longer song is not stuck behind all of a's batch
+    assert claimed == [a1, b1, a2, a3]
+
+
+def test_long_backlog_does_not_hide_other_users(app_client: TestClient, monkeypatch):
+    monkeypatch.setattr("server.store.CANDIDATES_PER_GROUP", 2)
+    for _ in range(5):
+        _generate("a", 10, priority="batch")
+    b1 = _generate("b", 240, priority="batch")
+    c1 = _generate("c", 240)
+    # c's interactive task and b's batch one are candidates despite a's older backlog
+    assert store.claim_next_task("w", 60).id == c1
+    store.claim_next_task("w", 60)
+    assert store.claim_next_task("w", 60).id == b1
+
+
+def test_queue_wait_histogram(app_client: TestClient):
+    _generate(None, 30)
+    _generate(None, 30, priority="batch")
+    store.claim_next_task("w", 60)
+    r = app_client.get("/api/tasks/queue/wait-histogram")
+    assert r.status_code == 200
+    classes = r.json()["classes"]
+    assert classes["interactive"]["count"] == 1
+    assert classes["interactive"]["buckets"][0] == {"le": 1, "count": 1}
+    assert classes["batch"]["count"] == 0
+
+
+def test_post_generate_stores_priority(app_client: TestClient):
+    body = {"lyrics": "x", "tags": "t", "priority": "batch"}
+    task_id = app_client.post("/api/tasks/generate", json=body).json()["task_id"]
+    assert app_client.get(f"/api/tasks/{task_id}").json()["priority"] == "batch"
+    body["priority"] = "urgent"
+    assert app_client.post("/api/tasks/generate", json=body).status_code == 422
@@ -0,0 +1,32 @@
+"""Tests for the bulk task status endpoint (GET/POST /api/tasks/status)."""
+from fastapi.testclient import TestClient
+
+from server import store
+
+
+def _create(n: int) -> list:
+    return [store.create_task("generate", {"lyrics": str(i), "tags": "t"}) for i in range(n)]
+
+
+def test_status_records_in_request_order(app_client: TestClient):
+    first, second = _create(2)
+    store.update_task(second, status=store.STATUS_RUNNING, progress='{"stage": "generate"}')
+    r = app_client.get(f"/api/tasks/status?ids={second},missing,{first},{second}")
+    assert r.status_code == 200
+    data = r.json()
+    assert [item["id"] for item in data["items"]] == [second, first]
+    assert data["missing"] == ["missing"]
+    running = data["items"][0]
+    assert running["status"] == "running" and running["progress"] == {"stage": "generate"}
+    # compact records never carry the params / result blobs
+    assert "params" not in running and "result" not in running
+
+
+def test_status_post_and_limits(app_client: TestClient, monkeypatch):
+    task_ids = _create(3)
+    r = app_client.post("/api/tasks/status", json={"ids": task_ids})
+    assert [item["status"] for item in r.json()["items"]] == ["pending"] * 3
+
+    monkeypatch.setattr("server.routes.tasks.MAX_STATUS_IDS", 2)
+    assert app_client.post("/api/tasks/status", json={"ids": task_ids}).status_code == 400
+    assert app_client.get("/api/tasks/status").status_code == 400
@@ -50,3 +50,34 @@ def test_list_tasks_filters_by_project_id(app_client: TestClient):
     r3 = app_client.get("/api/tasks", params={"project_id": "other-proj", "page": 1, "page_size": 10})
     ids = [t["id"] for t in r3.json()["items"]]
     assert task_id not in ids
+
+
+def test_post_extend_requires_completed_source_with_frames(app_client: TestClient, tmp_path, monkeypatch):
+    """POST /api/tasks/extend continues a completed task that has stored frames."""
+    from server.store import create_task, update_task
+
+    monkeypatch.setattr("server.routes.tasks.OUTPUT_DIR", str(tmp_path))
+    r = app_client.post("/api/tasks/extend", json={"source_task_id": "missing"})
+    assert r.status_code == 404
+
+    source_id = create_task("generate", {"lyrics": "L", "tags": "T", "version": "3B"}, project_id="p1")
+    r = app_client.post("/api/tasks/extend", json={"source_task_id": source_id})
+    assert r.status_code == 400
+
+    update_task(source_id, status="completed", output_audio_path=f"{source_id}/audio.mp3")
+    r = app_client.post("/api/tasks/extend", json={"source_task_id": source_id})
+    assert r.status_code == 400
+
+    (tmp_path / source_id).mkdir()
+    (tmp_path / source_id / "state.pt").write_bytes(b"")
+    r = app_client.post(
+        "/api/tasks/extend",
+        json={"source_task_id": source_id, "extend_audio_length_ms": 20000},
+    )
+    assert r.status_code == 201
+    task = app_client.get(f"/api/tasks/{r.json()['task_id']}").json()
+    assert task["type"] == "extend"
+    assert task["project_id"] == "p1"
+    assert task["params"]["source_task_id"] == source_id
+    assert task["params"]["lyrics"] == "L"
+    assert task["params"]["max_audio_length_ms"] == 20000
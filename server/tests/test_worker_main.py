@@ -0,0 +1,41 @@
+"""Tests for the standalone worker process (python -m server.worker_main)."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from server import queue, store, worker_main
+
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def test_once_drains_tasks_created_through_the_api(app_client: TestClient, monkeypatch):
+    body = {"lyrics": "Hello world", "tags": "test", "max_audio_length_ms": 10000}
+    task_ids = [app_client.post("/api/tasks/generate", json=body).json()["task_id"] for _ in range(3)]
+    ran = []
+
+    def fake_run_task(task, cancel_event=None):
+        ran.append(task.id)
+        store.update_task(task.id, status=store.STATUS_COMPLETED)
+
+    monkeypatch.setattr(queue, "run_task", fake_run_task)
+    assert worker_main.main(["--once"]) == 0
+    assert sorted(ran) == sorted(task_ids)
+    for task_id in task_ids:
+        assert app_client.get(f"/api/tasks/{task_id}").json()["status"] == "completed"
+
+
+def test_worker_runs_as_separate_process(tmp_path):
+    env = {**os.environ, "HEARTLIB_OUTPUT_DIR": str(tmp_path), "DB_HOST": ""}
+    result = subprocess.run(
+        [sys.executable, "-m", "server.worker_main", "--once"],
+        cwd=_REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / "heartlib.db").is_file()
@@ -0,0 +1,73 @@
+"""Standalone task worker process.
+
+    python -m server.worker_main --concurrency 1
+
+Claims tasks from the same database as the API server (see ``server.queue``) and
+runs them, so generation and transcription run outside the API process: a CUDA
+out-of-memory error or a crash takes down the worker only, and its leases expire
+and the tasks are picked up again. Start any number of workers, one per GPU, on
+one or more hosts; they need the API's database (MySQL, or the SQLite file on the
+same host) and its HEARTLIB_OUTPUT_DIR. Run the API with HEARTLIB_CONCURRENCY=0 to
+leave all tasks to the workers.
+"""
+import argparse
+import signal
+import threading
+from typing import List, Optional
+
+from server import queue
+from server.db import init_db
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m server.worker_main")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of tasks this process runs at a time (default: 1).",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Run the pending tasks, then exit instead of waiting for new ones.",
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.concurrency < 1:
+        raise SystemExit("--concurrency must be at least 1")
+    init_db()
+    if args.once:
+        owner = f"{queue._owner_id()}:once"
+        while queue.work_once(owner):
+            pass
+        return 0
+
+    stop = threading.Event()
+
+    def _shutdown(signum, frame):
+        print("Worker stopping after the running tasks finish...")
+        stop.set()
+        queue._wakeup.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    threads = [
+        threading.Thread(target=queue._worker_loop, args=(stop,), name=f"heartlib-worker-{i}")
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    print(f"Worker started with {args.concurrency} slot(s).")
+    while any(t.is_alive() for t in threads):
+        # join with a timeout so the main thread keeps handling signals
+        for t in threads:
+            t.join(timeout=1.0)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,18 +1,31 @@
 """Background task execution: run_generate_task and run_transcribe_task."""
 import json
 import os
+import threading
 from pathlib import Path
+from typing import Optional
 
 import torch
+from heartlib.cancellation import GenerationCancelled
 
-from server.config import HEARTMULA_VERSION, MODEL_PATH, OUTPUT_DIR
+from server.config import (
+    CODEC_PRECISION,
+    DEVICE,
+    GENERATION_STATE_FILENAME,
+    HEARTMULA_VERSION,
+    MODEL_PATH,
+    MULA_QUANTIZATION,
+    OUTPUT_DIR,
+)
 from server.routes.uploads import UPLOAD_DIR, ALLOWED_EXTENSIONS
 from server.store import (
     STATUS_COMPLETED,
     STATUS_FAILED,
+    STATUS_RUNNING,
     get_task,
     update_task,
 )
+from server.progress import TaskProgressWriter
 from server.project_store import update_project
 
 
@@ -20,18 +33,42 @@ def _task_dir(task_id: str) -> Path:
     return Path(OUTPUT_DIR) / task_id
 
 
-def run_generate_task(task_id: str) -> None:
+def _load_gen_pipeline(params: dict):
+    """Build HeartMuLaGenPipeline for the task's model version."""
+    from heartlib import HeartMuLaGenPipeline
+
+    raw_version = (params.get("version") or HEARTMULA_VERSION or "").strip()
+    version_lower = raw_version.lower()
+    prefix = "heartmula-oss-"
+    if version_lower.startswith(prefix):
+        version = raw_version[len(prefix):]
+    else:
+        version = raw_version
+    return HeartMuLaGenPipeline.from_pretrained(
+        MODEL_PATH,
+        device={"mula": torch.device(DEVICE), "codec": torch.device(DEVICE)},
+        dtype={"mula": torch.bfloat16, "codec": torch.float32},
+        version=version,
+        lazy_load=True,
+        quantization=MULA_QUANTIZATION,
+        codec_precision=CODEC_PRECISION,
+    )
+
+
+def run_generate_task(task_id: str, cancel_event: Optional[threading.Event] = None) -> None:
     """Load HeartMuLaGenPipeline, run with task params, save audio to output/{task_id}/audio.mp3.
     Reference audio (ref_file_id) is used only when the pipeline supports ref_audio_path;
     otherwise generation runs without it (TypeError is caught and retried without ref).
+    Generation stops early once cancel_event is set (the task was cancelled).
     """
     task = get_task(task_id)
-    if not task or task.status != "pending":
+    # claimed (set running) by the task queue
+    if not task or task.status != STATUS_RUNNING:
         return
-    update_task(task_id, status="running")
     out_dir = _task_dir(task_id)
     out_dir.mkdir(parents=True, exist_ok=True)
     save_path = str(out_dir / "audio.mp3")
+    save_state_path = str(out_dir / GENERATION_STATE_FILENAME)
     params = task.params if isinstance(task.params, dict) else json.loads(task.params)
     ref_audio_path = None
     ref_file_id = params.get("ref_file_id")
@@ -41,23 +78,9 @@ def run_generate_task(task_id: str) -> None:
             if p.is_file():
                 ref_audio_path = str(p)
                 break
+    pipe = None
     try:
-        from heartlib import HeartMuLaGenPipeline
-
-        raw_version = (params.get("version") or HEARTMULA_VERSION or "").strip()
-        version_lower = raw_version.lower()
-        prefix = "heartmula-oss-"
-        if version_lower.startswith(prefix):
-            version = raw_version[len(prefix):]
-        else:
-            version = raw_version
-        pipe = HeartMuLaGenPipeline.from_pretrained(
-            MODEL_PATH,
-            device={"mula": torch.device("cuda"), "codec": torch.device("cuda")},
-            dtype={"mula": torch.bfloat16, "codec": torch.float32},
-            version=version,
-            lazy_load=True,
-        )
+        pipe = _load_gen_pipeline(params)
         with torch.no_grad():
             call_kw: dict = {
                 "lyrics": params["lyrics"],
@@ -72,7 +95,10 @@ def run_generate_task(task_id: str) -> None:
                         topk=params.get("topk", 50),
                         temperature=params.get("temperature", 1.0),
                         cfg_scale=params.get("cfg_scale", 1.5),
+                        save_state_path=save_state_path,
                         ref_audio_path=ref_audio_path,
+                        cancel_event=cancel_event,
+                        progress_callback=TaskProgressWriter(task_id),
                     )
                 except TypeError:
                     pipe(
@@ -82,6 +108,9 @@ def run_generate_task(task_id: str) -> None:
                         topk=params.get("topk", 50),
                         temperature=params.get("temperature", 1.0),
                         cfg_scale=params.get("cfg_scale", 1.5),
+                        save_state_path=save_state_path,
+                        cancel_event=cancel_event,
+                        progress_callback=TaskProgressWriter(task_id),
                     )
             else:
                 pipe(
@@ -91,31 +120,116 @@ def run_generate_task(task_id: str) -> None:
                     topk=params.get("topk", 50),
                     temperature=params.get("temperature", 1.0),
                     cfg_scale=params.get("cfg_scale", 1.5),
+                    save_state_path=save_state_path,
+                    cancel_event=cancel_event,
+                    progress_callback=TaskProgressWriter(task_id),
                 )
         rel_path = f"{task_id}/audio.mp3"
-        update_task(task_id, status=STATUS_COMPLETED, output_audio_path=rel_path)
+        update_task(
+            task_id,
+            expected_status=STATUS_RUNNING,
+            status=STATUS_COMPLETED,
+            output_audio_path=rel_path,
+        )
+        if getattr(task, "project_id", None):
+            update_project(task.project_id, status="Generated")
+    except GenerationCancelled:
+        # the task is already marked cancelled
+        return
+    except Exception as e:
+        update_task(
+            task_id,
+            expected_status=STATUS_RUNNING,
+            status=STATUS_FAILED,
+            error_message=str(e),
+        )
+    finally:
+        if pipe is not None:
+            # parked model copies and offload files do not outlive the task
+            pipe.close()
+
+
+def run_extend_task(task_id: str, cancel_event: Optional[threading.Event] = None) -> None:
+    """Continue the source task's track from its stored frames and save the extended
+    song to output/{task_id}/audio.mp3. Only the new audio is generated and decoded.
+    Generation stops early once cancel_event is set (the task was cancelled).
+    """
+    task = get_task(task_id)
+    # claimed (set running) by the task queue
+    if not task or task.status != STATUS_RUNNING:
+        return
+    params = task.params if isinstance(task.params, dict) else json.loads(task.params)
+    source = get_task(params.get("source_task_id") or "")
+    state_path = _task_dir(source.id) / GENERATION_STATE_FILENAME if source else None
+    if state_path is None or not state_path.is_file():
+        update_task(
+            task_id,
+            expected_status=STATUS_RUNNING,
+            status=STATUS_FAILED,
+            error_message="Source task has no stored frames",
+        )
+        return
+    out_dir = _task_dir(task_id)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    call_kw: dict = {
+        "lyrics": params["lyrics"],
+        "tags": params["tags"],
+        "continue_from": str(state_path),
+    }
+    if source.output_audio_path and (Path(OUTPUT_DIR) / source.output_audio_path).is_file():
+        call_kw["prefix_audio"] = str(Path(OUTPUT_DIR) / source.output_audio_path)
+    pipe = None
+    try:
+        pipe = _load_gen_pipeline(params)
+        with torch.no_grad():
+            pipe(
+                call_kw,
+                max_audio_length_ms=params.get("max_audio_length_ms", 30_000),
+                save_path=str(out_dir / "audio.mp3"),
+                topk=params.get("topk", 50),
+                temperature=params.get("temperature", 1.0),
+                cfg_scale=params.get("cfg_scale", 1.5),
+                save_state_path=str(out_dir / GENERATION_STATE_FILENAME),
+                cancel_event=cancel_event,
+                progress_callback=TaskProgressWriter(task_id),
+            )
+        update_task(
+            task_id,
+            expected_status=STATUS_RUNNING,
+            status=STATUS_COMPLETED,
+            output_audio_path=f"{task_id}/audio.mp3",
+        )
         if getattr(task, "project_id", None):
             update_project(task.project_id, status="Generated")
+    except GenerationCancelled:
+        # the task is already marked cancelled
+        return
     except Exception as e:
         update_task(
             task_id,
+            expected_status=STATUS_RUNNING,
             status=STATUS_FAILED,
             error_message=str(e),
         )
+    finally:
+        if pipe is not None:
+            # parked model copies and offload files do not outlive the task
+            pipe.close()
 
 
 def run_transcribe_task(task_id: str) -> None:
     """Load HeartTranscriptorPipeline, run on task audio, save result to output/{task_id}/transcription.json."""
     task = get_task(task_id)
-    if not task or task.status != "pending":
+    # claimed (set running) by the task queue
+    if not task or task.status != STATUS_RUNNING:
         return
-    update_task(task_id, status="running")
     out_dir = _task_dir(task_id)
     params = task.params if isinstance(task.params, dict) else json.loads(task.params)
     audio_path = params.get("audio_path")
     if not audio_path or not os.path.isfile(audio_path):
         update_task(
             task_id,
+            expected_status=STATUS_RUNNING,
             status=STATUS_FAILED,
             error_message="Missing or invalid audio_path",
         )
@@ -159,10 +273,11 @@ def run_transcribe_task(task_id: str) -> None:
             json.dump(result, f, ensure_ascii=False, indent=2)
         with open(result_path, "r", encoding="utf-8") as f:
             result_data = json.load(f)
-        update_task(task_id, status=STATUS_COMPLETED, result=result_data)
+        update_task(task_id, expected_status=STATUS_RUNNING, status=STATUS_COMPLETED, result=result_data)
     except Exception as e:
         update_task(
             task_id,
+            expected_status=STATUS_RUNNING,
             status=STATUS_FAILED,
             error_message=str(e),
         )
@@ -1,7 +1,9 @@
+from .cancellation import GenerationCancelled
 from .pipelines.music_generation import HeartMuLaGenPipeline
 from .pipelines.lyrics_transcription import HeartTranscriptorPipeline
 
 __all__ = [
+    "GenerationCancelled",
     "HeartMuLaGenPipeline",
     "HeartTranscriptorPipeline"
 ]
\ No newline at end of file
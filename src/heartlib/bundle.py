@@ -0,0 +1,158 @@
+"""Precompiled model bundles.
+
+``compile_checkpoint`` applies the load-time transformations once, offline: HeartMuLa
+is cast (and optionally weight-only quantized), HeartCodec is cast with its weight
+norms folded. The bundle keeps the checkpoint layout expected by
+``HeartMuLaGenPipeline.from_pretrained`` plus a ``manifest.json`` describing what was
+applied and the sha256 of every file, so workers load it without transforming.
+"""
+import hashlib
+import json
+import os
+import shutil
+from importlib import metadata
+from typing import Any, Dict, Optional
+
+import torch
+
+MANIFEST_NAME = "manifest.json"
+BUNDLE_FORMAT = 1
+
+
+def dtype_name(dtype: torch.dtype) -> str:
+    return str(dtype).replace("torch.", "")
+
+
+def dtype_from_name(name: str) -> torch.dtype:
+    dtype = getattr(torch, name, None)
+    if not isinstance(dtype, torch.dtype):
+        raise ValueError(f"Unknown dtype {name!r} in bundle manifest.")
+    return dtype
+
+
+def _heartlib_version() -> Optional[str]:
+    try:
+        return metadata.version("heartlib")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(bundle_path: str) -> Optional[Dict[str, Any]]:
+    """Manifest of the bundle at ``bundle_path``, or None for a plain checkpoint dir."""
+    path = os.path.join(bundle_path, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as fp:
+        manifest = json.load(fp)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(
+            f"Unsupported bundle format {manifest.get('format')!r} in {path}; "
+            f"recompile it with this version of heartlib."
+        )
+    return manifest
+
+
+def verify_manifest(bundle_path: str, manifest: Dict[str, Any]) -> None:
+    """Raise ValueError if a file listed in ``manifest`` is missing or modified."""
+    for rel_path, checksum in manifest["files"].items():
+        path = os.path.join(bundle_path, rel_path)
+        if not os.path.isfile(path):
+            raise ValueError(f"Bundle file {path} is missing.")
+        if _sha256(path) != checksum:
+            raise ValueError(f"Checksum mismatch for bundle file {path}.")
+
+
+def compile_checkpoint(
+    model_path: str,
+    version: str,
+    output_path: str,
+    mula_dtype: torch.dtype = torch.bfloat16,
+    codec_dtype: torch.dtype = torch.float32,
+    quantization: Optional[str] = None,
+    group_size: int = 128,
+    codec_precision: str = "fp32",
+    device: torch.device = torch.device("cpu"),
+) -> Dict[str, Any]:
+    """Write an optimized bundle of the ``version`` checkpoint in ``model_path`` to
+    ``output_path`` and return its manifest.
+
+    ``device`` is where quantization runs; int4 weights are packed for that device
+    type and the bundle only loads there.
+    """
+    from .checkpoint import load_pretrained
+    from .heartcodec.modeling_heartcodec import ESTIMATOR_PRECISIONS, HeartCodec
+    from .heartmula.modeling_heartmula import HeartMuLa
+    from .heartmula.quantization import quantize_heartmula, save_quantized, sidecar_path
+    from .pipelines.music_generation import _resolve_paths
+
+    if codec_precision not in ESTIMATOR_PRECISIONS:
+        raise ValueError(
+            f"Unknown estimator precision {codec_precision!r}, expected one of {ESTIMATOR_PRECISIONS}."
+        )
+    mula_path, codec_path, tokenizer_path, gen_config_path = _resolve_paths(
+        model_path, version
+    )
+    if os.path.exists(os.path.join(output_path, MANIFEST_NAME)):
+        raise FileExistsError(f"{output_path} already contains a bundle.")
+    out_mula = os.path.join(output_path, os.path.basename(mula_path))
+    out_codec = os.path.join(output_path, os.path.basename(codec_path))
+    os.makedirs(out_mula, exist_ok=True)
+    os.makedirs(out_codec, exist_ok=True)
+
+    mula = load_pretrained(HeartMuLa, mula_path, device, mula_dtype)
+    mula_entry: Dict[str, Any] = {
+        "path": os.path.basename(mula_path),
+        "dtype": dtype_name(mula_dtype),
+        "quantization": None,
+    }
+    if quantization:
+        quantize_heartmula(mula, quantization, group_size)
+        # the quantized weights live in the sidecar only; keep the config for the layout
+        mula.config.save_pretrained(out_mula)
+        save_quantized(mula, sidecar_path(out_mula, quantization))
+        mula_entry["quantization"] = {
+            **mula.quantization,
+            "device_type": device.type,
+        }
+    else:
+        mula.save_pretrained(out_mula)
+    del mula
+
+    codec = load_pretrained(HeartCodec, codec_path, device, codec_dtype)
+    codec.optimize_for_inference().save_pretrained(out_codec)
+    del codec
+
+    shutil.copy2(tokenizer_path, os.path.join(output_path, "tokenizer.json"))
+    shutil.copy2(gen_config_path, os.path.join(output_path, "gen_config.json"))
+
+    files = {}
+    for root, _, names in os.walk(output_path):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, output_path).replace(os.sep, "/")
+            if rel_path != MANIFEST_NAME:
+                files[rel_path] = _sha256(path)
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "heartlib_version": _heartlib_version(),
+        "version": version,
+        "mula": mula_entry,
+        "codec": {
+            "path": os.path.basename(codec_path),
+            "dtype": dtype_name(codec_dtype),
+            "weight_norm_folded": True,
+            "estimator_precision": codec_precision,
+        },
+        "files": dict(sorted(files.items())),
+    }
+    with open(os.path.join(output_path, MANIFEST_NAME), "w", encoding="utf-8") as fp:
+        json.dump(manifest, fp, indent=2)
+    return manifest
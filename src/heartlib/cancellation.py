@@ -0,0 +1,17 @@
+"""Cooperative cancellation of a running generation.
+
+Callers pass a ``threading.Event`` as ``cancel_event``; the generation loop and the
+codec check it between frames and decode windows and stop with
+``GenerationCancelled`` once it is set.
+"""
+import threading
+from typing import Optional
+
+
+class GenerationCancelled(Exception):
+    """The generation was stopped because its cancel event was set."""
+
+
+def check_cancelled(cancel_event: Optional[threading.Event]) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise GenerationCancelled()
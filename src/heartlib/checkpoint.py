@@ -0,0 +1,135 @@
+"""Fast checkpoint loading for HeartMuLa / HeartCodec.
+
+``PreTrainedModel.from_pretrained`` builds the model with randomly initialised
+weights and then overwrites them. ``load_pretrained`` instead builds the parameters
+on the meta device, memory-maps the safetensors shards straight onto the target
+device and assigns them in the target dtype, so no weight is initialised or copied
+twice. Buffers (RoPE tables, VQ constants) are still computed normally.
+"""
+import json
+import os
+import threading
+from typing import Callable, List, Optional, Type, TypeVar
+
+import torch
+from torch.overrides import TorchFunctionMode
+from transformers.modeling_utils import PreTrainedModel
+
+try:
+    from transformers.modeling_utils import no_init_weights
+except ImportError:  # transformers >= 5
+    from transformers.initialization import no_init_weights
+
+SAFE_WEIGHTS_NAME = "model.safetensors"
+SAFE_WEIGHTS_INDEX_NAME = "model.safetensors.index.json"
+
+ModelT = TypeVar("ModelT", bound=PreTrainedModel)
+
+
+def safetensors_shards(model_path: str) -> Optional[List[str]]:
+    """Safetensors files of the checkpoint in ``model_path``, or None if there are none."""
+    index_path = os.path.join(model_path, SAFE_WEIGHTS_INDEX_NAME)
+    if os.path.isfile(index_path):
+        with open(index_path, encoding="utf-8") as fp:
+            weight_map = json.load(fp)["weight_map"]
+        return [os.path.join(model_path, name) for name in sorted(set(weight_map.values()))]
+    single = os.path.join(model_path, SAFE_WEIGHTS_NAME)
+    if os.path.isfile(single):
+        return [single]
+    return None
+
+
+# Factory functions whose result takes the default dtype when none is passed
+_DEFAULT_DTYPE_FACTORIES = {
+    torch.arange,
+    torch.empty,
+    torch.eye,
+    torch.full,
+    torch.linspace,
+    torch.ones,
+    torch.rand,
+    torch.randn,
+    torch.tensor,
+    torch.zeros,
+}
+# accelerate's init_empty_weights patches nn.Module.register_parameter on the class;
+# concurrent loads (server worker threads) must not interleave the patch and restore
+_init_lock = threading.Lock()
+
+
+class _DefaultDtype(TorchFunctionMode):
+    """Floating tensors made by factory calls without ``dtype`` come out in ``dtype``,
+    like ``torch.set_default_dtype`` but for the current thread only (function modes
+    are thread-local), so tensors created by other threads are not affected."""
+
+    def __init__(self, dtype: torch.dtype):
+        super().__init__()
+        self.dtype = dtype
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        result = func(*args, **kwargs)
+        if (
+            func in _DEFAULT_DTYPE_FACTORIES
+            and kwargs.get("dtype") is None
+            and isinstance(result, torch.Tensor)
+            and result.dtype == torch.get_default_dtype()
+        ):
+            result = result.to(self.dtype)
+        return result
+
+
+def init_empty(model_cls: Type[ModelT], model_path: str, dtype: torch.dtype) -> ModelT:
+    """Build ``model_cls`` from the config in ``model_path`` with its parameters on the
+    meta device; buffers are materialised on CPU, in ``dtype`` unless the model gives
+    them an explicit dtype."""
+    from accelerate import init_empty_weights
+
+    config = model_cls.config_class.from_pretrained(model_path)
+    with _init_lock, init_empty_weights(include_buffers=False), no_init_weights():
+        with _DefaultDtype(dtype):
+            return model_cls(config)
+
+
+def load_pretrained(
+    model_cls: Type[ModelT],
+    model_path: str,
+    device: torch.device,
+    dtype: torch.dtype,
+    prepare: Optional[Callable[[ModelT], None]] = None,
+) -> ModelT:
+    """Load ``model_cls`` from ``model_path`` onto ``device`` in ``dtype``.
+
+    ``prepare`` is applied to the empty model before the weights are assigned, for
+    checkpoints saved after a structural change (e.g. folded weight norm).
+    Falls back to ``model_cls.from_pretrained`` when the checkpoint is not stored as
+    safetensors.
+    """
+    from safetensors import safe_open
+
+    shards = safetensors_shards(model_path)
+    if shards is None:
+        if prepare is not None:
+            raise ValueError(f"Checkpoint at {model_path} must be stored as safetensors.")
+        return model_cls.from_pretrained(model_path, device_map=device, dtype=dtype)
+
+    model = init_empty(model_cls, model_path, dtype)
+    if prepare is not None:
+        prepare(model)
+
+    state_dict = {}
+    for shard in shards:
+        with safe_open(shard, framework="pt", device=str(device)) as f:
+            for key in f.keys():
+                tensor = f.get_tensor(key)
+                if tensor.is_floating_point():
+                    tensor = tensor.to(dtype)
+                state_dict[key] = tensor
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    missing = [name for name, p in model.named_parameters() if p.is_meta]
+    if missing:
+        raise ValueError(
+            f"Checkpoint at {model_path} has no weights for {', '.join(missing[:5])}"
+            + (f" and {len(missing) - 5} more." if len(missing) > 5 else ".")
+        )
+    return model.to(device).eval()
@@ -0,0 +1,87 @@
+"""``heartlib`` command line tool.
+
+    heartlib compile-checkpoint --model_path ./ckpt --version 3B --output ./ckpt-bundle
+    heartlib verify-checkpoint ./ckpt-bundle
+"""
+import argparse
+import sys
+
+import torch
+
+from .bundle import compile_checkpoint, read_manifest, verify_manifest
+from .heartcodec.modeling_heartcodec import ESTIMATOR_PRECISIONS
+from .heartmula.quantization import QUANTIZATION_MODES
+
+_DTYPES = {
+    "float32": torch.float32,
+    "fp32": torch.float32,
+    "float16": torch.float16,
+    "fp16": torch.float16,
+    "bfloat16": torch.bfloat16,
+    "bf16": torch.bfloat16,
+}
+
+
+def str2dtype(value):
+    try:
+        return _DTYPES[value.lower()]
+    except KeyError:
+        raise argparse.ArgumentTypeError(f"Dtype not recognized: {value}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="heartlib")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser(
+        "compile-checkpoint",
+        help="Write a pre-cast, weight-norm-folded and optionally quantized model bundle.",
+    )
+    compile_parser.add_argument("--model_path", type=str, required=True)
+    compile_parser.add_argument("--version", type=str, default="3B")
+    compile_parser.add_argument("--output", type=str, required=True)
+    compile_parser.add_argument("--mula_dtype", type=str2dtype, default="bfloat16")
+    compile_parser.add_argument("--codec_dtype", type=str2dtype, default="float32")
+    compile_parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default=None)
+    compile_parser.add_argument("--group_size", type=int, default=128)
+    compile_parser.add_argument("--codec_precision", choices=ESTIMATOR_PRECISIONS, default="fp32")
+    compile_parser.add_argument("--device", type=torch.device, default="cpu")
+
+    verify_parser = commands.add_parser(
+        "verify-checkpoint", help="Check the files of a bundle against its manifest."
+    )
+    verify_parser.add_argument("bundle_path", type=str)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "compile-checkpoint":
+        manifest = compile_checkpoint(
+            args.model_path,
+            args.version,
+            args.output,
+            mula_dtype=args.mula_dtype,
+            codec_dtype=args.codec_dtype,
+            quantization=args.quantization,
+            group_size=args.group_size,
+            codec_precision=args.codec_precision,
+            device=args.device,
+        )
+        print(f"Wrote bundle with {len(manifest['files'])} files to {args.output}")
+        return 0
+    manifest = read_manifest(args.bundle_path)
+    if manifest is None:
+        print(f"{args.bundle_path} is not a heartlib bundle.", file=sys.stderr)
+        return 1
+    try:
+        verify_manifest(args.bundle_path, manifest)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{args.bundle_path}: {len(manifest['files'])} files OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,42 @@
 import torch
+import torch.nn as nn
 from .models.flow_matching import FlowMatching
 from .models.sq_codec import ScalarModel
 from .configuration_heartcodec import HeartCodecConfig
+from ..cancellation import check_cancelled
+from ..progress import StageProgress
 from transformers.modeling_utils import PreTrainedModel
 import math
-import numpy as np
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+
+ESTIMATOR_PRECISIONS = ("fp32", "bf16", "int8")
+
+
+@lru_cache(maxsize=8)
+def _crossfade_window(length: int, dtype: torch.dtype) -> torch.Tensor:
+    """Linear fade-in of ``length`` samples; the fade-out is ``1 - window``."""
+    return torch.linspace(0, 1, length, dtype=torch.float64).to(dtype)
+
+
+def _overlap_add(
+    windows: torch.Tensor, hop_samples: int, ovlp_samples: int
+) -> torch.Tensor:
+    """Crossfade consecutive ``windows`` (num_windows, C, hop + ovlp) spaced ``hop_samples``
+    apart in one vectorized pass. Windows shorter than ``hop + ovlp`` are zero padded.
+    """
+    num_windows, channels, _ = windows.shape
+    if ovlp_samples > 0 and num_windows > 1:
+        fade_in = _crossfade_window(ovlp_samples, windows.dtype)
+        windows[1:, :, :ovlp_samples] *= fade_in
+        windows[:-1, :, hop_samples:] *= 1 - fade_in
+    output = windows.new_zeros((channels, (num_windows + 1) * hop_samples))
+    heads = output[:, : num_windows * hop_samples].view(channels, num_windows, hop_samples)
+    heads += windows[:, :, :hop_samples].transpose(0, 1)
+    tails = output[:, hop_samples:].view(channels, num_windows, hop_samples)
+    tails[:, :, :ovlp_samples] += windows[:, :, hop_samples:].transpose(0, 1)
+    return output
 
 
 class HeartCodec(PreTrainedModel):
@@ -53,6 +85,84 @@ class HeartCodec(PreTrainedModel):
         self.post_init()
 
         self.sample_rate = config.sample_rate
+        self.estimator_precision = "fp32"
+
+    def set_estimator_precision(self, precision: str) -> "HeartCodec":
+        """Select the precision of the flow-matching DiT estimator, which dominates
+        detokenize time. The ScalarModel decoder always runs in the codec dtype.
+
+        - "fp32": the codec dtype, no change.
+        - "bf16": estimator passes run under bfloat16 autocast.
+        - "int8": dynamic int8 quantization of the estimator's nn.Linear layers
+          (CPU only, not reversible).
+        """
+        if precision not in ESTIMATOR_PRECISIONS:
+            raise ValueError(
+                f"Unknown estimator precision {precision!r}, expected one of {ESTIMATOR_PRECISIONS}."
+            )
+        if precision == "int8":
+            if self.device.type != "cpu":
+                raise ValueError("int8 estimator quantization is only supported on CPU.")
+            torch.ao.quantization.quantize_dynamic(
+                self.flow_matching.estimator, {nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+        self.estimator_precision = precision
+        return self
+
+    def _inference_codes(self, *args, **kwargs):
+        with torch.autocast(
+            device_type=self.device.type,
+            dtype=torch.bfloat16,
+            enabled=self.estimator_precision == "bf16",
+        ):
+            return self.flow_matching.inference_codes(*args, **kwargs)
+
+    def optimize_for_inference(self) -> "HeartCodec":
+        """Freeze the codec for decoding: fold the ScalarModel weight norms into
+        plain weights, switch to eval mode and drop gradients. Not reversible."""
+        self.scalar_model.remove_weight_norm()
+        self.eval()
+        self.requires_grad_(False)
+        return self
+
+    @torch.inference_mode()
+    def decode_latents(
+        self,
+        latents: List[torch.Tensor],
+        max_batch_frames: Optional[int] = 4 * 744,
+    ) -> List[torch.Tensor]:
+        """Decode flow-matching latents (1, T, 256) into waveforms (2, T * 1920).
+
+        Windows of equal length, possibly from several songs, are stacked into one
+        ScalarModel.decode call. ``max_batch_frames`` bounds windows * T per call so
+        long songs are split into micro-batches.
+        """
+        outputs: List[Optional[torch.Tensor]] = [None] * len(latents)
+        for indices, wavs in self._iter_decoded_latents(latents, max_batch_frames):
+            for i, wav in zip(indices, wavs):
+                outputs[i] = wav
+        return outputs
+
+    def _iter_decoded_latents(self, latents, max_batch_frames):
+        by_length: Dict[int, List[int]] = {}
+        for i, latent in enumerate(latents):
+            by_length.setdefault(latent.shape[1], []).append(i)
+        for length, indices in by_length.items():
+            per_batch = len(indices)
+            if max_batch_frames is not None:
+                per_batch = max(1, min(per_batch, max_batch_frames // length))
+            for start in range(0, len(indices), per_batch):
+                batch = indices[start : start + per_batch]
+                latent = torch.cat([latents[i] for i in batch], 0)
+                # split the 256 latent channels into 2 bands of 128
+                latent = latent.reshape(
+                    latent.shape[0], latent.shape[1], 2, latent.shape[2] // 2
+                ).permute(0, 2, 1, 3)
+                latent = latent.reshape(
+                    latent.shape[0] * 2, latent.shape[2], latent.shape[3]
+                )
+                wavs = self.scalar_model.decode(latent.transpose(1, 2))
+                yield batch, wavs.reshape(len(batch), 2, -1)
 
     @torch.inference_mode()
     def detokenize(
@@ -62,7 +172,26 @@ class HeartCodec(PreTrainedModel):
         num_steps=10,
         disable_progress=False,
         guidance_scale=1.25,
+        incontext_latents=None,
+        return_tail_latents=False,
+        pad_windows=False,
+        max_decode_batch_frames=4 * 744,
+        cancel_event=None,
+        progress_callback=None,
     ):
+        """Decode HeartMuLa frames ``codes`` (num_codebooks, T) into a 48 kHz waveform.
+
+        ``incontext_latents`` continues a previous decode: they are the tail latents of
+        the earlier track and cover the first ``incontext_latents.shape[1] // 2`` codes.
+        With ``return_tail_latents`` the latents of the last ``ovlp_samples`` codes are
+        returned as well, so the track can be extended later.
+        ``pad_windows`` restores the old behaviour of repeating the codes until every
+        window spans the full ``duration``. ``max_decode_batch_frames`` caps the latent
+        frames per batched ScalarModel.decode call (see ``decode_latents``).
+        Setting ``cancel_event`` (a ``threading.Event``) stops the decode with
+        ``GenerationCancelled`` before the next window. ``progress_callback`` is
+        called after each window (see ``heartlib.progress``).
+        """
         codes = codes.unsqueeze(0).to(self.device)
         first_latent = torch.randn(
             codes.shape[0], int(duration * 25), 256, dtype=self.dtype
@@ -79,32 +208,57 @@ class HeartCodec(PreTrainedModel):
         target_len = int(
             (codes_len - first_latent_codes_length) / 12.5 * self.sample_rate
         )
+        real_codes_len = codes_len
+        if incontext_latents is not None:
+            incontext_latents = incontext_latents.to(self.device, self.dtype)
 
-        # code repeat
-        if codes_len < min_samples:
-            while codes.shape[-1] < min_samples:
-                codes = torch.cat([codes, codes], -1)
-            codes = codes[:, :, 0:min_samples]
-        codes_len = codes.shape[-1]
-        if (codes_len - ovlp_frames) % hop_samples > 0:
-            len_codes = (
-                math.ceil((codes_len - ovlp_samples) / float(hop_samples)) * hop_samples
-                + ovlp_samples
-            )
-            while codes.shape[-1] < len_codes:
-                codes = torch.cat([codes, codes], -1)
-            codes = codes[:, :, 0:len_codes]
+        if pad_windows:
+            # code repeat
+            if codes_len < min_samples:
+                while codes.shape[-1] < min_samples:
+                    codes = torch.cat([codes, codes], -1)
+                codes = codes[:, :, 0:min_samples]
+            codes_len = codes.shape[-1]
+            if (codes_len - ovlp_frames) % hop_samples > 0:
+                len_codes = (
+                    math.ceil((codes_len - ovlp_samples) / float(hop_samples))
+                    * hop_samples
+                    + ovlp_samples
+                )
+                while codes.shape[-1] < len_codes:
+                    codes = torch.cat([codes, codes], -1)
+                codes = codes[:, :, 0:len_codes]
+            windows = [
+                (sinx, min_samples)
+                for sinx in range(0, codes.shape[-1] - hop_samples + 1, hop_samples)
+            ]
+        else:
+            # variable-length windows: a short clip or the last window of a song only
+            # covers the codes it needs instead of being padded to a full window
+            windows = []
+            sinx = 0
+            while True:
+                window_len = min(min_samples, codes_len - sinx)
+                windows.append((sinx, window_len))
+                if sinx + window_len >= codes_len:
+                    break
+                sinx += hop_samples
         latent_length = int(duration * 25)
         latent_list = []
+        last_sinx = 0
+        progress = StageProgress(progress_callback, "decode", "windows", len(windows))
 
-        for sinx in range(0, codes.shape[-1] - hop_samples + 1, hop_samples):
+        for sinx, window_len in windows:
+            check_cancelled(cancel_event)
+            last_sinx = sinx
+            window_latent_length = window_len * 2
             codes_input = []
-            codes_input.append(codes[:, :, sinx : sinx + min_samples])
-            if sinx == 0 or ovlp_frames == 0:
+            codes_input.append(codes[:, :, sinx : sinx + window_len])
+            if (sinx == 0 and incontext_latents is None) or ovlp_frames == 0:
                 incontext_length = first_latent_length
-                latents = self.flow_matching.inference_codes(
+                latents = self._inference_codes(
                     codes_input,
-                    first_latent,
+                    first_latent[:, :window_latent_length, :],
                     latent_length,
                     incontext_length,
                     guidance_scale=guidance_scale,
@@ -114,7 +268,10 @@ class HeartCodec(PreTrainedModel):
                 )
                 latent_list.append(latents)
             else:
-                true_latent = latent_list[-1][:, -ovlp_frames:, :]
+                if sinx == 0:
+                    true_latent = incontext_latents
+                else:
+                    true_latent = latent_list[-1][:, -ovlp_frames:, :]
                 len_add_to_latent = latent_length - true_latent.shape[1]  #
                 incontext_length = true_latent.shape[1]
                 true_latent = torch.cat(
@@ -129,9 +286,9 @@ class HeartCodec(PreTrainedModel):
                     ],
                     1,
                 )
-                latents = self.flow_matching.inference_codes(
+                latents = self._inference_codes(
                     codes_input,
-                    true_latent,
+                    true_latent[:, :window_latent_length, :],
                     latent_length,
                     incontext_length,
                     guidance_scale=guidance_scale,
@@ -140,44 +297,55 @@ class HeartCodec(PreTrainedModel):
                     scenario="other_seg",
                 )
                 latent_list.append(latents)
+            progress.update(len(latent_list))
+
+        # latents of the last ovlp_samples real codes, used to extend this track later
+        tail_codes = min(ovlp_samples, real_codes_len)
+        tail_start = real_codes_len - tail_codes - last_sinx
+        tail_latents = latent_list[-1][
+            :, 2 * tail_start : 2 * (tail_start + tail_codes), :
+        ].clone()
 
         # latent_list = [l.float() for l in latent_list]
         latent_list[0] = latent_list[0][:, first_latent_length:, :]
+        samples_per_code = int(self.sample_rate / 12.5)
         min_samples = int(duration * self.sample_rate)
         hop_samples = min_samples // 93 * 80
         ovlp_samples = min_samples - hop_samples
 
-        output = None
-        for i in range(len(latent_list)):
-            latent = latent_list[i]
-            bsz, t, f = latent.shape
-
-            latent = latent.reshape(
-                latent.shape[0], latent.shape[1], 2, latent.shape[2] // 2
-            ).permute(0, 2, 1, 3)
-            latent = latent.reshape(
-                latent.shape[0] * 2, latent.shape[2], latent.shape[3]
-            )
-            cur_output = (
-                self.scalar_model.decode(latent.transpose(1, 2)).squeeze(0).squeeze(1)
-            )  # 1 512 256
-
-            cur_output = cur_output[:, 0:min_samples].detach().cpu()  # B, T
-            if cur_output.dim() == 3:
-                cur_output = cur_output[0]
-
-            if output is None:
-                output = cur_output
-            else:
-                if ovlp_samples == 0:
-                    output = torch.cat([output, cur_output], -1)
-                else:
-                    ov_win = torch.from_numpy(np.linspace(0, 1, ovlp_samples)[None, :])
-                    ov_win = torch.cat([ov_win, 1 - ov_win], -1)
-                    output[:, -ovlp_samples:] = (
-                        output[:, -ovlp_samples:] * ov_win[:, -ovlp_samples:]
-                        + cur_output[:, 0:ovlp_samples] * ov_win[:, 0:ovlp_samples]
+        # decoded windows land in one preallocated (pinned) host buffer; on CUDA the
+        # copies run on their own stream so they overlap with decoding the next
+        # micro-batch on the compute stream
+        num_windows = len(latent_list)
+        on_cuda = self.device.type == "cuda"
+        windows_out = torch.zeros(
+            (num_windows, 2, min_samples), dtype=self.dtype, pin_memory=on_cuda
+        )
+        copy_stream = torch.cuda.Stream(self.device) if on_cuda else None
+        for indices, cur_output in self._iter_decoded_latents(
+            latent_list, max_decode_batch_frames
+        ):
+            cur_output = cur_output[:, :, 0:min_samples]
+            if copy_stream is None:
+                for j, i in enumerate(indices):
+                    windows_out[i, :, : cur_output.shape[-1]].copy_(cur_output[j])
+                continue
+            copy_stream.wait_stream(torch.cuda.current_stream(self.device))
+            with torch.cuda.stream(copy_stream):
+                for j, i in enumerate(indices):
+                    windows_out[i, :, : cur_output.shape[-1]].copy_(
+                        cur_output[j], non_blocking=True
                     )
-                    output = torch.cat([output, cur_output[:, ovlp_samples:]], -1)
+            # keep the compute stream from reusing the window's memory mid-copy
+            cur_output.record_stream(copy_stream)
+        if copy_stream is not None:
+            done = torch.cuda.Event()
+            done.record(copy_stream)
+            done.synchronize()
+
+        total_len = (last_sinx + windows[-1][1]) * samples_per_code
+        output = _overlap_add(windows_out, hop_samples, ovlp_samples)[:, :total_len]
         output = output[:, 0:target_len]
+        if return_tail_latents:
+            return output, tail_latents
         return output
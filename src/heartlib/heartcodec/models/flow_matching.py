@@ -1,7 +1,6 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from tqdm import tqdm
 from vector_quantize_pytorch import ResidualVQ
 from .transformer import LlamaTransformer
 
@@ -82,9 +81,13 @@ class FlowMatching(nn.Module):
         ).permute(0, 2, 1)
 
         num_frames = quantized_feature_emb.shape[1]  #
+        # noise is drawn for the full latent_length so that a shorter (unpadded)
+        # window starts from the same noise as the padded one
         latents = torch.randn(
-            (batch_size, num_frames, self.latent_dim), device=device, dtype=dtype
-        )
+            (batch_size, max(num_frames, latent_length), self.latent_dim),
+            device=device,
+            dtype=dtype,
+        )[:, :num_frames]
         latent_masks = torch.zeros(
             latents.shape[0], latents.shape[1], dtype=torch.int64, device=latents.device
         )
@@ -140,7 +143,7 @@ class FlowMatching(nn.Module):
         # I am storing this because I can later plot it by putting a debugger here and saving it to a file
         # Or in future might add like a return_all_steps flag
         sol = []
-        for step in tqdm(range(1, len(t_span))):
+        for step in range(1, len(t_span)):
             x[:, 0:incontext_length, :] = (1 - (1 - 1e-6) * t) * noise[
                 :, 0:incontext_length, :
             ] + t * incontext_x[:, 0:incontext_length, :]
@@ -3,10 +3,16 @@ import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
 from torch.nn.utils.parametrizations import weight_norm
-from torch.nn.utils import remove_weight_norm
+from torch.nn.utils import parametrize
 from torch.autograd.function import InplaceFunction
 
 
+def _fold_weight_norm(module):
+    """Replace a ``weight_norm`` parametrization by the plain weight it computes."""
+    if parametrize.is_parametrized(module, "weight"):
+        parametrize.remove_parametrizations(module, "weight", leave_parametrized=True)
+
+
 def get_padding(kernel_size, dilation=1):
     return int((kernel_size * dilation - dilation) / 2)
 
@@ -74,6 +80,26 @@ class Conv1d(nn.Conv1d):
 
         return super(Conv1d, self).forward(x)
 
+    def stream_step(self, x, cache):
+        """Convolve the next block of ``x``, keeping the left context in ``cache``.
+
+        Causal convs emit one frame per input frame. A non-causal conv emits its
+        frames ``padding`` steps late; feed ``padding`` zero frames to flush it.
+        """
+        assert self.stride[0] == 1, "stream_step only supports stride 1."
+        receptive = self.dilation[0] * (self.kernel_size[0] - 1)
+        context = cache.get(self)
+        if context is None:
+            left = self.left_padding if self.causal else self.padding[0]
+            context = x.new_zeros(x.shape[0], x.shape[1], left)
+        x = torch.cat([context, x], -1)
+        cache[self] = x[:, :, max(0, x.shape[-1] - receptive) :]
+        if x.shape[-1] <= receptive:
+            return x.new_zeros(x.shape[0], self.out_channels, 0)
+        return F.conv1d(
+            x, self.weight, self.bias, self.stride, 0, self.dilation, self.groups
+        )
+
 
 class ConvTranspose1d(nn.ConvTranspose1d):
     def __init__(
@@ -118,6 +144,21 @@ class ConvTranspose1d(nn.ConvTranspose1d):
             x = x[:, :, : -self.stride]
         return x
 
+    def stream_step(self, x, cache):
+        """Causal transposed conv over the next block; the previous input frame,
+        which still overlaps the first output frames, is kept in ``cache``."""
+        assert self.causal, "stream_step requires a causal ConvTranspose1d."
+        stride = self.stride if isinstance(self.stride, int) else self.stride[0]
+        if x.shape[-1] == 0:
+            return x.new_zeros(x.shape[0], self.out_channels, 0)
+        prev = cache.get(self)
+        if prev is None:
+            prev = x.new_zeros(x.shape[0], x.shape[1], 1)
+        x = torch.cat([prev, x], -1)
+        cache[self] = x[:, :, -1:]
+        y = super(ConvTranspose1d, self).forward(x)
+        return y[:, :, stride : stride * x.shape[-1]]
+
 
 class PreProcessor(nn.Module):
     def __init__(self, n_in, n_out, num_samples, kernel_size=7, causal=False):
@@ -147,6 +188,10 @@ class PostProcessor(nn.Module):
         output = self.activation(self.conv(x))
         return output
 
+    def stream_step(self, x, cache):
+        x = torch.repeat_interleave(x, self.num_samples, dim=-1)
+        return self.activation(self.conv.stream_step(x, cache))
+
 
 class ResidualUnit(nn.Module):
     def __init__(self, n_in, n_out, dilation, res_kernel_size=7, causal=False):
@@ -169,6 +214,11 @@ class ResidualUnit(nn.Module):
         output = self.activation2(self.conv2(output))
         return output + x
 
+    def stream_step(self, x, cache):
+        output = self.activation1(self.conv1.stream_step(x, cache))
+        output = self.activation2(self.conv2.stream_step(output, cache))
+        return output + x
+
 
 class ResEncoderBlock(nn.Module):
     def __init__(
@@ -286,6 +336,12 @@ class ResDecoderBlock(nn.Module):
             x = conv(x)
         return x
 
+    def stream_step(self, x, cache):
+        x = self.up_conv.stream_step(x, cache)
+        for conv in self.convs:
+            x = conv.stream_step(x, cache)
+        return x
+
 
 class DownsampleLayer(nn.Module):
     def __init__(
@@ -323,7 +379,7 @@ class DownsampleLayer(nn.Module):
 
     def remove_weight_norm(self):
         if self.use_weight_norm:
-            remove_weight_norm(self.layer)
+            _fold_weight_norm(self.layer)
 
 
 class UpsampleLayer(nn.Module):
@@ -362,9 +418,16 @@ class UpsampleLayer(nn.Module):
             x = torch.transpose(x, 1, 2)
         return x
 
+    def stream_step(self, x, cache):
+        x = self.layer.stream_step(x, cache)
+        x = self.activation(x) if self.activation is not None else x
+        if self.repeat:
+            x = torch.repeat_interleave(x, self.stride, dim=-1)
+        return x
+
     def remove_weight_norm(self):
         if self.use_weight_norm:
-            remove_weight_norm(self.layer)
+            _fold_weight_norm(self.layer)
 
 
 class round_func9(InplaceFunction):
@@ -403,6 +466,7 @@ class ScalarModel(nn.Module):
         self.decoder = []
         self.vq = round_func9()  # using 9
         self.mode = mode
+        self.causal = causal
         # Encoder parts
         self.encoder.append(
             weight_norm(
@@ -537,3 +601,37 @@ class ScalarModel(nn.Module):
         for i, layer in enumerate(self.decoder):
             x = layer(x)
         return x
+
+    def decode_step(self, x, cache=None, flush=False):
+        """Streaming ``decode`` for causal models.
+
+        Decodes the next block of latents ``x`` (B, latent_hidden_dim, T) with the
+        per-layer convolution state kept in ``cache`` and returns ``(audio, cache)``.
+        The look-ahead conv delays the audio by ``decode_delay`` latent frames; pass
+        ``flush=True`` with the last block to emit them. Concatenating the outputs of
+        all steps equals ``decode`` on the whole sequence.
+        """
+        if not self.causal:
+            raise ValueError("decode_step requires a model built with causal=True.")
+        if cache is None:
+            cache = {}
+        x = self.vq.apply(x)
+        if flush:
+            x = F.pad(x, (0, self.decode_delay))
+        x = self.decoder[0].stream_step(x, cache)
+        if x.shape[-1] == 0:
+            return x.new_zeros(x.shape[0], self.decoder[-1].out_channels, 0), cache
+        for layer in self.decoder[1:]:
+            x = layer.stream_step(x, cache)
+        return x, cache
+
+    def remove_weight_norm(self):
+        """Fold every ``weight_norm`` in the model into plain conv weights, so the
+        effective weight is no longer recomputed on each forward."""
+        for module in self.modules():
+            _fold_weight_norm(module)
+
+    @property
+    def decode_delay(self):
+        """Latent frames of look-ahead of the first decoder conv."""
+        return self.decoder[0].padding[0]
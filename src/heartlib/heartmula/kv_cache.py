@@ -0,0 +1,122 @@
+"""Backbone KV cache management for HeartMuLa.
+
+Each request sizes the backbone cache to its own prompt + frames (see
+``HeartMuLa.setup_caches``). ``KVCachePool`` hands out those caches as views of flat
+storage blocks and takes the blocks back when the caches are released, so requests
+of different lengths and batch sizes reuse the same device memory instead of
+allocating a fresh cache each time. Requests longer than the backbone context use
+the cache as a ring buffer, tracked by ``RollingWindow``.
+"""
+import math
+from typing import Dict, List, Tuple
+
+import torch
+
+_PoolKey = Tuple[torch.device, torch.dtype]
+
+
+class KVCachePool:
+    def __init__(self):
+        self._free: Dict[_PoolKey, List[torch.Tensor]] = {}
+        self.allocated_bytes = 0
+        self.in_use_bytes = 0
+
+    @staticmethod
+    def _key(device: torch.device, dtype: torch.dtype) -> _PoolKey:
+        return torch.device(device), dtype
+
+    def acquire(
+        self, shape: Tuple[int, ...], dtype: torch.dtype, device: torch.device
+    ) -> torch.Tensor:
+        """Zeroed tensor of ``shape``, a view of the smallest free block that fits."""
+        key = self._key(device, dtype)
+        free = self._free.setdefault(key, [])
+        numel = math.prod(shape)
+        fits = [block for block in free if block.numel() >= numel]
+        if fits:
+            block = min(fits, key=lambda b: b.numel())
+            free.remove(block)
+        else:
+            # nothing fits: give the smaller free blocks back before growing
+            for block in free:
+                self.allocated_bytes -= block.numel() * block.element_size()
+            free.clear()
+            block = torch.empty(numel, dtype=dtype, device=device)
+            self.allocated_bytes += numel * block.element_size()
+        self.in_use_bytes += block.numel() * block.element_size()
+        return block[:numel].view(shape).zero_()
+
+    def release(self, tensor: torch.Tensor) -> None:
+        """Return the block behind a tensor from ``acquire`` to the pool."""
+        block = tensor._base if tensor._base is not None else tensor
+        self.in_use_bytes -= block.numel() * block.element_size()
+        self._free.setdefault(self._key(block.device, block.dtype), []).append(block)
+
+    def clear(self) -> None:
+        """Free the blocks not in use."""
+        for free in self._free.values():
+            for block in free:
+                self.allocated_bytes -= block.numel() * block.element_size()
+        self._free.clear()
+
+
+def rotate_keys(keys: torch.Tensor, rope: torch.nn.Module, shift: int) -> torch.Tensor:
+    """Move RoPE-encoded ``keys`` ([b, n_kv, s, h_d]) from position p to p - ``shift``
+    using the cos/sin table of torchtune's ``rope``."""
+    cos, sin = rope.cache[shift].unbind(-1)
+    x = keys.float().reshape(*keys.shape[:-1], -1, 2)
+    x0, x1 = x[..., 0], x[..., 1]
+    rotated = torch.stack([x0 * cos + x1 * sin, x1 * cos - x0 * sin], -1)
+    return rotated.flatten(-2).type_as(keys)
+
+
+class RollingWindow:
+    """Bookkeeping of a backbone cache used as a ring buffer for long-form generation.
+
+    The first ``sink_len`` slots hold the prompt and are never evicted; the remaining
+    ``window`` slots hold the most recent frames, the oldest one being overwritten
+    by each new frame. Frame positions keep growing, but a key is only ever seen
+    relative to the query, so whenever the next position would leave the RoPE table
+    (``max_positions``) the window keys are re-rotated back to follow the prompt
+    directly (see ``advance``).
+    """
+
+    def __init__(
+        self,
+        sink_len: int,
+        window: int,
+        max_positions: int,
+        batch_size: int,
+        device: torch.device,
+    ):
+        self.sink_len = sink_len
+        self.window = window
+        self.max_positions = max_positions
+        self.num_frames = 0
+        # position of frame n is sink_len + n - offset
+        self.offset = 0
+        self.mask = torch.zeros(
+            (batch_size, 1, sink_len + window), dtype=torch.bool, device=device
+        )
+        self.mask[..., :sink_len] = True
+        self.input_pos = torch.empty((batch_size, 1), dtype=torch.long, device=device)
+
+    def advance(self) -> Tuple[int, int]:
+        """Prepare ``mask`` and ``input_pos`` for the next frame.
+
+        Returns the cache slot the frame is written to, and how many positions the
+        window keys must be rotated back by before it (0 for none).
+        """
+        n = self.num_frames
+        slot = self.sink_len + n % self.window
+        position = self.sink_len + n - self.offset
+        shift = 0
+        if position >= self.max_positions:
+            # the window (frames n - window .. n - 1) moves to sink_len .. sink_len + window - 1
+            shift = position - (self.sink_len + self.window)
+            self.offset += shift
+            position -= shift
+        self.mask[..., slot] = True
+        self.input_pos.fill_(position)
+        self.num_frames += 1
+        return slot, shift
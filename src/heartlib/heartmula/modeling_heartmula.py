@@ -6,6 +6,12 @@ import torch
 import torch.nn as nn
 import torchtune
 from torchtune.models import llama3_2
+from torchtune.modules import KVCache
+
+from .kv_cache import KVCachePool, RollingWindow, rotate_keys
+
+# backbone KV caches are sized in multiples of this many positions
+KV_CACHE_BUCKET = 256
 
 
 def llama3_2_3B() -> torchtune.modules.transformer.TransformerDecoder:
@@ -150,19 +156,146 @@ class HeartMuLa(PreTrainedModel):
             )
         )
         self.muq_linear = nn.Linear(config.muq_dim, backbone_dim)
+        self.kv_cache_pool = KVCachePool()
+        self._rolling: RollingWindow | None = None
         self.post_init()
 
-    def setup_caches(self, max_batch_size: int):
+    def kv_cache_seq_len(
+        self,
+        num_positions: int | None = None,
+        sink_len: int | None = None,
+        window: int | None = None,
+    ) -> int:
+        """Backbone cache length for ``num_positions`` positions: rounded up to a
+        multiple of KV_CACHE_BUCKET, at most the backbone context.
+
+        With ``sink_len``, a request that does not fit the context (or any request
+        when ``window`` is given) gets a rolling cache of the prompt plus ``window``
+        frames, by default as many as fit while leaving KV_CACHE_BUCKET positions
+        of the context for the window to move through between re-rotations.
+        """
+        max_seq_len = self.backbone.max_seq_len
+        if num_positions is None:
+            return max_seq_len
+        if self._is_rolling(num_positions, sink_len, window):
+            limit = max_seq_len - KV_CACHE_BUCKET
+            if window is not None:
+                limit = min(limit, -(-(sink_len + window) // KV_CACHE_BUCKET) * KV_CACHE_BUCKET)
+            if sink_len >= limit:
+                raise ValueError(
+                    f"A prompt of {sink_len} positions leaves no room for a rolling window "
+                    f"in the {max_seq_len}-position backbone context."
+                )
+            return limit
+        buckets = -(-num_positions // KV_CACHE_BUCKET)
+        return min(buckets * KV_CACHE_BUCKET, max_seq_len)
+
+    def _is_rolling(
+        self, num_positions: int | None, sink_len: int | None, window: int | None
+    ) -> bool:
+        if sink_len is None or num_positions is None:
+            return False
+        return window is not None or num_positions > self.backbone.max_seq_len
+
+    def kv_cache_bytes(
+        self,
+        batch_size: int,
+        num_positions: int | None = None,
+        sink_len: int | None = None,
+        window: int | None = None,
+    ) -> int:
+        """Device memory taken by ``setup_caches`` with the same arguments: backbone
+        and decoder keys/values plus the causal masks."""
+        dtype = next(self.parameters()).dtype
+        seq_len = self.kv_cache_seq_len(num_positions, sink_len, window)
+        num_codebooks = self.config.audio_num_codebooks
+        total = seq_len * seq_len + num_codebooks * num_codebooks * (1 + batch_size)
+        for transformer, length in ((self.backbone, seq_len), (self.decoder, num_codebooks)):
+            for layer in transformer.layers:
+                attn = layer.attn
+                numel = batch_size * attn.num_kv_heads * length * attn.head_dim
+                total += 2 * numel * dtype.itemsize
+        return total
+
+    def _backbone_cache_shape(self) -> tuple | None:
+        cache = self.backbone.layers[0].attn.kv_cache
+        return None if cache is None else tuple(cache.k_cache.shape)
+
+    def release_caches(self):
+        """Drop the KV caches; backbone cache memory goes back to ``kv_cache_pool``."""
+        for layer in self.backbone.layers:
+            cache = layer.attn.kv_cache
+            if cache is not None:
+                self.kv_cache_pool.release(cache.k_cache)
+                self.kv_cache_pool.release(cache.v_cache)
+        for transformer in (self.backbone, self.decoder):
+            for layer in transformer.layers:
+                layer.attn.kv_cache = None
+                layer.attn.cache_enabled = False
+        self._decoder_kv_caches = []
+        self._backbone_kv_caches = []
+        self._rolling = None
+
+    def setup_caches(
+        self,
+        max_batch_size: int,
+        max_seq_len: int | None = None,
+        sink_len: int | None = None,
+        window: int | None = None,
+    ):
+        """Set up the KV caches for ``max_batch_size`` sequences.
+
+        The backbone cache holds ``max_seq_len`` positions (prompt + frames) rounded
+        up with ``kv_cache_seq_len``; None means the whole backbone context. Caches
+        of the same size are reset and reused, otherwise they are rebuilt from
+        ``kv_cache_pool``.
+
+        Passing the prompt length as ``sink_len`` allows requests longer than the
+        context: their frames go through a rolling window after the prompt (see
+        ``RollingWindow``), and the ``input_pos`` given to ``generate_frame`` for
+        single frames is then ignored.
+        """
         dtype = next(self.parameters()).dtype
         device = next(self.parameters()).device
-
-        try:
+        seq_len = self.kv_cache_seq_len(max_seq_len, sink_len, window)
+        attn = self.backbone.layers[0].attn
+        shape = (max_batch_size, attn.num_kv_heads, seq_len, attn.head_dim)
+        if self._backbone_cache_shape() == shape:
             self.reset_caches()
-        except RuntimeError:
-            pass
+        else:
+            self._allocate_caches(shape, dtype, device)
+        self._rolling = None
+        if self._is_rolling(max_seq_len, sink_len, window):
+            self._rolling = RollingWindow(
+                sink_len,
+                seq_len - sink_len,
+                self.backbone.max_seq_len,
+                max_batch_size,
+                device,
+            )
 
+    def _allocate_caches(
+        self, shape: tuple, dtype: torch.dtype, device: torch.device
+    ):
+        self.release_caches()
+        max_batch_size, _, seq_len, _ = shape
+        for layer in self.backbone.layers:
+            attn = layer.attn
+            with torch.device("meta"):
+                cache = KVCache(
+                    batch_size=max_batch_size,
+                    max_seq_len=seq_len,
+                    num_kv_heads=attn.num_kv_heads,
+                    head_dim=attn.head_dim,
+                    dtype=dtype,
+                )
+            cache.k_cache = self.kv_cache_pool.acquire(shape, dtype, device)
+            cache.v_cache = self.kv_cache_pool.acquire(shape, dtype, device)
+            cache.cache_pos = torch.arange(seq_len, device=device)
+            attn.kv_cache = cache
+            attn.cache_enabled = True
+        self.backbone.decoder_max_cache_seq_len = seq_len
         with device:
-            self.backbone.setup_caches(max_batch_size, dtype)
             self.decoder.setup_caches(
                 max_batch_size,
                 dtype,
@@ -171,12 +304,52 @@ class HeartMuLa(PreTrainedModel):
 
         self.register_buffer(
             "backbone_causal_mask",
-            _create_causal_mask(self.backbone.max_seq_len, device),
+            _create_causal_mask(seq_len, device),
+            persistent=False,
         )
         self.register_buffer(
             "decoder_causal_mask",
             _create_causal_mask(self.config.audio_num_codebooks, device),
+            persistent=False,
+        )
+        # Static per-frame decoder workspace: positions (and their mask rows) of every
+        # codebook step, and the decoder KV caches so they can be rewound in place.
+        self.register_buffer(
+            "decoder_pos_table",
+            torch.arange(self.config.audio_num_codebooks, device=device).repeat(
+                max_batch_size, 1
+            ),
+            persistent=False,
+        )
+        self.register_buffer(
+            "decoder_step_causal_mask",
+            _index_causal_mask(self.decoder_causal_mask, self.decoder_pos_table),
+            persistent=False,
         )
+        self._decoder_kv_caches = [
+            m for m in self.decoder.modules() if isinstance(m, KVCache)
+        ]
+        self._backbone_kv_caches = [layer.attn.kv_cache for layer in self.backbone.layers]
+
+    def _advance_rolling_window(self):
+        slot, shift = self._rolling.advance()
+        sink_len = self._rolling.sink_len
+        rope = self.backbone.layers[0].attn.pos_embeddings
+        for cache in self._backbone_kv_caches:
+            if shift:
+                keys = cache.k_cache[:, :, sink_len:]
+                keys.copy_(rotate_keys(keys, rope, shift))
+            if slot == sink_len:
+                # the write position wraps around to the oldest frame
+                cache.cache_pos[:1].fill_(slot)
+
+    def _rewind_decoder_caches(self):
+        # Entries past the current position are masked out, so unlike
+        # decoder.reset_caches() the stale keys/values need not be zeroed, and the
+        # position reset stays on the device (KVCache.reset reads its size back).
+        positions = self.decoder_pos_table[0]
+        for cache in self._decoder_kv_caches:
+            cache.cache_pos.copy_(positions)
 
     def generate_frame(
         self,
@@ -188,11 +361,28 @@ class HeartMuLa(PreTrainedModel):
         cfg_scale: float,
         continuous_segments: torch.Tensor = None,
         starts=None,
+        embed_mode: str | None = None,
+        out: torch.Tensor | None = None,
     ) -> torch.Tensor:
+        """Generate one audio frame.
+
+        ``embed_mode`` states which columns ``tokens_mask`` enables so only those are
+        embedded: "text" when only the text column is set (prompt prefill), "audio"
+        when only the audio codebooks are (frame decoding). None embeds every column
+        and applies the mask.
+
+        The sampled codes, (B, audio_num_codebooks), are written to ``out`` if given
+        so a decode loop can reuse one tensor for every frame.
+        """
         b, s, _ = tokens.size()
 
         assert self.backbone.caches_are_enabled(), "backbone caches are not enabled"
-        curr_backbone_mask = _index_causal_mask(self.backbone_causal_mask, input_pos)
+        if self._rolling is not None and s == 1:
+            self._advance_rolling_window()
+            input_pos = self._rolling.input_pos[:b]
+            curr_backbone_mask = self._rolling.mask[:b]
+        else:
+            curr_backbone_mask = _index_causal_mask(self.backbone_causal_mask, input_pos)
 
         uncond_mask = None
         if cfg_scale > 1.0 and b > 1:
@@ -204,9 +394,19 @@ class HeartMuLa(PreTrainedModel):
                 ]
             )
 
-        embeds = self._embed_tokens(tokens, uncond_mask=uncond_mask)
-        masked_embeds = embeds * tokens_mask.unsqueeze(-1)
-        h = masked_embeds.sum(dim=2, dtype=embeds.dtype)  # merge
+        if embed_mode == "text":
+            h = self._embed_text(tokens, uncond_mask=uncond_mask)
+        elif embed_mode == "audio":
+            h = self._embed_frame_audio(tokens).sum(dim=2)
+        elif embed_mode is None:
+            embeds = self._embed_tokens(tokens, uncond_mask=uncond_mask)
+            masked_embeds = embeds * tokens_mask.unsqueeze(-1)
+            h = masked_embeds.sum(dim=2, dtype=embeds.dtype)  # merge
+        else:
+            raise ValueError(
+                f"Unknown embed_mode {embed_mode!r}, expected 'text', 'audio' or None."
+            )
+        embed_dtype = h.dtype
         if continuous_segments is not None:
             continuous_segments = self.muq_linear(continuous_segments)
             if uncond_mask is not None:
@@ -220,54 +420,58 @@ class HeartMuLa(PreTrainedModel):
             batch_indices = torch.arange(h.shape[0], device=h.device)
             h[batch_indices, starts] = continuous_segments
         h = self.backbone(h, input_pos=input_pos, mask=curr_backbone_mask)
-        last_h = h[:, -1, :]  # the last frame
-        c0_logits = self.codebook0_head(last_h)  # only predict the audio part
-
-        if cfg_scale > 1.0 and b > 1 and (b % 2 == 0):
-            actual_B = b // 2
-            cond_logits = c0_logits[:actual_B, :]
-            uncond_logits = c0_logits[actual_B:, :]
-            guided_logits = uncond_logits + (cond_logits - uncond_logits) * cfg_scale
-            c0_sample = sample_topk(guided_logits, topk, temperature)
-            c0_sample = c0_sample.repeat(
-                2, 1
-            )  # repeat to both branches to keep alignment
-        else:
-            c0_sample = sample_topk(c0_logits, topk, temperature)
+        # torchtune returns float32 hidden states; cast back explicitly since quantized
+        # heads do not go through autocast.
+        last_h = h[:, -1, :].to(embed_dtype)  # the last frame
+        c0_logits = self.codebook0_head(last_h)
+
+        num_codebooks = self.config.audio_num_codebooks
+        if out is None:
+            out = torch.empty((b, num_codebooks), dtype=torch.int, device=tokens.device)
+        guided = cfg_scale > 1.0 and b > 1 and (b % 2 == 0)
+
+        def _sample(logits: torch.Tensor, codebook: int) -> torch.Tensor:
+            column = out[:, codebook : codebook + 1]
+            if guided:
+                actual_B = b // 2
+                cond_logits = logits[:actual_B, :]
+                uncond_logits = logits[actual_B:, :]
+                guided_logits = uncond_logits + (cond_logits - uncond_logits) * cfg_scale
+                sample = sample_topk(guided_logits, topk, temperature)
+                # the same sample for both branches to keep alignment
+                column[:actual_B] = sample
+                column[actual_B:] = sample
+            else:
+                column.copy_(sample_topk(logits, topk, temperature))
+            return column
 
+        c0_sample = _sample(c0_logits, 0)  # only predict the audio part
         c0_embed = self._embed_audio(0, c0_sample)
 
-        self.decoder.reset_caches()
+        self._rewind_decoder_caches()
         curr_h = torch.cat([last_h.unsqueeze(1), c0_embed], dim=1)
-        curr_sample = c0_sample.clone()
-        curr_pos = (
-            torch.arange(0, curr_h.size(1), device=curr_h.device)
-            .unsqueeze(0)
-            .repeat(curr_h.size(0), 1)
-        )
-        curr_h = curr_h.to(embeds.dtype)
-        for i in range(1, self.config.audio_num_codebooks):
-            curr_decoder_mask = _index_causal_mask(self.decoder_causal_mask, curr_pos)
+        curr_pos = self.decoder_pos_table[:b, :2]
+        curr_decoder_mask = self.decoder_step_causal_mask[:b, :2]
+        curr_h = curr_h.to(embed_dtype)
+        for i in range(1, num_codebooks):
             decoder_h = self.decoder(
                 self.projection(curr_h), input_pos=curr_pos, mask=curr_decoder_mask
             )
-            ci_logits = torch.mm(decoder_h[:, -1, :], self.audio_head[i - 1])
-            if cfg_scale > 1.0 and b > 1 and (b % 2 == 0):
-                actual_B = b // 2
-                cond_ci = ci_logits[:actual_B, :]
-                uncond_ci = ci_logits[actual_B:, :]
-                guided_ci = uncond_ci + (cond_ci - uncond_ci) * cfg_scale
+            ci_logits = self._audio_head_logits(
+                decoder_h[:, -1, :].to(embed_dtype), i - 1
+            )
+            ci_sample = _sample(ci_logits, i)
+            curr_h = self._embed_audio(i, ci_sample)
+            curr_pos = self.decoder_pos_table[:b, i + 1 : i + 2]
+            curr_decoder_mask = self.decoder_step_causal_mask[:b, i + 1 : i + 2]
 
-                ci_sample = sample_topk(guided_ci, topk, temperature)
-                ci_sample = ci_sample.repeat(2, 1)
-            else:
-                ci_sample = sample_topk(ci_logits, topk, temperature)
-            ci_embed = self._embed_audio(i, ci_sample)
-            curr_h = ci_embed
-            curr_sample = torch.cat([curr_sample, ci_sample], dim=1)
-            curr_pos = curr_pos[:, -1:] + 1
+        return out
 
-        return curr_sample
+    def _audio_head_logits(self, h: torch.Tensor, index: int) -> torch.Tensor:
+        # audio_head is split into per-codebook nn.Linear when quantized.
+        if isinstance(self.audio_head, nn.ModuleList):
+            return self.audio_head[index](h)
+        return torch.mm(h, self.audio_head[index])
 
     def reset_caches(self):
         self.backbone.reset_caches()
@@ -287,9 +491,10 @@ class HeartMuLa(PreTrainedModel):
     def _embed_audio(self, codebook: int, tokens: torch.Tensor) -> torch.Tensor:
         return self.audio_embeddings(tokens + codebook * self.config.audio_vocab_size)
 
-    def _embed_tokens(
+    def _embed_text(
         self, tokens: torch.Tensor, uncond_mask: torch.Tensor | None
     ) -> torch.Tensor:
+        """Embeddings of the text column, (B, S, D)."""
         B, S, _ = tokens.size()
         text_embeds = self.text_embeddings(tokens[:, :, -1])
 
@@ -303,14 +508,21 @@ class HeartMuLa(PreTrainedModel):
                 uncond_text_embed,
                 text_embeds,
             )
+        return text_embeds
 
-        text_embeds = text_embeds.unsqueeze(-2)
-
+    def _embed_frame_audio(self, tokens: torch.Tensor) -> torch.Tensor:
+        """Embeddings of the audio codebook columns, (B, S, audio_num_codebooks, D)."""
         audio_tokens = tokens[:, :, :-1] + (
             self.config.audio_vocab_size
             * torch.arange(self.config.audio_num_codebooks, device=tokens.device)
         )
-        audio_embeds = self.audio_embeddings(audio_tokens.view(-1)).reshape(
+        return self.audio_embeddings(audio_tokens.view(-1)).reshape(
             tokens.size(0), tokens.size(1), self.config.audio_num_codebooks, -1
         )
+
+    def _embed_tokens(
+        self, tokens: torch.Tensor, uncond_mask: torch.Tensor | None
+    ) -> torch.Tensor:
+        text_embeds = self._embed_text(tokens, uncond_mask).unsqueeze(-2)
+        audio_embeds = self._embed_frame_audio(tokens)
         return torch.cat([audio_embeds, text_embeds], dim=-2)
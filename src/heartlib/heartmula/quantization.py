@@ -0,0 +1,168 @@
+"""Weight-only quantization of HeartMuLa for memory-bandwidth bound (CPU) serving.
+
+The backbone, decoder, ``projection``, ``codebook0_head`` and ``audio_head`` linears
+are quantized with torchao; embeddings and ``muq_linear`` stay in the model dtype.
+Quantized weights are stored in a sidecar file next to the checkpoint so the
+conversion only has to run once.
+"""
+import os
+import tempfile
+from typing import Optional
+
+import torch
+import torch.nn as nn
+
+from ..checkpoint import init_empty, load_pretrained
+from .modeling_heartmula import HeartMuLa
+
+QUANTIZATION_MODES = ("int8", "int4")
+
+_QUANTIZED_PREFIXES = ("backbone.", "decoder.", "projection", "codebook0_head", "audio_head.")
+
+
+def sidecar_path(model_path: str, mode: str) -> str:
+    return os.path.join(model_path, f"quantized-{mode}.pt")
+
+
+def _weight_config(mode: str, group_size: int, device: torch.device):
+    from torchao.quantization import int4_weight_only, int8_weight_only
+
+    if mode == "int8":
+        return int8_weight_only()
+    if mode == "int4":
+        # The default int4 layout is the CUDA tinygemm one; CPU needs its own packing.
+        if device.type == "cpu":
+            from torchao.dtypes import Int4CPULayout
+
+            return int4_weight_only(group_size=group_size, layout=Int4CPULayout())
+        return int4_weight_only(group_size=group_size)
+    raise ValueError(
+        f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}."
+    )
+
+
+def split_audio_head(model: HeartMuLa) -> HeartMuLa:
+    """Turn the stacked ``audio_head`` parameter into one ``nn.Linear`` per codebook
+    so it can be quantized like the other linears. Logits are unchanged."""
+    if isinstance(model.audio_head, nn.ModuleList):
+        return model
+    head = model.audio_head.detach()
+    num_heads, decoder_dim, vocab_size = head.shape
+    linears = nn.ModuleList()
+    for i in range(num_heads):
+        linear = nn.Linear(
+            decoder_dim, vocab_size, bias=False, device=head.device, dtype=head.dtype
+        )
+        linear.weight = nn.Parameter(
+            head[i].t().contiguous(), requires_grad=model.audio_head.requires_grad
+        )
+        linears.append(linear)
+    del model.audio_head
+    model.audio_head = linears
+    return model
+
+
+def quantize_heartmula(
+    model: HeartMuLa, mode: str = "int8", group_size: int = 128
+) -> HeartMuLa:
+    """Quantize ``model`` in place to weight-only ``mode`` ("int8" or "int4").
+
+    int4 is groupwise with ``group_size`` and expects a bfloat16 model.
+    """
+    from torchao.quantization import quantize_
+
+    config = _weight_config(mode, group_size, next(model.parameters()).device)
+    split_audio_head(model)
+    model.requires_grad_(False)
+    quantize_(
+        model,
+        config,
+        filter_fn=lambda module, fqn: isinstance(module, nn.Linear)
+        and fqn.startswith(_QUANTIZED_PREFIXES),
+    )
+    model.quantization = {"mode": mode, "group_size": group_size}
+    return model
+
+
+def save_quantized(model: HeartMuLa, path: str) -> None:
+    """Write the state dict of a quantized model to a sidecar file.
+
+    The file is written next to ``path`` and renamed into place, so a process loading
+    the sidecar at the same time never sees it half written."""
+    quantization = getattr(model, "quantization", None)
+    if quantization is None:
+        raise ValueError("Model is not quantized; call quantize_heartmula first.")
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            torch.save({**quantization, "state_dict": model.state_dict()}, fp)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_quantized(
+    model: HeartMuLa, path: str, device: Optional[torch.device] = None
+) -> HeartMuLa:
+    """Replace the weights of ``model`` with the quantized ones stored at ``path``."""
+    if device is None:
+        device = next(model.parameters()).device
+    # The quantized weights are torchao tensor subclasses, which need full unpickling.
+    sidecar = torch.load(path, map_location=device, weights_only=False)
+    split_audio_head(model)
+    model.requires_grad_(False)
+    model.load_state_dict(sidecar["state_dict"], assign=True)
+    model.quantization = {"mode": sidecar["mode"], "group_size": sidecar["group_size"]}
+    return model
+
+
+def load_quantized_pretrained(
+    model_path: str, mode: str, device: torch.device, dtype: torch.dtype
+) -> HeartMuLa:
+    """Load a HeartMuLa whose weights are only stored in the ``mode`` sidecar."""
+    model = init_empty(HeartMuLa, model_path, dtype)
+    model = load_quantized(model, sidecar_path(model_path, mode), device)
+    return model.to(device).eval()
+
+
+def load_or_quantize_pretrained(
+    model_path: str,
+    mode: str,
+    device: torch.device,
+    dtype: torch.dtype,
+    group_size: int = 128,
+    save: bool = True,
+) -> HeartMuLa:
+    """Load HeartMuLa from ``model_path`` quantized to ``mode``: straight from the
+    sidecar onto an empty model if there is one, otherwise from the full-precision
+    checkpoint, quantized (and, if ``save``, written to the sidecar)."""
+    if os.path.isfile(sidecar_path(model_path, mode)):
+        return load_quantized_pretrained(model_path, mode, device, dtype)
+    model = load_pretrained(HeartMuLa, model_path, device, dtype)
+    return load_or_quantize(model, model_path, mode, group_size, save)
+
+
+def load_or_quantize(
+    model: HeartMuLa,
+    model_path: str,
+    mode: str,
+    group_size: int = 128,
+    save: bool = True,
+) -> HeartMuLa:
+    """Load the ``mode`` sidecar from ``model_path`` if present, otherwise quantize
+    ``model`` and (if ``save``) write the sidecar for the next load."""
+    path = sidecar_path(model_path, mode)
+    if os.path.isfile(path):
+        return load_quantized(model, path)
+    quantize_heartmula(model, mode, group_size)
+    if save:
+        try:
+            save_quantized(model, path)
+        except OSError as e:
+            print(f"Could not write quantized weights to {path}: {e}")
+    return model
+
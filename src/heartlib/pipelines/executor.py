@@ -0,0 +1,149 @@
+"""Two-stage pipelined execution of HeartMuLaGenPipeline requests.
+
+``HeartMuLaGenPipeline.__call__`` runs the LM (preprocess + ``_forward``) and the
+codec (``postprocess``) of a request back to back, so with HeartMuLa and HeartCodec
+on different devices one of them is always idle. ``PipelinedExecutor`` runs each
+stage in its own thread with a bounded queue of generated frames between them: the
+LM works on request N+1 while the codec decodes request N.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+import torch
+
+from .music_generation import HeartMuLaGenPipeline
+
+_STOP = object()
+
+
+class _StageStats:
+    def __init__(self):
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy: float = 0.0, blocked: float = 0.0, items: int = 0):
+        with self._lock:
+            self.busy_seconds += busy
+            self.blocked_seconds += blocked
+            self.items += items
+
+    def snapshot(self, elapsed: float) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "items": self.items,
+                "busy_seconds": self.busy_seconds,
+                # time spent waiting for room in the hand-off queue (LM stage only)
+                "blocked_seconds": self.blocked_seconds,
+                "utilization": self.busy_seconds / elapsed if elapsed > 0 else 0.0,
+            }
+
+
+class PipelinedExecutor:
+    """Run requests through ``pipeline`` with the LM and codec stages overlapped.
+
+    ``submit`` takes the same arguments as ``pipeline(...)`` and returns a Future
+    resolving to the ``save_path`` of the generated audio. At most ``queue_size``
+    generated songs wait for the codec; beyond that the LM stage blocks.
+
+    The pipeline must not use ``lazy_load``: both models stay resident while the
+    stages run concurrently.
+    """
+
+    def __init__(self, pipeline: HeartMuLaGenPipeline, queue_size: int = 2):
+        if pipeline.lazy_load:
+            raise ValueError(
+                "PipelinedExecutor needs both models resident; create the pipeline with "
+                "lazy_load=False (and HeartMuLa / HeartCodec on separate devices)."
+            )
+        if queue_size < 1:
+            raise ValueError(f"queue_size must be at least 1, got {queue_size}.")
+        self.pipeline = pipeline
+        self._requests: "queue.Queue" = queue.Queue()
+        self._frames: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stats = {"lm": _StageStats(), "codec": _StageStats()}
+        self._start = time.perf_counter()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._lm_stage, name="heartlib-lm", daemon=True),
+            threading.Thread(target=self._codec_stage, name="heartlib-codec", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, inputs: Dict[str, Any], **kwargs) -> Future:
+        if self._closed:
+            raise RuntimeError("PipelinedExecutor is closed.")
+        future: Future = Future()
+        self._requests.put((future, inputs, kwargs))
+        return future
+
+    def _lm_stage(self):
+        stats = self._stats["lm"]
+        while True:
+            item = self._requests.get()
+            if item is _STOP:
+                self._frames.put(_STOP)
+                return
+            future, inputs, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            try:
+                preprocess_kwargs, forward_kwargs, postprocess_kwargs = (
+                    self.pipeline._sanitize_parameters(**kwargs)
+                )
+                with torch.no_grad():
+                    model_inputs = self.pipeline.preprocess(inputs, **preprocess_kwargs)
+                    model_outputs = self.pipeline._forward(model_inputs, **forward_kwargs)
+            except BaseException as e:
+                stats.add(busy=time.perf_counter() - start)
+                future.set_exception(e)
+                continue
+            handed_off = time.perf_counter()
+            self._frames.put((future, model_outputs, postprocess_kwargs))
+            stats.add(
+                busy=handed_off - start,
+                blocked=time.perf_counter() - handed_off,
+                items=1,
+            )
+
+    def _codec_stage(self):
+        stats = self._stats["codec"]
+        while True:
+            item = self._frames.get()
+            if item is _STOP:
+                return
+            future, model_outputs, postprocess_kwargs = item
+            start = time.perf_counter()
+            try:
+                with torch.no_grad():
+                    self.pipeline.postprocess(model_outputs, **postprocess_kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(postprocess_kwargs["save_path"])
+            stats.add(busy=time.perf_counter() - start, items=1)
+
+    def utilization(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage busy time and the fraction of wall time since start it covers."""
+        elapsed = time.perf_counter() - self._start
+        return {name: stats.snapshot(elapsed) for name, stats in self._stats.items()}
+
+    def close(self, timeout: Optional[float] = None):
+        """Finish the submitted requests and stop both stages."""
+        if not self._closed:
+            self._closed = True
+            self._requests.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def __enter__(self) -> "PipelinedExecutor":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,16 +1,25 @@
 from tokenizers import Tokenizer
+from ..bundle import dtype_from_name, read_manifest, verify_manifest
+from ..cancellation import GenerationCancelled
+from ..progress import ProgressCallback, StageProgress, TqdmProgress
+from ..checkpoint import load_pretrained
 from ..heartmula.modeling_heartmula import HeartMuLa
+from ..heartmula.quantization import load_or_quantize_pretrained, load_quantized_pretrained
+from .residency import HOST, ModelResidency
 from ..heartcodec.modeling_heartcodec import HeartCodec
 import torch
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union
 import os
+import threading
 from dataclasses import dataclass
-from tqdm import tqdm
 import torchaudio
 import json
 from contextlib import contextmanager
 import gc
 
+# lossy encoders (MP3 adds ~1.1k samples) delay the decoded audio by at most this many samples
+MAX_ENCODER_DELAY = 4800
+
 
 def _resolve_paths(pretrained_path: str, version: str):
     # version may be full dir name from API (e.g. "HeartMuLa-oss-3B") or preset name (e.g. "HeartMula-Pro-4B (v2.1)") or short ("3B"); avoid double prefix
@@ -71,6 +80,22 @@ def _resolve_devices(
     return mula_device, codec_device, lazy_load
 
 
+def _encoder_delay(decoded: torch.Tensor, reference: torch.Tensor, start: int) -> int:
+    """Samples by which ``reference``, expected at ``start`` of ``decoded``, is delayed.
+
+    The lag with the highest normalized cross-correlation up to ``MAX_ENCODER_DELAY``.
+    """
+    window = reference.shape[-1]
+    max_delay = min(MAX_ENCODER_DELAY, decoded.shape[-1] - start - window)
+    if window == 0 or start < 0 or max_delay <= 0:
+        return 0
+    signal = decoded.mean(0)[start : start + window + max_delay][None, None]
+    kernel = reference.mean(0)[None, None]
+    scores = torch.nn.functional.conv1d(signal, kernel)[0, 0]
+    energy = torch.nn.functional.conv1d(signal**2, torch.ones_like(kernel))[0, 0]
+    return int(torch.argmax(scores / energy.clamp_min(1e-12).sqrt()))
+
+
 @dataclass
 class HeartMuLaGenConfig:
     text_bos_id: int = 128000
@@ -98,6 +123,14 @@ class HeartMuLaGenPipeline:
         muq_mulan: Optional[Any],
         text_tokenizer: Tokenizer,
         config: HeartMuLaGenConfig,
+        heartmula_quantization: Optional[str] = None,
+        heartcodec_precision: Optional[str] = None,
+        bundle: Optional[Dict[str, Any]] = None,
+        offload_tier: Optional[str] = None,
+        offload_dir: Optional[str] = None,
+        codec_prefetch_frames: int = 25,
+        eos_check_interval: int = 8,
+        long_form_window: Optional[int] = None,
     ):
 
         self.muq_mulan = muq_mulan
@@ -111,9 +144,28 @@ class HeartMuLaGenPipeline:
         self.mula_dtype = heartmula_dtype
         self.mula_path = heartmula_path
         self.mula_device = heartmula_device
+        self.mula_quantization = heartmula_quantization
         self.codec_dtype = heartcodec_dtype
         self.codec_path = heartcodec_path
         self.codec_device = heartcodec_device
+        self.codec_precision = heartcodec_precision
+        # manifest of a precompiled bundle (see heartlib.bundle), None for plain checkpoints
+        self.bundle = bundle
+        # with lazy_load and an offload_tier ("host" pinned memory or "disk" mmapped
+        # file), idle models are parked there instead of deleted and reloaded; worth it
+        # only for a pipeline that serves many requests (call close() when done)
+        self.offload_tier = offload_tier
+        self.offload_dir = offload_dir
+        # frames before max_audio_length at which a parked codec starts moving back
+        # (or as soon as EOS is seen, for songs that end earlier)
+        self.codec_prefetch_frames = codec_prefetch_frames
+        self._residency: Dict[str, ModelResidency] = {}
+        # the decode loop looks at the EOS flag copied back from the device every
+        # eos_check_interval frames instead of synchronizing on every frame
+        self.eos_check_interval = eos_check_interval
+        # number of recent frames the backbone attends to in the rolling cache; None
+        # rolls only for songs longer than the backbone context
+        self.long_form_window = long_form_window
 
         self._mula: Optional[HeartMuLa] = None
         self._codec: Optional[HeartCodec] = None
@@ -121,79 +173,145 @@ class HeartMuLaGenPipeline:
             print(
                 f"You have set lazy_load = False. Loading HeartMuLa and HeartCodec onto device..."
             )
-            self._mula = HeartMuLa.from_pretrained(
-                self.mula_path,
-                device_map=self.mula_device,
-                dtype=self.mula_dtype,
-            )
-            self._codec = HeartCodec.from_pretrained(
-                self.codec_path,
-                device_map=self.codec_device,
-                dtype=self.codec_dtype,
-            )
+            self._mula = self._load_mula()
+            self._codec = self._load_codec()
         self.lazy_load = lazy_load
 
     @property
     def mula(self) -> HeartMuLa:
         if isinstance(self._mula, HeartMuLa):
+            self._ensure_resident("mula")
             return self._mula
-        self._mula = HeartMuLa.from_pretrained(
-            self.mula_path,
-            device_map=self.mula_device,
-            dtype=self.mula_dtype,
-        )
+        self._mula = self._load_mula()
         return self._mula
 
+    def _load_mula(self) -> HeartMuLa:
+        bundled = self.bundle["mula"]["quantization"] if self.bundle else None
+        if bundled:
+            return load_quantized_pretrained(
+                self.mula_path, bundled["mode"], self.mula_device, self.mula_dtype
+            )
+        if self.mula_quantization:
+            return load_or_quantize_pretrained(
+                self.mula_path, self.mula_quantization, self.mula_device, self.mula_dtype
+            )
+        return load_pretrained(HeartMuLa, self.mula_path, self.mula_device, self.mula_dtype)
+
     @property
     def codec(self) -> HeartCodec:
         if isinstance(self._codec, HeartCodec):
+            self._ensure_resident("codec")
             return self._codec
-        self._codec = HeartCodec.from_pretrained(
-            self.codec_path,
-            device_map=self.codec_device,
-            dtype=self.codec_dtype,
-        )
+        self._codec = self._load_codec()
         return self._codec
 
-    def _unload(self):
+    def _load_codec(self) -> HeartCodec:
+        prepare = None
+        if self.bundle and self.bundle["codec"]["weight_norm_folded"]:
+            prepare = lambda codec: codec.scalar_model.remove_weight_norm()
+        codec = load_pretrained(
+            HeartCodec, self.codec_path, self.codec_device, self.codec_dtype, prepare
+        ).optimize_for_inference()
+        if self.codec_precision:
+            codec.set_estimator_precision(self.codec_precision)
+        return codec
+
+    def _ensure_resident(self, name: str):
+        residency = self._residency.get(name)
+        if residency is not None:
+            residency.ensure_on_device()
+
+    def _prefetch_codec(self):
+        residency = self._residency.get("codec")
+        if residency is not None:
+            residency.prefetch()
+
+    def _park(self, name: str, model: torch.nn.Module):
+        if name == "mula":
+            # KV caches and their masks are rebuilt by the next setup_caches
+            model.release_caches()
+            model.kv_cache_pool.clear()
+        residency = self._residency.get(name)
+        if residency is None:
+            is_scratch = None
+            if name == "mula":
+                is_scratch = lambda n: n.endswith("causal_mask")
+            residency = self._residency[name] = ModelResidency(
+                type(model).__name__,
+                model,
+                getattr(self, f"{name}_device"),
+                offload_dir=self.offload_dir,
+                is_scratch=is_scratch,
+            )
+        residency.offload(self.offload_tier)
+
+    def close(self):
+        """Drop the parked copies of the models and their offload files. Models are
+        loaded again on next use."""
+        for name, residency in self._residency.items():
+            residency.close()
+            if self.lazy_load:
+                setattr(self, f"_{name}", None)
+        self._residency.clear()
+        gc.collect()
+
+    def residency_transitions(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Timings of every offload / swap-in of each parked model."""
+        return {name: r.transitions for name, r in self._residency.items()}
+
+    def kv_cache_bytes(
+        self, prompt_len: int, max_audio_length_ms: int, cfg_scale: float = 1.5
+    ) -> int:
+        """Device memory the KV caches of one request take, for fitting requests in."""
+        bs_size = 2 if cfg_scale != 1.0 else 1
+        return self.mula.kv_cache_bytes(
+            bs_size,
+            prompt_len + max_audio_length_ms // 80,
+            sink_len=prompt_len,
+            window=self.long_form_window,
+        )
+
+    def _unload(self, *names: str):
         if not self.lazy_load:
             return
-        if isinstance(self._mula, HeartMuLa):
-            print(f"You have set lazy_load=True. Unloading HeartMuLa from device.")
-            print(
-                f"CUDA memory before unloading: {torch.cuda.memory_allocated(self.mula_device) / 1024**3:.2f} GB"
-            )
-            del self._mula
-            gc.collect()
-            torch.cuda.empty_cache()
-            print(
-                f"CUDA memory after unloading: {torch.cuda.memory_allocated(self.mula_device) / 1024**3:.2f} GB"
-            )
-            self._mula = None
-        if isinstance(self._codec, HeartCodec):
-            print(f"You have set lazy_load=True. Unloading HeartCodec from device.")
+        for name in names or ("mula", "codec"):
+            model = getattr(self, f"_{name}")
+            if model is None:
+                continue
+            if self.offload_tier is not None:
+                self._park(name, model)
+                continue
+            device = getattr(self, f"{name}_device")
+            print(f"You have set lazy_load=True. Unloading {type(model).__name__} from device.")
             print(
-                f"CUDA memory before unloading: {torch.cuda.memory_allocated(self.codec_device) / 1024**3:.2f} GB"
+                f"CUDA memory before unloading: {torch.cuda.memory_allocated(device) / 1024**3:.2f} GB"
             )
-            del self._codec
+            del model
+            setattr(self, f"_{name}", None)
             gc.collect()
             torch.cuda.empty_cache()
             print(
-                f"CUDA memory after unloading: {torch.cuda.memory_allocated(self.codec_device) / 1024**3:.2f} GB"
+                f"CUDA memory after unloading: {torch.cuda.memory_allocated(device) / 1024**3:.2f} GB"
             )
-            self._codec = None
         return
 
     def _sanitize_parameters(self, **kwargs):
+        # one callback for both stages; tqdm bars on stderr unless the caller takes over
+        progress_callback = kwargs.get("progress_callback") or TqdmProgress()
         preprocess_kwargs = {"cfg_scale": kwargs.get("cfg_scale", 1.5)}
         forward_kwargs = {
             "max_audio_length_ms": kwargs.get("max_audio_length_ms", 120_000),
             "temperature": kwargs.get("temperature", 1.0),
             "topk": kwargs.get("topk", 50),
             "cfg_scale": kwargs.get("cfg_scale", 1.5),
+            "cancel_event": kwargs.get("cancel_event", None),
+            "progress_callback": progress_callback,
         }
         postprocess_kwargs = {
             "save_path": kwargs.get("save_path", "output.mp3"),
+            "save_state_path": kwargs.get("save_state_path", None),
+            "cancel_event": kwargs.get("cancel_event", None),
+            "progress_callback": progress_callback,
         }
         return preprocess_kwargs, forward_kwargs, postprocess_kwargs
 
@@ -252,6 +370,29 @@ class HeartMuLaGenPipeline:
         tokens_mask = torch.zeros_like(tokens, dtype=torch.bool)
         tokens_mask[:, -1] = True
 
+        # process stored frames of a previous generation (song extension)
+        continue_from = inputs.get("continue_from", None)
+        prefix_frames = None
+        incontext_latents = None
+        prefix_audio = None
+        if continue_from is not None:
+            if isinstance(continue_from, str):
+                continue_from = torch.load(continue_from, map_location="cpu")
+            prefix_frames = continue_from["frames"].to(torch.long)
+            incontext_latents = continue_from.get("tail_latents", None)
+            prefix_audio = continue_from.get("audio", None)
+            # the stored frames follow the prompt, so a single prefill rebuilds the KV cache
+            audio_tokens = torch.full(
+                [prefix_frames.shape[-1], self._parallel_number],
+                self.config.empty_id,
+                dtype=torch.long,
+            )
+            audio_tokens[:, :-1] = prefix_frames.t()
+            audio_tokens_mask = torch.ones_like(audio_tokens, dtype=torch.bool)
+            audio_tokens_mask[:, -1] = False
+            tokens = torch.cat([tokens, audio_tokens], dim=0)
+            tokens_mask = torch.cat([tokens_mask, audio_tokens_mask], dim=0)
+
         bs_size = 2 if cfg_scale != 1.0 else 1
 
         def _cfg_cat(tensor: torch.Tensor, cfg_scale: float):
@@ -260,13 +401,21 @@ class HeartMuLaGenPipeline:
                 tensor = torch.cat([tensor, tensor], dim=0)
             return tensor
 
-        return {
+        model_inputs = {
             "tokens": _cfg_cat(tokens, cfg_scale),
             "tokens_mask": _cfg_cat(tokens_mask, cfg_scale),
             "muq_embed": _cfg_cat(muq_embed, cfg_scale),
             "muq_idx": [muq_idx] * bs_size,
-            "pos": _cfg_cat(torch.arange(prompt_len, dtype=torch.long), cfg_scale),
+            "pos": _cfg_cat(torch.arange(tokens.shape[0], dtype=torch.long), cfg_scale),
         }
+        if prefix_frames is not None:
+            model_inputs["prefix_frames"] = prefix_frames
+            model_inputs["incontext_latents"] = incontext_latents
+            # the lossless track stored with the frames is preferred over the encoded file
+            if prefix_audio is None:
+                prefix_audio = inputs.get("prefix_audio", None)
+            model_inputs["prefix_audio"] = prefix_audio
+        return model_inputs
 
     def _forward(
         self,
@@ -275,16 +424,26 @@ class HeartMuLaGenPipeline:
         temperature: float,
         topk: int,
         cfg_scale: float,
+        cancel_event: Optional[threading.Event] = None,
+        progress_callback: Optional[ProgressCallback] = None,
     ):
         prompt_tokens = model_inputs["tokens"].to(self.mula_device)
         prompt_tokens_mask = model_inputs["tokens_mask"].to(self.mula_device)
         continuous_segment = model_inputs["muq_embed"].to(self.mula_device)
         starts = model_inputs["muq_idx"]
         prompt_pos = model_inputs["pos"].to(self.mula_device)
-        frames = []
 
         bs_size = 2 if cfg_scale != 1.0 else 1
-        self.mula.setup_caches(bs_size)
+        max_audio_frames = max_audio_length_ms // 80
+        prompt_len = prompt_tokens.shape[1]
+        # beyond the backbone context (or with long_form_window) the frames go
+        # through a rolling window after the prompt
+        self.mula.setup_caches(
+            bs_size,
+            prompt_len + max_audio_frames,
+            sink_len=prompt_len,
+            window=self.long_form_window,
+        )
         with torch.autocast(device_type=self.mula_device.type, dtype=self.mula_dtype):
             curr_token = self.mula.generate_frame(
                 tokens=prompt_tokens,
@@ -295,55 +454,198 @@ class HeartMuLaGenPipeline:
                 cfg_scale=cfg_scale,
                 continuous_segments=continuous_segment,
                 starts=starts,
+                # a prompt extended with stored frames mixes text and audio rows
+                embed_mode=None if "prefix_frames" in model_inputs else "text",
             )
-        frames.append(curr_token[0:1,])
-
-        def _pad_audio_token(token: torch.Tensor):
-            padded_token = (
-                torch.ones(
-                    (token.shape[0], self._parallel_number),
-                    device=token.device,
-                    dtype=torch.long,
-                )
-                * self.config.empty_id
-            )
-            padded_token[:, :-1] = token
-            padded_token = padded_token.unsqueeze(1)
-            padded_token_mask = torch.ones_like(
-                padded_token, device=token.device, dtype=torch.bool
-            )
-            padded_token_mask[..., -1] = False
-            return padded_token, padded_token_mask
 
-        max_audio_frames = max_audio_length_ms // 80
-
-        for i in tqdm(range(max_audio_frames)):
-            curr_token, curr_token_mask = _pad_audio_token(curr_token)
+        # per-frame workspace, reused for every frame: the padded input frame (audio
+        # codebooks + empty text column), its mask, position and the sampled codes
+        frame_tokens = torch.full(
+            (curr_token.shape[0], 1, self._parallel_number),
+            self.config.empty_id,
+            dtype=torch.long,
+            device=self.mula_device,
+        )
+        frame_tokens_mask = torch.ones_like(frame_tokens, dtype=torch.bool)
+        frame_tokens_mask[..., -1] = False
+        frame_pos = prompt_pos[..., -1:].clone()
+        sample = torch.empty_like(curr_token)
+
+        prefetch_at = max(0, max_audio_frames - self.codec_prefetch_frames)
+
+        # frames stay on the device; frame 0 comes from the prompt and is never EOS
+        frame_buffer = torch.empty(
+            (curr_token.shape[-1], max_audio_frames + 1),
+            dtype=torch.long,
+            device=self.mula_device,
+        )
+        frame_buffer[:, 0] = curr_token[0]
+        num_frames = 1
+        on_cuda = self.mula_device.type == "cuda"
+        eos_host = torch.zeros((), dtype=torch.bool, pin_memory=on_cuda)
+        eos_ready = None
+        eos_checked = 1
+
+        progress = StageProgress(progress_callback, "generate", "frames", max_audio_frames)
+        for i in range(max_audio_frames):
+            if cancel_event is not None and cancel_event.is_set():
+                self._unload("mula")
+                raise GenerationCancelled()
+            if i == prefetch_at:
+                self._prefetch_codec()
+            frame_tokens[:, 0, :-1] = curr_token
+            frame_pos += 1
             with torch.autocast(
                 device_type=self.mula_device.type, dtype=self.mula_dtype
             ):
                 curr_token = self.mula.generate_frame(
-                    tokens=curr_token,
-                    tokens_mask=curr_token_mask,
-                    input_pos=prompt_pos[..., -1:] + i + 1,
+                    tokens=frame_tokens,
+                    tokens_mask=frame_tokens_mask,
+                    input_pos=frame_pos,
                     temperature=temperature,
                     topk=topk,
                     cfg_scale=cfg_scale,
                     continuous_segments=None,
                     starts=None,
+                    embed_mode="audio",
+                    out=sample,
                 )
-            if torch.any(curr_token[0:1, :] >= self.config.audio_eos_id):
-                break
-            frames.append(curr_token[0:1,])
-        frames = torch.stack(frames).permute(1, 2, 0).squeeze(0)
-        self._unload()
-        return {"frames": frames}
-
-    def postprocess(self, model_outputs: Dict[str, Any], save_path: str):
+            frame_buffer[:, num_frames] = curr_token[0]
+            num_frames += 1
+            progress.update(i + 1)
+            if eos_ready is not None and (eos_ready is True or eos_ready.query()):
+                eos_ready = None
+                if eos_host.item():
+                    # most songs end before prefetch_at: start moving the codec back
+                    # now so it overlaps with trimming and unloading HeartMuLa
+                    if i < prefetch_at:
+                        self._prefetch_codec()
+                    break
+            if eos_ready is None and (
+                num_frames - eos_checked >= self.eos_check_interval
+            ):
+                eos_host.copy_(
+                    torch.any(
+                        frame_buffer[:, eos_checked:num_frames] >= self.config.audio_eos_id
+                    ),
+                    non_blocking=True,
+                )
+                eos_checked = num_frames
+                if on_cuda:
+                    eos_ready = torch.cuda.Event()
+                    eos_ready.record()
+                else:
+                    eos_ready = True
+        # frames generated past the first EOS are dropped
+        is_eos = torch.any(frame_buffer[:, 1:num_frames] >= self.config.audio_eos_id, dim=0)
+        if torch.any(is_eos):
+            num_frames = 1 + int(torch.argmax(is_eos.to(torch.uint8)))
+        if num_frames - 1 < max_audio_frames:
+            progress.update(num_frames - 1, total=num_frames - 1)
+        frames = frame_buffer[:, :num_frames].clone()
+        self._unload("mula")
+        model_outputs = {"frames": frames}
+        for key in ("prefix_frames", "incontext_latents", "prefix_audio"):
+            if key in model_inputs:
+                model_outputs[key] = model_inputs[key]
+        return model_outputs
+
+    def postprocess(
+        self,
+        model_outputs: Dict[str, Any],
+        save_path: str,
+        save_state_path: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+    ):
         frames = model_outputs["frames"].to(self.codec_device)
-        wav = self.codec.detokenize(frames)
+        prefix_frames = model_outputs.get("prefix_frames", None)
+        incontext_latents = model_outputs.get("incontext_latents", None)
+        codes = frames
+        overlap_codes = 0
+        if prefix_frames is not None:
+            prefix_frames = prefix_frames.to(self.codec_device)
+            if incontext_latents is not None:
+                # only the new frames are decoded; the tail latents of the original
+                # track are the in-context latents of the first new window
+                overlap_codes = incontext_latents.shape[1] // 2
+                incontext_latents = incontext_latents.to(self.codec_device)
+                codes = torch.cat([prefix_frames[:, -overlap_codes:], frames], -1)
+            else:
+                codes = torch.cat([prefix_frames, frames], -1)
+        try:
+            wav, tail_latents = self.codec.detokenize(
+                codes,
+                incontext_latents=incontext_latents,
+                return_tail_latents=True,
+                cancel_event=cancel_event,
+                progress_callback=progress_callback,
+            )
+        except GenerationCancelled:
+            self._unload()
+            raise
         self._unload()
-        torchaudio.save(save_path, wav.to(torch.float32).cpu(), 48000)
+        wav = wav.to(torch.float32).cpu()
+        prefix_audio = model_outputs.get("prefix_audio", None)
+        if prefix_audio is not None and prefix_frames is not None:
+            wav = self._append_to_prefix_audio(
+                prefix_audio, prefix_frames.shape[-1], wav, overlap_codes
+            )
+        if save_state_path is not None:
+            all_frames = frames if prefix_frames is None else torch.cat([prefix_frames, frames], -1)
+            # 16-bit PCM round-trips exactly, so repeated extensions never re-encode the track
+            torch.save(
+                {
+                    "frames": all_frames.cpu(),
+                    "tail_latents": tail_latents.cpu(),
+                    "audio": (wav.clamp(-1, 1) * 32767).round().to(torch.int16),
+                },
+                save_state_path,
+            )
+        torchaudio.save(save_path, wav, 48000)
+
+    def _append_to_prefix_audio(
+        self,
+        prefix_audio: Union[str, torch.Tensor],
+        prefix_codes: int,
+        wav: torch.Tensor,
+        overlap_codes: int,
+    ) -> torch.Tensor:
+        """Crossfade ``wav`` (decoded from the last ``overlap_codes`` prefix codes) onto the prefix.
+
+        ``prefix_audio`` is the 16-bit track stored with the frames or, for states saved
+        without it, an encoded audio file. The decoded file is shifted by the encoder
+        delay, so it is aligned against the start of ``wav`` first.
+        """
+        samples_per_code = int(48000 / 12.5)
+        prefix_len = prefix_codes * samples_per_code
+        ovlp_samples = min(overlap_codes * samples_per_code, wav.shape[-1])
+        if isinstance(prefix_audio, torch.Tensor):
+            prefix_wav = prefix_audio.to(torch.float32) / 32767
+        else:
+            prefix_wav, sr = torchaudio.load(prefix_audio)
+            if sr != 48000:
+                prefix_wav = torchaudio.functional.resample(prefix_wav, sr, 48000)
+            delay = _encoder_delay(
+                prefix_wav, wav[:, : min(ovlp_samples, 48000 // 2)], prefix_len - ovlp_samples
+            )
+            prefix_wav = prefix_wav[:, delay:]
+        if prefix_wav.shape[0] != wav.shape[0]:
+            prefix_wav = prefix_wav[:1].repeat(wav.shape[0], 1)
+        # encoded audio may carry a few samples of padding; align to the stored frames
+        prefix_wav = prefix_wav[:, :prefix_len]
+        if prefix_wav.shape[-1] < prefix_len:
+            prefix_wav = torch.nn.functional.pad(
+                prefix_wav, (0, prefix_len - prefix_wav.shape[-1])
+            )
+        if ovlp_samples == 0:
+            return torch.cat([prefix_wav, wav], -1)
+        ov_win = torch.linspace(0, 1, ovlp_samples)[None, :]
+        mixed = (
+            prefix_wav[:, -ovlp_samples:] * (1 - ov_win)
+            + wav[:, :ovlp_samples] * ov_win
+        )
+        return torch.cat([prefix_wav[:, :-ovlp_samples], mixed, wav[:, ovlp_samples:]], -1)
 
     def __call__(self, inputs: Dict[str, Any], **kwargs):
         preprocess_kwargs, forward_kwargs, postprocess_kwargs = (
@@ -361,17 +663,47 @@ class HeartMuLaGenPipeline:
         dtype: Union[torch.dtype, Dict[str, torch.dtype]],
         version: str,
         lazy_load: bool = False,
+        quantization: Optional[str] = None,
+        codec_precision: Optional[str] = None,
+        verify_bundle: bool = False,
+        offload_tier: Optional[str] = None,
+        offload_dir: Optional[str] = None,
     ):
+        """Load from a checkpoint dir, or from a bundle written by
+        ``heartlib compile-checkpoint``. A bundle supplies the default
+        ``quantization`` and ``codec_precision`` and its weights are used as stored;
+        ``verify_bundle`` checks the checksums of its files first. With ``lazy_load``,
+        idle models are deleted, or parked in ``offload_tier`` (see ``ModelResidency``).
+        """
 
         mula_path, codec_path, tokenizer_path, gen_config_path = _resolve_paths(
             pretrained_path, version
         )
+        bundle = read_manifest(pretrained_path)
+        bundled_quantization = None
+        if bundle is not None:
+            if verify_bundle:
+                verify_manifest(pretrained_path, bundle)
+            bundled_quantization = bundle["mula"]["quantization"]
+            if bundled_quantization:
+                if quantization is None:
+                    quantization = bundled_quantization["mode"]
+                elif quantization != bundled_quantization["mode"]:
+                    raise ValueError(
+                        f"Bundle {pretrained_path} holds {bundled_quantization['mode']} weights only; "
+                        f"cannot load it with quantization={quantization!r}."
+                    )
+            if codec_precision is None:
+                codec_precision = bundle["codec"]["estimator_precision"]
         mula_device, codec_device, lazy_load = _resolve_devices(device, lazy_load)
         tokenizer = Tokenizer.from_file(tokenizer_path)
         gen_config = HeartMuLaGenConfig.from_file(gen_config_path)
 
         mula_dtype = dtype["mula"] if isinstance(dtype, dict) else dtype
         codec_dtype = dtype["codec"] if isinstance(dtype, dict) else dtype
+        if bundled_quantization:
+            # quantized weights are stored for one dtype only
+            mula_dtype = dtype_from_name(bundle["mula"]["dtype"])
 
         return cls(
             heartmula_path=mula_path,
@@ -384,4 +716,9 @@ class HeartMuLaGenPipeline:
             config=gen_config,
             heartmula_dtype=mula_dtype,
             heartcodec_dtype=codec_dtype,
+            heartmula_quantization=quantization,
+            heartcodec_precision=codec_precision,
+            bundle=bundle,
+            offload_tier=offload_tier,
+            offload_dir=offload_dir,
         )
@@ -0,0 +1,190 @@
+"""Tiered residency for lazily loaded models.
+
+Instead of deleting a model and reloading it from the checkpoint, ``ModelResidency``
+parks its tensors in pinned host memory ("host") or in a memory-mapped file ("disk")
+and copies them back to the device on demand. The copy back can be started early
+with ``prefetch`` so it overlaps with other work.
+"""
+import os
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+DEVICE = "device"
+HOST = "host"
+DISK = "disk"
+OFFLOAD_TIERS = (HOST, DISK)
+
+
+def _is_plain(tensor: torch.Tensor) -> bool:
+    # tensor subclasses (e.g. torchao quantized weights) cannot be pinned or mmapped
+    return type(tensor) in (torch.Tensor, nn.Parameter)
+
+
+class ModelResidency:
+    """Moves the parameters and buffers of ``module`` between ``device`` and the
+    offload tiers. Tensors for which ``is_scratch(name)`` is true (KV caches,
+    masks) are not preserved: they are dropped on offload and re-allocated
+    uninitialised when the model returns to the device.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        module: nn.Module,
+        device: torch.device,
+        offload_dir: Optional[str] = None,
+        is_scratch: Optional[Callable[[str], bool]] = None,
+    ):
+        self.name = name
+        self.module = module
+        self.device = device
+        self.offload_dir = offload_dir
+        self.is_scratch = is_scratch or (lambda name: False)
+        self.tier = DEVICE
+        self.transitions: List[Dict[str, object]] = []
+        self._host: Dict[str, torch.Tensor] = {}
+        self._disk: Optional[Dict[str, torch.Tensor]] = None
+        self._disk_path: Optional[str] = None
+        self._scratch: Dict[str, Tuple[torch.Size, torch.dtype]] = {}
+        self._stream = torch.cuda.Stream(device) if device.type == "cuda" else None
+        self._ready: Optional[torch.cuda.Event] = None
+        self._prefetch_start: Optional[float] = None
+        self._prefetch_from: Optional[str] = None
+
+    def _tensors(self) -> Iterator[Tuple[str, nn.Module, str, bool]]:
+        for prefix, owner in self.module.named_modules():
+            for attr, tensor in owner._parameters.items():
+                if tensor is not None:
+                    yield f"{prefix}.{attr}" if prefix else attr, owner, attr, True
+            for attr, tensor in owner._buffers.items():
+                if tensor is not None:
+                    yield f"{prefix}.{attr}" if prefix else attr, owner, attr, False
+
+    @staticmethod
+    def _set(owner: nn.Module, attr: str, is_param: bool, tensor: torch.Tensor):
+        if is_param:
+            owner._parameters[attr] = nn.Parameter(tensor, requires_grad=False)
+        else:
+            owner._buffers[attr] = tensor
+
+    def _record(self, source: str, target: str, start: float, **extra):
+        seconds = time.perf_counter() - start
+        self.transitions.append({"from": source, "to": target, "seconds": seconds, **extra})
+        print(f"{self.name}: {source} -> {target} in {seconds * 1000:.1f} ms")
+
+    def offload(self, tier: str = HOST):
+        """Free the device copy of the model, keeping it in ``tier``."""
+        if tier not in OFFLOAD_TIERS:
+            raise ValueError(f"Unknown offload tier {tier!r}, expected one of {OFFLOAD_TIERS}.")
+        if self.tier == tier:
+            return
+        self.wait()
+        if tier == HOST and self.device.type == "cpu":
+            # already in host memory
+            return
+        start, source = time.perf_counter(), self.tier
+        if tier == DISK and self._disk is None:
+            self._write_disk()
+        pin = self.device.type == "cuda"
+        for name, owner, attr, is_param in self._tensors():
+            tensor = getattr(owner, attr)
+            if self.is_scratch(name):
+                if tensor.device.type != "meta":
+                    self._scratch[name] = (tensor.shape, tensor.dtype)
+                    self._set(owner, attr, is_param, tensor.to("meta"))
+                continue
+            if tier == DISK and is_param:
+                parked = self._disk[name]
+            elif not _is_plain(tensor):
+                parked = self._host.get(name)
+                if parked is None:
+                    parked = self._host[name] = tensor.to("cpu")
+            else:
+                # weights never change during inference, so the host copy made on the
+                # first offload stays valid and later offloads are free; buffers (cache
+                # positions) may have moved on and are copied again
+                parked = self._host.get(name)
+                if parked is None:
+                    parked = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=pin)
+                    parked.copy_(tensor)
+                    self._host[name] = parked
+                elif not is_param:
+                    parked.copy_(tensor)
+            self._set(owner, attr, is_param, parked)
+        if tier == DISK:
+            # buffers are small and stay in host memory
+            params = {name for name, _, _, is_param in self._tensors() if is_param}
+            for name in params & self._host.keys():
+                del self._host[name]
+        self.tier = tier
+        self._record(source, tier, start)
+
+    def _write_disk(self):
+        directory = self.offload_dir or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=f"{self.name}-", suffix=".pt", dir=directory)
+        os.close(fd)
+        state = {
+            name: getattr(owner, attr).detach().cpu()
+            for name, owner, attr, is_param in self._tensors()
+            if is_param
+        }
+        torch.save(state, path)
+        self._disk = torch.load(path, mmap=True, weights_only=False)
+        self._disk_path = path
+
+    def prefetch(self):
+        """Start copying the model back to the device without waiting for it."""
+        if self.tier == DEVICE:
+            return
+        self._prefetch_start, self._prefetch_from = time.perf_counter(), self.tier
+        stream = self._stream
+        for name, owner, attr, is_param in self._tensors():
+            tensor = getattr(owner, attr)
+            if name in self._scratch:
+                shape, dtype = self._scratch.pop(name)
+                self._set(owner, attr, is_param, torch.empty(shape, dtype=dtype, device=self.device))
+                continue
+            if stream is None or not _is_plain(tensor):
+                self._set(owner, attr, is_param, tensor.to(self.device))
+                continue
+            on_device = torch.empty(tensor.shape, dtype=tensor.dtype, device=self.device)
+            with torch.cuda.stream(stream):
+                on_device.copy_(tensor, non_blocking=True)
+            self._set(owner, attr, is_param, on_device)
+        if stream is not None:
+            self._ready = torch.cuda.Event()
+            self._ready.record(stream)
+        self.tier = DEVICE
+
+    def wait(self):
+        """Block until a prefetch started earlier has finished."""
+        if self._prefetch_start is None:
+            return
+        wait_start = time.perf_counter()
+        if self._ready is not None:
+            self._ready.synchronize()
+            self._ready = None
+        self._record(
+            self._prefetch_from,
+            DEVICE,
+            self._prefetch_start,
+            wait_seconds=time.perf_counter() - wait_start,
+        )
+        self._prefetch_start = None
+
+    def ensure_on_device(self):
+        self.prefetch()
+        self.wait()
+
+    def close(self):
+        """Drop the offloaded copies and the disk file."""
+        self._host.clear()
+        self._disk = None
+        if self._disk_path is not None and os.path.exists(self._disk_path):
+            os.remove(self._disk_path)
+        self._disk_path = None
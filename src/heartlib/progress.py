@@ -0,0 +1,66 @@
+"""Progress reporting for generation and decoding.
+
+``HeartMuLaGenPipeline.__call__`` and ``HeartCodec.detokenize`` take a
+``progress_callback`` that is called with one dict per step:
+
+    {"stage": "generate", "unit": "frames", "done": 120, "total": 375, "per_second": 21.4}
+    {"stage": "decode", "unit": "windows", "done": 2, "total": 5, "per_second": 0.8}
+
+``done`` counts HeartMuLa frames generated or codec windows decoded, ``per_second``
+is the throughput so far. The last event of a stage has ``done == total`` (the
+total shrinks to the frames generated when a song ends before its maximum length).
+"""
+import time
+from typing import Any, Callable, Dict, Optional
+
+from tqdm import tqdm
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+class StageProgress:
+    """Reports the steps of one stage to a callback; a no-op without one."""
+
+    def __init__(
+        self, callback: Optional[ProgressCallback], stage: str, unit: str, total: int
+    ):
+        self.callback = callback
+        self.stage = stage
+        self.unit = unit
+        self.total = total
+        self._start = time.perf_counter()
+
+    def update(self, done: int, total: Optional[int] = None):
+        if self.callback is None:
+            return
+        if total is not None:
+            self.total = total
+        elapsed = time.perf_counter() - self._start
+        self.callback(
+            {
+                "stage": self.stage,
+                "unit": self.unit,
+                "done": done,
+                "total": self.total,
+                "per_second": done / elapsed if elapsed > 0 else 0.0,
+            }
+        )
+
+
+class TqdmProgress:
+    """Default progress callback: a tqdm bar per stage on stderr."""
+
+    def __init__(self):
+        self._bars: Dict[str, tqdm] = {}
+
+    def __call__(self, event: Dict[str, Any]):
+        bar = self._bars.get(event["stage"])
+        if bar is None:
+            bar = self._bars[event["stage"]] = tqdm(
+                total=event["total"], desc=event["stage"], unit=event["unit"][:-1]
+            )
+        bar.total = event["total"]
+        bar.update(event["done"] - bar.n)
+        if event["done"] >= event["total"]:
+            bar.close()
+            del self._bars[event["stage"]]
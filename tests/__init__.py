@@ -0,0 +1 @@
+# heartlib tests
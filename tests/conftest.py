@@ -0,0 +1,95 @@
+"""Pytest fixtures for heartlib tests: tiny randomly initialised models that run on CPU."""
+import pytest
+import torch
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from torchtune.models import llama3_2
+
+from heartlib.heartcodec.configuration_heartcodec import HeartCodecConfig
+from heartlib.heartcodec.modeling_heartcodec import HeartCodec
+from heartlib.heartmula import modeling_heartmula
+from heartlib.heartmula.configuration_heartmula import HeartMuLaConfig
+from heartlib.heartmula.modeling_heartmula import HeartMuLa
+from heartlib.pipelines.music_generation import HeartMuLaGenConfig, HeartMuLaGenPipeline
+
+
+def llama3_2_tiny():
+    return llama3_2.llama3_2(
+        vocab_size=64,
+        num_layers=2,
+        num_heads=4,
+        num_kv_heads=2,
+        embed_dim=64,
+        max_seq_len=512,
+        intermediate_dim=128,
+        attn_dropout=0.0,
+        norm_eps=1e-5,
+        rope_base=500_000,
+        scale_factor=32,
+    )
+
+
+@pytest.fixture
+def tiny_mula(monkeypatch):
+    """HeartMuLa with 2-layer, 64-dim backbone and decoder."""
+    monkeypatch.setitem(modeling_heartmula.FLAVORS, "llama-tiny", llama3_2_tiny)
+    torch.manual_seed(0)
+    config = HeartMuLaConfig(
+        backbone_flavor="llama-tiny",
+        decoder_flavor="llama-tiny",
+        text_vocab_size=100,
+        audio_vocab_size=40,
+        audio_num_codebooks=8,
+        muq_dim=512,
+    )
+    model = HeartMuLa(config).eval()
+    # audio_head is created with torch.empty and only filled by checkpoint loading
+    torch.nn.init.normal_(model.audio_head, std=0.02)
+    return model
+
+
+@pytest.fixture
+def tiny_codec():
+    """HeartCodec with a 1+1 layer DiT and a 4-channel scalar decoder."""
+    torch.manual_seed(0)
+    config = HeartCodecConfig(
+        dim=32,
+        codebook_size=64,
+        codebook_dim=8,
+        num_quantizers=8,
+        attention_head_dim=8,
+        num_attention_heads=2,
+        num_layers=1,
+        num_layers_2=1,
+        in_channels=256 + 256 + 32,
+        out_channels=256,
+        init_channel=4,
+    )
+    return HeartCodec(config).eval()
+
+
+@pytest.fixture
+def tiny_pipeline(tiny_mula, tiny_codec):
+    """HeartMuLaGenPipeline on CPU around the tiny models (audio EOS never sampled)."""
+    vocab = {"[UNK]": 0, "<bos>": 1, "<eos>": 2}
+    for i, word in enumerate(["<tag>pop</tag>", "hello", "world", "la"]):
+        vocab[word] = 3 + i
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    pipe = HeartMuLaGenPipeline(
+        heartmula_path="",
+        heartcodec_path="",
+        heartmula_device=torch.device("cpu"),
+        heartcodec_device=torch.device("cpu"),
+        heartmula_dtype=torch.float32,
+        heartcodec_dtype=torch.float32,
+        lazy_load=True,
+        muq_mulan=None,
+        text_tokenizer=tokenizer,
+        config=HeartMuLaGenConfig(text_bos_id=1, text_eos_id=2, audio_eos_id=1000),
+    )
+    pipe.lazy_load = False
+    pipe._mula = tiny_mula
+    pipe._codec = tiny_codec
+    return pipe
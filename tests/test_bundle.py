@@ -0,0 +1,80 @@
+"""Tests for compiled model bundles (heartlib compile-checkpoint)."""
+import json
+import os
+
+import pytest
+import torch
+
+from heartlib.bundle import MANIFEST_NAME
+from heartlib.cli import main
+from heartlib.pipelines.music_generation import HeartMuLaGenPipeline
+
+
+@pytest.fixture
+def checkpoint_dir(tiny_pipeline, tmp_path):
+    ckpt = tmp_path / "ckpt"
+    tiny_pipeline.mula.save_pretrained(ckpt / "HeartMuLa-oss-tiny")
+    tiny_pipeline.codec.save_pretrained(ckpt / "HeartCodec-oss")
+    tiny_pipeline.text_tokenizer.save(str(ckpt / "tokenizer.json"))
+    with open(ckpt / "gen_config.json", "w") as fp:
+        json.dump({"text_bos_id": 1, "text_eos_id": 2, "audio_eos_id": 1000}, fp)
+    return str(ckpt)
+
+
+def _compile(checkpoint_dir, output, *extra):
+    argv = ["compile-checkpoint", "--model_path", checkpoint_dir, "--version", "tiny"]
+    assert main(argv + ["--output", output, "--mula_dtype", "fp32", *extra]) == 0
+
+
+def _load(bundle_path):
+    pipe = HeartMuLaGenPipeline.from_pretrained(
+        bundle_path,
+        device=torch.device("cpu"),
+        dtype=torch.float32,
+        version="tiny",
+        lazy_load=True,
+        verify_bundle=True,
+    )
+    pipe.lazy_load = False
+    return pipe
+
+
+def _frames(pipe):
+    model_inputs = pipe.preprocess({"tags": "pop", "lyrics": "hello world la"}, cfg_scale=1.0)
+    with torch.no_grad():
+        return pipe._forward(
+            model_inputs, max_audio_length_ms=240, temperature=1.0, topk=1, cfg_scale=1.0
+        )["frames"]
+
+
+def test_bundle_loads_folded_codec_and_reproduces_outputs(tiny_pipeline, checkpoint_dir, tmp_path):
+    bundle = str(tmp_path / "bundle")
+    _compile(checkpoint_dir, bundle)
+    with open(os.path.join(bundle, MANIFEST_NAME)) as fp:
+        manifest = json.load(fp)
+    assert manifest["codec"]["weight_norm_folded"]
+    assert "HeartCodec-oss/model.safetensors" in manifest["files"]
+
+    pipe = _load(bundle)
+    assert torch.equal(_frames(pipe), _frames(tiny_pipeline))
+    codes = torch.randint(0, 64, (8, 30), generator=torch.Generator().manual_seed(0))
+    codec = pipe.codec  # load before seeding, construction draws random numbers
+    torch.manual_seed(1)
+    expected = tiny_pipeline.codec.detokenize(codes, num_steps=2, disable_progress=True)
+    torch.manual_seed(1)
+    actual = codec.detokenize(codes, num_steps=2, disable_progress=True)
+    assert torch.allclose(actual, expected, atol=1e-5)
+
+
+def test_quantized_bundle_and_checksum_verification(checkpoint_dir, tmp_path):
+    bundle = str(tmp_path / "bundle")
+    _compile(checkpoint_dir, bundle, "--quantization", "int8")
+    assert not os.path.exists(os.path.join(bundle, "HeartMuLa-oss-tiny", "model.safetensors"))
+    assert _load(bundle).mula.quantization["mode"] == "int8"
+    assert main(["verify-checkpoint", bundle]) == 0
+
+    with open(os.path.join(bundle, "gen_config.json"), "a") as fp:
+        fp.write(" ")
+    assert main(["verify-checkpoint", bundle]) == 1
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        _load(bundle)
@@ -0,0 +1,85 @@
+"""Tests for the fast safetensors loading path."""
+import json
+import os
+import threading
+
+import pytest
+import torch
+from safetensors.torch import load_file, save_file
+
+from heartlib.checkpoint import load_pretrained
+from heartlib.heartcodec.modeling_heartcodec import HeartCodec
+from heartlib.heartmula.modeling_heartmula import HeartMuLa
+
+
+def _assert_same_tensors(expected, actual):
+    assert expected.keys() == actual.keys()
+    for key, tensor in expected.items():
+        assert actual[key].dtype == tensor.dtype, key
+        assert torch.equal(actual[key], tensor), key
+
+
+def test_load_pretrained_matches_saved_mula(tiny_mula, tmp_path):
+    tiny_mula.save_pretrained(tmp_path)
+    model = load_pretrained(HeartMuLa, str(tmp_path), torch.device("cpu"), torch.float32)
+    assert not model.training
+    _assert_same_tensors(tiny_mula.state_dict(), model.state_dict())
+    # non-persistent buffers (RoPE tables) are computed, not left uninitialised
+    _assert_same_tensors(dict(tiny_mula.named_buffers()), dict(model.named_buffers()))
+
+
+def test_load_pretrained_reads_sharded_checkpoint_in_target_dtype(tiny_codec, tmp_path):
+    tiny_codec.save_pretrained(tmp_path)
+    state = load_file(os.path.join(tmp_path, "model.safetensors"))
+    os.remove(os.path.join(tmp_path, "model.safetensors"))
+    keys = sorted(state)
+    weight_map = {}
+    for i, part in enumerate([keys[: len(keys) // 2], keys[len(keys) // 2 :]]):
+        name = f"model-{i + 1:05d}-of-00002.safetensors"
+        save_file({k: state[k] for k in part}, os.path.join(tmp_path, name))
+        weight_map.update({k: name for k in part})
+    with open(os.path.join(tmp_path, "model.safetensors.index.json"), "w") as fp:
+        json.dump({"metadata": {}, "weight_map": weight_map}, fp)
+
+    model = load_pretrained(HeartCodec, str(tmp_path), torch.device("cpu"), torch.bfloat16)
+    expected = {
+        k: v.to(torch.bfloat16) if v.is_floating_point() else v
+        for k, v in tiny_codec.state_dict().items()
+    }
+    _assert_same_tensors(expected, model.state_dict())
+    buffers = dict(model.named_buffers())
+    # constants built with the default dtype follow the target dtype
+    assert buffers["flow_matching.vq_embed.layers.0.zero"].dtype == torch.bfloat16
+
+
+def test_load_pretrained_leaves_default_dtype_of_other_threads(tiny_mula, tmp_path):
+    tiny_mula.save_pretrained(tmp_path)
+    seen = []
+
+    def other_thread():
+        while not loaded.is_set():
+            seen.append(torch.zeros(1).dtype)
+
+    loaded = threading.Event()
+    watcher = threading.Thread(target=other_thread)
+    watcher.start()
+    try:
+        model = load_pretrained(HeartMuLa, str(tmp_path), torch.device("cpu"), torch.bfloat16)
+    finally:
+        loaded.set()
+        watcher.join()
+    assert set(seen) == {torch.float32}
+    assert torch.get_default_dtype() == torch.float32
+    # RoPE tables keep their explicit float32
+    rope = dict(model.named_buffers())["backbone.layers.0.attn.pos_embeddings.cache"]
+    assert rope.dtype == torch.float32
+
+
+def test_load_pretrained_rejects_incomplete_checkpoint(tiny_mula, tmp_path):
+    tiny_mula.save_pretrained(tmp_path)
+    path = os.path.join(tmp_path, "model.safetensors")
+    state = load_file(path)
+    del state["codebook0_head.weight"]
+    save_file(state, path)
+    with pytest.raises(ValueError, match="codebook0_head.weight"):
+        load_pretrained(HeartMuLa, str(tmp_path), torch.device("cpu"), torch.float32)
@@ -0,0 +1,52 @@
+"""Tests for the two-stage PipelinedExecutor."""
+import pytest
+import torch
+
+from heartlib.pipelines import music_generation
+from heartlib.pipelines.executor import PipelinedExecutor
+
+
+def test_executor_matches_sequential_frames(tiny_pipeline, tmp_path, monkeypatch):
+    saved = {}
+    monkeypatch.setattr(
+        music_generation.torchaudio, "save", lambda path, wav, sr: saved.__setitem__(path, wav)
+    )
+    lyrics = ["hello world", "la la la", "world hello la"]
+    kwargs = dict(max_audio_length_ms=240, topk=1, cfg_scale=1.0)
+    expected = []
+    for text in lyrics:
+        model_inputs = tiny_pipeline.preprocess({"tags": "pop", "lyrics": text}, cfg_scale=1.0)
+        with torch.no_grad():
+            expected.append(
+                tiny_pipeline._forward(model_inputs, temperature=1.0, **kwargs)["frames"]
+            )
+
+    with PipelinedExecutor(tiny_pipeline, queue_size=1) as executor:
+        futures = [
+            executor.submit(
+                {"tags": "pop", "lyrics": text},
+                save_path=str(tmp_path / f"{i}.wav"),
+                save_state_path=str(tmp_path / f"{i}.pt"),
+                **kwargs,
+            )
+            for i, text in enumerate(lyrics)
+        ]
+        failed = executor.submit({"tags": "pop"}, save_path=str(tmp_path / "x.wav"), **kwargs)
+        assert [f.result(timeout=60) for f in futures] == [
+            str(tmp_path / f"{i}.wav") for i in range(len(lyrics))
+        ]
+        with pytest.raises(KeyError):
+            failed.result(timeout=60)
+        stats = executor.utilization()
+
+    for i, frames in enumerate(expected):
+        assert torch.equal(torch.load(tmp_path / f"{i}.pt")["frames"], frames)
+        assert saved[str(tmp_path / f"{i}.wav")].shape[-1] == frames.shape[-1] * 3840
+    assert stats["lm"]["items"] == 3 and stats["codec"]["items"] == 3
+    assert 0 < stats["codec"]["utilization"] <= 1
+
+
+def test_executor_rejects_lazy_load(tiny_pipeline):
+    tiny_pipeline.lazy_load = True
+    with pytest.raises(ValueError):
+        PipelinedExecutor(tiny_pipeline)
@@ -0,0 +1,147 @@
+"""Tests for HeartCodec.detokenize with a tiny codec."""
+import pytest
+import torch
+
+
+def test_detokenize_continues_from_tail_latents(tiny_codec):
+    """Tail latents cover the last overlap codes and seed the next decode."""
+    torch.manual_seed(0)
+    codes = torch.randint(0, 64, (8, 60))
+    wav, tail = tiny_codec.detokenize(codes, num_steps=2, return_tail_latents=True)
+    assert wav.shape == (2, 60 * 3840)
+    assert tail.shape == (1, 2 * 52, 256)
+
+    new_codes = torch.randint(0, 64, (8, 20))
+    codes_ext = torch.cat([codes[:, -52:], new_codes], -1)
+    wav_ext, tail_ext = tiny_codec.detokenize(
+        codes_ext, num_steps=2, incontext_latents=tail, return_tail_latents=True
+    )
+    assert wav_ext.shape == (2, 72 * 3840)
+    # the in-context region reproduces the original latents of the overlap codes
+    assert torch.allclose(tail_ext[:, : 2 * 32], tail[:, 2 * 20 :])
+
+
+def _detokenize(codec, codes, **kwargs):
+    torch.manual_seed(1)
+    return codec.detokenize(codes, num_steps=2, disable_progress=True, **kwargs)
+
+
+def test_variable_windows_match_padded_windows_on_window_grid(tiny_codec):
+    """Without padding to do, variable-length windows reproduce the padded decode."""
+    torch.manual_seed(0)
+    codes = torch.randint(0, 64, (8, 372 + 320))
+    fast = _detokenize(tiny_codec, codes)
+    padded = _detokenize(tiny_codec, codes, pad_windows=True)
+    assert fast.shape == padded.shape == (2, 692 * 3840)
+    assert fast[:, -3840:].abs().sum() > 0
+    assert torch.allclose(fast, padded, atol=1e-5)
+
+
+def test_variable_windows_decode_only_needed_frames(tiny_codec):
+    """A short clip and a partial last window keep the requested length."""
+    torch.manual_seed(0)
+    short = torch.randint(0, 64, (8, 30))
+    wav = _detokenize(tiny_codec, short)
+    assert wav.shape == (2, 30 * 3840)
+    assert wav[:, -3840:].abs().sum() > 0
+
+    long = torch.randint(0, 64, (8, 372 + 100))
+    fast = _detokenize(tiny_codec, long)
+    padded = _detokenize(tiny_codec, long, pad_windows=True)
+    assert fast.shape == padded.shape == (2, 472 * 3840)
+    # the first window is identical; only the partial last window sees less context
+    assert torch.allclose(fast[:, : 320 * 3840], padded[:, : 320 * 3840], atol=1e-5)
+
+
+def test_overlap_add_matches_sequential_crossfade():
+    """Vectorized overlap-add equals the per-window crossfade loop it replaces."""
+    import numpy as np
+
+    from heartlib.heartcodec.modeling_heartcodec import _overlap_add
+
+    hop, ovlp, lengths = 40, 12, [52, 52, 52, 30]
+    torch.manual_seed(0)
+    chunks = [torch.randn(2, n) for n in lengths]
+
+    expected = chunks[0].clone()
+    for cur in chunks[1:]:
+        ov_win = torch.from_numpy(np.linspace(0, 1, ovlp)[None, :])
+        ov_win = torch.cat([ov_win, 1 - ov_win], -1)
+        expected[:, -ovlp:] = (
+            expected[:, -ovlp:] * ov_win[:, -ovlp:] + cur[:, 0:ovlp] * ov_win[:, 0:ovlp]
+        )
+        expected = torch.cat([expected, cur[:, ovlp:]], -1)
+
+    windows = torch.zeros(len(lengths), 2, hop + ovlp)
+    for i, cur in enumerate(chunks):
+        windows[i, :, : cur.shape[-1]] = cur
+    output = _overlap_add(windows, hop, ovlp)[:, : expected.shape[-1]]
+    assert torch.allclose(output, expected, atol=1e-6)
+
+
+def test_decode_latents_batches_windows_of_several_songs(tiny_codec):
+    """Batched scalar decoding equals decoding each window on its own."""
+    torch.manual_seed(0)
+    latents = [torch.randn(1, 60, 256), torch.randn(1, 60, 256), torch.randn(1, 24, 256)]
+    latents.append(torch.randn(1, 60, 256))
+    batched = tiny_codec.decode_latents(latents, max_batch_frames=120)
+    for latent, wav in zip(latents, batched):
+        bands = latent.reshape(1, -1, 2, 128).permute(0, 2, 1, 3).reshape(2, -1, 128)
+        with torch.inference_mode():
+            expected = tiny_codec.scalar_model.decode(bands.transpose(1, 2)).squeeze(1)
+        assert wav.shape == (2, latent.shape[1] * 1920)
+        assert torch.allclose(wav, expected, atol=1e-5)
+
+
+def test_scalar_decode_step_matches_full_decode(tiny_codec):
+    """Streaming decode in small blocks reproduces the full-window decode."""
+    model = tiny_codec.scalar_model
+    torch.manual_seed(0)
+    latents = torch.randn(2, 128, 40)
+    with torch.inference_mode():
+        expected = model.decode(latents)
+        cache, chunks, start = None, [], 0
+        for size in [1, 2, 3, 7, 11, 16]:
+            block = latents[:, :, start : start + size]
+            start += size
+            out, cache = model.decode_step(block, cache, flush=start == latents.shape[-1])
+            chunks.append(out)
+    streamed = torch.cat(chunks, -1)
+    assert chunks[0].shape[-1] == 0  # still inside the look-ahead delay
+    assert streamed.shape == expected.shape
+    assert torch.allclose(streamed, expected, atol=1e-5)
+
+
+def test_optimize_for_inference_folds_weight_norm(tiny_codec):
+    """Folding the weight norms leaves the decoded audio unchanged."""
+    from torch.nn.utils import parametrize
+
+    torch.manual_seed(0)
+    latents = torch.randn(2, 128, 24)
+    with torch.inference_mode():
+        expected = tiny_codec.scalar_model.decode(latents)
+    tiny_codec.optimize_for_inference()
+    assert not any(parametrize.is_parametrized(m) for m in tiny_codec.modules())
+    assert not any(p.requires_grad for p in tiny_codec.parameters())
+    with torch.inference_mode():
+        folded = tiny_codec.scalar_model.decode(latents)
+    assert torch.allclose(folded, expected, atol=1e-5)
+
+
+def test_estimator_precision_modes(tiny_codec):
+    """bf16 and int8 estimator modes decode to fp32 audio close to the fp32 mode."""
+    codes = torch.randint(0, 64, (8, 60), generator=torch.Generator().manual_seed(0))
+    expected = _detokenize(tiny_codec, codes)
+    tiny_codec.set_estimator_precision("bf16")
+    bf16 = _detokenize(tiny_codec, codes)
+    tiny_codec.set_estimator_precision("int8")
+    assert any(
+        isinstance(m, torch.ao.nn.quantized.dynamic.Linear)
+        for m in tiny_codec.flow_matching.estimator.modules()
+    )
+    int8 = _detokenize(tiny_codec, codes)
+    for out in (bf16, int8):
+        assert out.dtype == torch.float32 and out.shape == expected.shape
+        assert (out - expected).norm() < 0.1 * expected.norm()
+    with pytest.raises(ValueError):
+        tiny_codec.set_estimator_precision("fp8")
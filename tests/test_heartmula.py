@@ -0,0 +1,209 @@
+"""Tests for HeartMuLa embeddings and weight-only quantization."""
+import pytest
+import torch
+
+from heartlib.heartmula.configuration_heartmula import HeartMuLaConfig
+from heartlib.heartmula.kv_cache import rotate_keys
+from heartlib.heartmula.modeling_heartmula import HeartMuLa
+from heartlib.heartmula import quantization
+from heartlib.heartmula.quantization import (
+    load_or_quantize_pretrained,
+    load_quantized,
+    quantize_heartmula,
+    save_quantized,
+    split_audio_head,
+)
+
+
+def _frames(pipe, num_frames=4):
+    model_inputs = pipe.preprocess({"tags": "pop", "lyrics": "hello world la"}, cfg_scale=1.0)
+    with torch.no_grad():
+        outputs = pipe._forward(
+            model_inputs,
+            max_audio_length_ms=80 * (num_frames - 1),
+            temperature=1.0,
+            topk=1,
+            cfg_scale=1.0,
+        )
+    return outputs["frames"]
+
+
+def test_split_audio_head_keeps_logits(tiny_pipeline):
+    expected = _frames(tiny_pipeline)
+    split_audio_head(tiny_pipeline.mula)
+    assert isinstance(tiny_pipeline.mula.audio_head, torch.nn.ModuleList)
+    assert torch.equal(_frames(tiny_pipeline), expected)
+
+
+def test_int8_sidecar_roundtrip(tiny_pipeline, tmp_path):
+    """A model loaded from the sidecar generates exactly like the quantized one."""
+    quantize_heartmula(tiny_pipeline.mula, "int8")
+    quantized = _frames(tiny_pipeline)
+    path = tmp_path / "quantized-int8.pt"
+    save_quantized(tiny_pipeline.mula, str(path))
+
+    config = HeartMuLaConfig(**tiny_pipeline.mula.config.to_dict())
+    tiny_pipeline._mula = load_quantized(HeartMuLa(config).eval(), str(path))
+    assert tiny_pipeline.mula.quantization == {"mode": "int8", "group_size": 128}
+    assert torch.equal(_frames(tiny_pipeline), quantized)
+
+
+def test_sidecar_is_loaded_without_full_precision_weights(tiny_pipeline, tmp_path, monkeypatch):
+    tiny_pipeline.mula.save_pretrained(tmp_path)
+    cpu = torch.device("cpu")
+    tiny_pipeline._mula = load_or_quantize_pretrained(str(tmp_path), "int8", cpu, torch.float32)
+    quantized = _frames(tiny_pipeline)
+    assert sorted(p.name for p in tmp_path.iterdir() if p.suffix == ".pt") == ["quantized-int8.pt"]
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(".tmp")]
+
+    def full_precision_load(*args, **kwargs):
+        raise AssertionError("full-precision checkpoint loaded although a sidecar exists")
+
+    monkeypatch.setattr(quantization, "load_pretrained", full_precision_load)
+    tiny_pipeline._mula = load_or_quantize_pretrained(str(tmp_path), "int8", cpu, torch.float32)
+    assert torch.equal(_frames(tiny_pipeline), quantized)
+
+
+def test_failed_sidecar_write_leaves_no_file(tiny_pipeline, tmp_path, monkeypatch):
+    quantize_heartmula(tiny_pipeline.mula, "int8")
+
+    def interrupted_save(obj, fp):
+        fp.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(torch, "save", interrupted_save)
+    with pytest.raises(OSError):
+        save_quantized(tiny_pipeline.mula, str(tmp_path / "quantized-int8.pt"))
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("cfg_scale", [1.0, 1.5])
+def test_embed_modes_match_masked_sum(tiny_pipeline, cfg_scale):
+    model = tiny_pipeline.mula
+    inputs = tiny_pipeline.preprocess({"tags": "pop", "lyrics": "hello world la"}, cfg_scale)
+    b = inputs["tokens"].shape[0]
+    uncond_mask = torch.arange(b) >= b // 2 if b > 1 else None
+    frame = torch.randint(0, 40, (b, 1, 9))
+    frame[..., -1] = 0
+    frame_mask = torch.ones_like(frame, dtype=torch.bool)
+    frame_mask[..., -1] = False
+    for tokens, mask, mode in (
+        (inputs["tokens"], inputs["tokens_mask"], "text"),
+        (frame, frame_mask, "audio"),
+    ):
+        embeds = model._embed_tokens(tokens, uncond_mask)
+        expected = (embeds * mask.unsqueeze(-1)).sum(dim=2, dtype=embeds.dtype)
+        if mode == "text":
+            actual = model._embed_text(tokens, uncond_mask)
+        else:
+            actual = model._embed_frame_audio(tokens).sum(dim=2)
+        assert torch.equal(actual, expected)
+
+
+def _sample_frames(model, cfg_scale, num_frames=4):
+    b = 2 if cfg_scale != 1.0 else 1
+    model.setup_caches(b)
+    torch.manual_seed(1)
+    tokens = torch.randint(0, 40, (b, 5, 9))
+    mask = torch.ones_like(tokens, dtype=torch.bool)
+    pos = torch.arange(5).repeat(b, 1)
+    out = torch.empty(b, 8, dtype=torch.int)
+    frames = []
+    with torch.no_grad():
+        for _ in range(num_frames):
+            frame = model.generate_frame(
+                tokens, mask, pos, temperature=1.0, topk=10, cfg_scale=cfg_scale, out=out
+            )
+            assert frame is out
+            frames.append(frame.clone())
+            tokens = torch.zeros(b, 1, 9, dtype=torch.long)
+            tokens[:, 0, :-1] = frame
+            mask = torch.ones_like(tokens, dtype=torch.bool)
+            mask[..., -1] = False
+            pos = pos[:, -1:] + 1
+    model.reset_caches()
+    return torch.stack(frames)
+
+
+@pytest.mark.parametrize("cfg_scale", [1.0, 1.5])
+def test_decoder_cache_rewind_matches_reset(tiny_mula, cfg_scale, monkeypatch):
+    rewound = _sample_frames(tiny_mula, cfg_scale)
+    monkeypatch.setattr(tiny_mula, "_rewind_decoder_caches", tiny_mula.decoder.reset_caches)
+    assert torch.equal(_sample_frames(tiny_mula, cfg_scale), rewound)
+
+
+def test_kv_caches_sized_to_request_and_pooled(tiny_mula):
+    tiny_mula.setup_caches(2, 300)
+    k_cache = tiny_mula.backbone.layers[0].attn.kv_cache.k_cache
+    assert k_cache.shape[2] == 512  # 300 rounded up to the 256 bucket
+    assert tiny_mula.backbone_causal_mask.shape == (512, 512)
+    cache_bytes = sum(
+        b.numel() * b.element_size()
+        for name, b in tiny_mula.named_buffers()
+        if name.endswith(("k_cache", "v_cache", "causal_mask"))
+    )
+    assert tiny_mula.kv_cache_bytes(2, 300) == cache_bytes
+
+    pool = tiny_mula.kv_cache_pool
+    allocated = pool.allocated_bytes
+    tiny_mula.setup_caches(1, 100)
+    assert tiny_mula.backbone.layers[0].attn.kv_cache.k_cache.shape[:3] == (1, 2, 256)
+    assert pool.allocated_bytes == allocated  # served from the released blocks
+    tiny_mula.release_caches()
+    assert pool.in_use_bytes == 0
+    pool.clear()
+    assert pool.allocated_bytes == 0
+
+
+def test_sized_kv_cache_generates_same_frames(tiny_pipeline):
+    inputs = {"tags": "pop", "lyrics": "hello world la"}
+    model_inputs = tiny_pipeline.preprocess(inputs, cfg_scale=1.5)
+    kwargs = dict(max_audio_length_ms=480, temperature=1.0, topk=1, cfg_scale=1.5)
+    with torch.no_grad():
+        sized = tiny_pipeline._forward(model_inputs, **kwargs)["frames"]
+    assert tiny_pipeline.mula.backbone_causal_mask.shape[0] == 256
+    setup_caches = tiny_pipeline.mula.setup_caches
+    tiny_pipeline.mula.setup_caches = lambda batch_size, *args, **kwargs: setup_caches(batch_size)
+    with torch.no_grad():
+        full = tiny_pipeline._forward(model_inputs, **kwargs)["frames"]
+    assert tiny_pipeline.mula.backbone_causal_mask.shape[0] == 512
+    assert torch.equal(sized, full)
+
+
+def test_rotate_keys_moves_rope_position(tiny_mula):
+    rope = tiny_mula.backbone.layers[0].attn.pos_embeddings
+    x = torch.randn(1, 5, 2, 16)
+    pos = torch.arange(300, 305)[None]
+    keys = rope(x, input_pos=pos).transpose(1, 2)
+    expected = rope(x, input_pos=pos - 123).transpose(1, 2)
+    torch.testing.assert_close(rotate_keys(keys, rope, 123), expected)
+
+
+def test_rolling_window_matches_full_cache_until_it_wraps(tiny_pipeline):
+    inputs = {"tags": "pop", "lyrics": "hello world la"}
+    model_inputs = tiny_pipeline.preprocess(inputs, cfg_scale=1.5)
+    kwargs = dict(max_audio_length_ms=800, temperature=1.0, topk=1, cfg_scale=1.5)
+    with torch.no_grad():
+        full = tiny_pipeline._forward(model_inputs, **kwargs)["frames"]
+        tiny_pipeline.long_form_window = 100
+        rolling = tiny_pipeline._forward(model_inputs, **kwargs)["frames"]
+    assert tiny_pipeline.mula._rolling is not None
+    assert torch.equal(rolling, full)
+
+
+def test_rolling_window_generates_past_backbone_context(tiny_pipeline):
+    model_inputs = tiny_pipeline.preprocess({"tags": "pop", "lyrics": "la"}, cfg_scale=1.0)
+    num_frames = 700  # tiny backbone context is 512 positions
+    with torch.no_grad():
+        frames = tiny_pipeline._forward(
+            model_inputs,
+            max_audio_length_ms=80 * num_frames,
+            temperature=1.0,
+            topk=1,
+            cfg_scale=1.0,
+        )["frames"]
+    mula = tiny_pipeline.mula
+    assert frames.shape == (8, num_frames + 1)
+    assert mula.backbone.layers[0].attn.kv_cache.k_cache.shape[2] == 256
+    assert mula._rolling.offset > 0  # window keys were re-rotated
+    assert int(mula._rolling.input_pos.max()) < mula.backbone.max_seq_len
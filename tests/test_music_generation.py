@@ -0,0 +1,162 @@
+"""Tests for HeartMuLaGenPipeline decoding with tiny models."""
+import threading
+
+import pytest
+import torch
+import torchaudio
+
+from heartlib import GenerationCancelled
+
+
+def _generate(pipe, inputs, num_frames, cfg_scale=1.0):
+    model_inputs = pipe.preprocess(inputs, cfg_scale=cfg_scale)
+    with torch.no_grad():
+        outputs = pipe._forward(
+            model_inputs,
+            max_audio_length_ms=80 * (num_frames - 1),
+            temperature=1.0,
+            topk=1,
+            cfg_scale=cfg_scale,
+        )
+    return outputs
+
+
+def test_extend_prefill_continues_stored_frames(tiny_pipeline):
+    """Prefilling prompt + stored frames yields the same continuation as decoding them."""
+    inputs = {"tags": "pop", "lyrics": "hello world la"}
+    full = _generate(tiny_pipeline, inputs, num_frames=6)["frames"]
+    assert full.shape == (8, 6)
+
+    extended = _generate(
+        tiny_pipeline,
+        {**inputs, "continue_from": {"frames": full[:, :3]}},
+        num_frames=3,
+    )
+    assert torch.equal(extended["frames"], full[:, 3:])
+    assert torch.equal(extended["prefix_frames"], full[:, :3])
+
+
+
+@pytest.mark.parametrize("stored_audio", [True, False])
+def test_extension_joins_mp3_prefix_without_shift(
+    tiny_pipeline, tmp_path, monkeypatch, stored_audio
+):
+    """The extended track starts with the original, not its encoder-delayed MP3 decode."""
+    saved = []
+    monkeypatch.setattr(torchaudio, "save", lambda path, wav, sr: saved.append(wav))
+    inputs = {"tags": "pop", "lyrics": "hello world la"}
+    state_path = tmp_path / "state.pt"
+    tiny_pipeline.postprocess(
+        _generate(tiny_pipeline, inputs, num_frames=60),
+        save_path=str(tmp_path / "audio.mp3"),
+        save_state_path=str(state_path),
+    )
+    original = saved[-1]
+    state = torch.load(state_path)
+    assert torch.equal(state["audio"], (original * 32767).round().to(torch.int16))
+    if not stored_audio:
+        del state["audio"]
+    # MP3 decodes with the encoder delay in front and padding at the end
+    mp3 = torch.cat([torch.zeros(2, 1105), original, torch.zeros(2, 700)], -1)
+    monkeypatch.setattr(torchaudio, "load", lambda path: (mp3, 48000))
+
+    tiny_pipeline.postprocess(
+        _generate(
+            tiny_pipeline,
+            {**inputs, "continue_from": state, "prefix_audio": str(tmp_path / "audio.mp3")},
+            num_frames=10,
+        ),
+        save_path=str(tmp_path / "extended.mp3"),
+    )
+    extended = saved[-1]
+    crossfade_start = original.shape[-1] - (state["tail_latents"].shape[1] // 2) * 3840
+    assert extended.shape[-1] == original.shape[-1] + 10 * 3840
+    assert torch.allclose(
+        extended[:, :crossfade_start], original[:, :crossfade_start], atol=1 / 32767
+    )
+
+def test_eos_is_trimmed_regardless_of_check_interval(tiny_pipeline):
+    """Frames decoded past EOS before the deferred check sees it are dropped."""
+    inputs = {"tags": "pop", "lyrics": "hello world la"}
+    full = _generate(tiny_pipeline, inputs, num_frames=12)["frames"]
+    eos_id = int(full[:, 1:].max())
+    first_eos = 1 + int(torch.nonzero((full[:, 1:] >= eos_id).any(0))[0])
+
+    tiny_pipeline.config.audio_eos_id = eos_id
+    for interval in (1, 3, 8, 100):
+        tiny_pipeline.eos_check_interval = interval
+        frames = _generate(tiny_pipeline, inputs, num_frames=12)["frames"]
+        assert torch.equal(frames, full[:, :first_eos]), interval
+
+
+def test_codec_is_prefetched_when_eos_comes_early(tiny_pipeline, monkeypatch):
+    """A song ending before the max-length prefetch point still prefetches the codec."""
+    inputs = {"tags": "pop", "lyrics": "hello world la"}
+    full = _generate(tiny_pipeline, inputs, num_frames=40)["frames"]
+    # the first generated frame counts as EOS
+    tiny_pipeline.config.audio_eos_id = int(full[:, 1].max())
+    tiny_pipeline.eos_check_interval = 1
+    tiny_pipeline.codec_prefetch_frames = 5
+    prefetched = []
+    monkeypatch.setattr(tiny_pipeline, "_prefetch_codec", lambda: prefetched.append(True))
+    frames = _generate(tiny_pipeline, inputs, num_frames=40)["frames"]
+    assert frames.shape[1] < 40 - 5
+    assert prefetched == [True]
+
+
+class _SetAfter(threading.Event):
+    """Event that sets itself after being checked ``checks`` times."""
+
+    def __init__(self, checks):
+        super().__init__()
+        self.checks = checks
+
+    def is_set(self):
+        self.checks -= 1
+        if self.checks < 0:
+            self.set()
+        return super().is_set()
+
+
+def test_cancel_event_stops_frame_loop_and_codec(tiny_pipeline):
+    model_inputs = tiny_pipeline.preprocess({"tags": "pop", "lyrics": "la"}, cfg_scale=1.0)
+    cancel = _SetAfter(checks=3)
+    with torch.no_grad(), pytest.raises(GenerationCancelled):
+        tiny_pipeline._forward(
+            model_inputs,
+            max_audio_length_ms=80 * 20,
+            temperature=1.0,
+            topk=1,
+            cfg_scale=1.0,
+            cancel_event=cancel,
+        )
+    assert cancel.checks == -1
+
+    frames = torch.zeros((8, 4), dtype=torch.long)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(GenerationCancelled):
+        tiny_pipeline.codec.detokenize(frames, cancel_event=cancel)
+
+
+def test_progress_callback_reports_frames_and_windows(tiny_pipeline):
+    events = []
+    model_inputs = tiny_pipeline.preprocess({"tags": "pop", "lyrics": "la"}, cfg_scale=1.0)
+    with torch.no_grad():
+        frames = tiny_pipeline._forward(
+            model_inputs,
+            max_audio_length_ms=80 * 6,
+            temperature=1.0,
+            topk=1,
+            cfg_scale=1.0,
+            progress_callback=events.append,
+        )["frames"]
+    assert [e["done"] for e in events] == [1, 2, 3, 4, 5, 6]
+    assert all(e["stage"] == "generate" and e["total"] == 6 for e in events)
+
+    events.clear()
+    tiny_pipeline.codec.detokenize(
+        frames.repeat(1, 100), num_steps=1, progress_callback=events.append
+    )
+    assert len(events) > 1 and {e["stage"] for e in events} == {"decode"}
+    assert [e["done"] for e in events] == list(range(1, events[-1]["total"] + 1))
@@ -0,0 +1,80 @@
+"""Tests for tiered offload of lazily loaded models."""
+import pytest
+import torch
+
+from heartlib.pipelines.residency import DEVICE, DISK, ModelResidency
+
+
+def _frames(pipe):
+    model_inputs = pipe.preprocess({"tags": "pop", "lyrics": "hello world la"}, cfg_scale=1.0)
+    with torch.no_grad():
+        return pipe._forward(
+            model_inputs, max_audio_length_ms=240, temperature=1.0, topk=1, cfg_scale=1.0
+        )["frames"]
+
+
+def test_disk_offload_roundtrip_drops_scratch(tiny_mula, tmp_path):
+    tiny_mula.setup_caches(2)
+    state = {k: v.clone() for k, v in tiny_mula.state_dict().items() if "kv_cache" not in k}
+    residency = ModelResidency(
+        "HeartMuLa",
+        tiny_mula,
+        torch.device("cpu"),
+        offload_dir=str(tmp_path),
+        is_scratch=lambda name: name.endswith(("k_cache", "v_cache")),
+    )
+    with pytest.raises(ValueError):
+        residency.offload("gpu")
+
+    residency.offload(DISK)
+    assert residency.tier == DISK
+    assert len(list(tmp_path.iterdir())) == 1
+    assert all(b.is_meta for n, b in tiny_mula.named_buffers() if n.endswith("k_cache"))
+
+    residency.ensure_on_device()
+    assert residency.tier == DEVICE
+    assert [(t["from"], t["to"]) for t in residency.transitions] == [
+        (DEVICE, DISK),
+        (DISK, DEVICE),
+    ]
+    assert not any(b.is_meta for b in tiny_mula.buffers())
+    for name, tensor in tiny_mula.state_dict().items():
+        if name in state:
+            assert torch.equal(tensor, state[name]), name
+    residency.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_lazy_pipeline_parks_models_instead_of_reloading(tiny_pipeline, tmp_path, monkeypatch):
+    expected = _frames(tiny_pipeline)
+    tiny_pipeline.lazy_load = True
+    tiny_pipeline.offload_tier = DISK
+    tiny_pipeline.offload_dir = str(tmp_path)
+
+    def reload():
+        raise AssertionError("parked model was reloaded from the checkpoint")
+
+    monkeypatch.setattr(tiny_pipeline, "_load_mula", reload)
+    monkeypatch.setattr(tiny_pipeline, "_load_codec", reload)
+    assert torch.equal(_frames(tiny_pipeline), expected)
+    assert tiny_pipeline._residency["mula"].tier == DISK
+    assert torch.equal(_frames(tiny_pipeline), expected)
+    transitions = tiny_pipeline.residency_transitions()["mula"]
+    assert [(t["from"], t["to"]) for t in transitions] == [
+        (DEVICE, DISK),
+        (DISK, DEVICE),
+        (DEVICE, DISK),
+    ]
+
+
+def test_close_removes_offload_files(tiny_pipeline, tmp_path):
+    tiny_pipeline.lazy_load = True
+    tiny_pipeline.offload_tier = DISK
+    tiny_pipeline.offload_dir = str(tmp_path)
+    _frames(tiny_pipeline)
+    assert len(list(tmp_path.iterdir())) == 1
+    tiny_pipeline._unload("codec")
+    assert len(list(tmp_path.iterdir())) == 2
+    tiny_pipeline.close()
+    assert not list(tmp_path.iterdir())
+    assert tiny_pipeline._mula is None and tiny_pipeline._codec is None